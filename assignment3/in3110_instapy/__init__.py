@@ -2,6 +2,10 @@
 from __future__ import annotations
 
 import importlib
+import os
+
+# whether get_filter returns instrumented filters, see profiling.enable_instrumentation
+_instrumented = os.environ.get("INSTAPY_INSTRUMENT", "0") not in {"", "0"}
 
 # changes the parameters to be able to use them for every function i want to
 def get_filter(filter: str, implementation: str):
@@ -14,7 +18,8 @@ def get_filter(filter: str, implementation: str):
         filter (str):
             The name of the filter ('color2gray' or 'color2sepia')
         implementation (str):
-            The name of the implementation (python, cython, etc.)
+            The name of the implementation (python, cython, etc.),
+            or 'auto' to pick the fastest one for each image size
 
     Returns:
         filter_function (function):
@@ -24,9 +29,23 @@ def get_filter(filter: str, implementation: str):
             (numpy array of same shape and type as input)
     """
 
-    # get the module (instapy.python_filters)
-    module = importlib.import_module(f"in3110_instapy.{implementation}_filters")
     # construct filter function name (python_color2gray)
     filter_name = f"{implementation}_{filter}"
-    # return the resolved function (instapy.python.python_color2gray)
-    return getattr(module, filter_name)
+
+    if implementation == "auto":
+        # dispatches to the fastest implementation, see autotune.py
+        from .autotune import auto_filter
+
+        filter_function = auto_filter(filter)
+    else:
+        # get the module (instapy.python_filters)
+        module = importlib.import_module(f"in3110_instapy.{implementation}_filters")
+        # resolve the function (instapy.python.python_color2gray)
+        filter_function = getattr(module, filter_name)
+
+    if _instrumented:
+        # count calls, time and bytes, see profiling.py
+        from .profiling import instrument
+
+        filter_function = instrument(filter_function, filter_name)
+    return filter_function
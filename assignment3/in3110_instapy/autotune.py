@@ -0,0 +1,171 @@
+"""Automatic implementation selection
+
+`get_filter(filter, "auto")` returns a filter that picks the fastest
+implementation for the size of each image. The first time a filter sees
+an image in a new size class, every available implementation is timed
+on it, and the winner is saved to a small JSON tuning file.
+After that, images in the same size class are dispatched without measuring.
+
+The tuning file is `~/.cache/in3110_instapy/tuning.json`,
+or set by the INSTAPY_TUNING_FILE environment variable.
+"""
+from __future__ import annotations
+
+import inspect
+import json
+import math
+import os
+from pathlib import Path
+
+import numpy as np
+
+from . import get_filter
+
+# the pure python implementation is never the fastest, don't bother timing it
+CANDIDATES = ["numpy", "numba", "numba_parallel", "lut", "cython"]
+
+
+def tuning_file() -> Path:
+    """Return the path of the tuning file"""
+    path = os.environ.get("INSTAPY_TUNING_FILE")
+    if path:
+        return Path(path)
+    return Path.home() / ".cache" / "in3110_instapy" / "tuning.json"
+
+
+def load_tuning() -> dict:
+    """Load the tuning table, {filter: {size_class: {"implementation": ..., "times": ...}}}"""
+    path = tuning_file()
+    if not path.exists():
+        return {}
+    try:
+        with path.open() as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        # a broken tuning file is just retuned
+        return {}
+
+
+def save_tuning(table: dict) -> None:
+    """Save the tuning table"""
+    path = tuning_file()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # write to a temporary file first, so readers never see half a file
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    with tmp_path.open("w") as f:
+        json.dump(table, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def size_class(image: np.array) -> str:
+    """Return the size class of an image
+
+    Size classes are powers of two of the number of pixels,
+    e.g. '2^18' for images from 256k to 512k pixels.
+    """
+    pixels = max(1, image.shape[0] * image.shape[1])
+    return f"2^{int(math.log2(pixels))}"
+
+
+def _accepts(filter_function, kwargs: dict) -> bool:
+    """Whether a filter function accepts the given keyword arguments"""
+    if not kwargs:
+        return True
+    # numba dispatchers keep the python function in py_func
+    parameters = inspect.signature(getattr(filter_function, "py_func", filter_function)).parameters
+    return all(name in parameters for name in kwargs)
+
+
+def available_filters(filter: str, kwargs: dict = None) -> dict:
+    """Return the filter functions of every importable candidate implementation"""
+    filters = {}
+    for implementation in CANDIDATES:
+        try:
+            filter_function = get_filter(filter, implementation)
+        except ImportError:
+            # e.g. the cython implementation is not compiled
+            continue
+        if _accepts(filter_function, kwargs or {}):
+            filters[implementation] = filter_function
+    return filters
+
+
+def tune(filter: str, image: np.array, calls: int = 3, **kwargs) -> dict:
+    """Time every available implementation of a filter on an image
+
+    Args:
+        filter (str): the name of the filter
+        image (np.array): the image to time with
+        calls (int): the number of calls to measure
+        **kwargs: extra arguments for the filter (e.g. k)
+    Returns:
+        dict: {"implementation": fastest implementation, "times": {implementation: seconds}}
+    """
+    from .timing import time_one
+
+    out = np.empty_like(image)
+    times = {}
+    for implementation, filter_function in available_filters(filter, kwargs).items():
+        # warm up, so JIT compilation isn't counted
+        filter_function(image, out=out, **kwargs)
+        times[implementation] = time_one(filter_function, image, calls=calls, out=out, **kwargs)
+    if not times:
+        raise ValueError(f"No implementation of {filter!r} accepts {sorted(kwargs)}")
+    return {"implementation": min(times, key=times.get), "times": times}
+
+
+class AutoFilter:
+    """A filter dispatching to the fastest implementation for each image size"""
+
+    def __init__(self, filter: str):
+        self.filter = filter
+        self.__name__ = f"auto_{filter}"
+        # resolved filter functions, by size class
+        self._resolved = {}
+
+    def resolve(self, image: np.array, **kwargs):
+        """Return the fastest filter function for an image, tuning if needed"""
+        key = size_class(image)
+        if kwargs:
+            # only some implementations accept extra arguments,
+            # so they are tuned separately
+            key = f"{key}:{','.join(sorted(kwargs))}"
+        if key in self._resolved:
+            return self._resolved[key]
+
+        table = load_tuning()
+        entry = table.get(self.filter, {}).get(key)
+        filters = available_filters(self.filter, kwargs)
+        if entry is None or entry["implementation"] not in filters:
+            entry = tune(self.filter, image, **kwargs)
+            # reload, in case another process tuned something meanwhile
+            table = load_tuning()
+            table.setdefault(self.filter, {})[key] = entry
+            save_tuning(table)
+
+        filter_function = filters[entry["implementation"]]
+        self._resolved[key] = filter_function
+        return filter_function
+
+    def __call__(self, image: np.array, out: np.array = None, **kwargs) -> np.array:
+        filter_function = self.resolve(image, **kwargs)
+        return filter_function(image, out=out, **kwargs)
+
+
+def auto_filter(filter: str) -> AutoFilter:
+    """Return the auto-tuning version of a filter"""
+    return AutoFilter(filter)
+
+
+def format_tuning(table: dict = None) -> str:
+    """Format the tuning table for printing"""
+    if table is None:
+        table = load_tuning()
+    lines = [f"Tuning file: {tuning_file()}"]
+    if not table:
+        lines.append("(empty, filters are tuned on first use)")
+    for filter in sorted(table):
+        for key, entry in sorted(table[filter].items()):
+            times = ", ".join(f"{impl}={seconds:.3}s" for impl, seconds in sorted(entry["times"].items()))
+            lines.append(f"{filter} {key}: {entry['implementation']} ({times})")
+    return "\n".join(lines)
@@ -0,0 +1,274 @@
+"""Batch filtering
+
+Filter many images in one process launch: either a stack of images
+in one `(N, H, W, 3)` array, or a list of image files.
+Work is spread over a pool of worker processes, and each worker keeps its
+imported (and compiled) filter functions between images.
+"""
+from __future__ import annotations
+
+import glob
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Iterable
+
+import numpy as np
+from PIL import Image
+
+from . import get_filter, io
+from .cache import ResultCache
+
+
+def _process_pool(processes: int) -> ProcessPoolExecutor:
+    """Create a pool of worker processes
+
+    Workers are spawned, not forked: forking a process after numba's or
+    OpenMP's thread pools have started is not safe, and can hang.
+    """
+    return ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context("spawn"))
+
+
+def _chunks(n: int, nchunks: int) -> list[slice]:
+    """Split range(n) into at most nchunks contiguous slices"""
+    nchunks = max(1, min(n, nchunks))
+    bounds = np.linspace(0, n, nchunks + 1).astype(int)
+    return [slice(start, stop) for start, stop in zip(bounds[:-1], bounds[1:])]
+
+
+def _filter_chunk(stack: np.array, filter: str, implementation: str, kwargs: dict) -> np.array:
+    """Filter every image in a stack (run in a worker)"""
+    filter_function = get_filter(filter, implementation)
+    out = np.empty_like(stack)
+    for i in range(stack.shape[0]):
+        filter_function(stack[i], out=out[i], **kwargs)
+    return out
+
+
+def filter_stack(
+    stack: np.array,
+    filter: str = "color2gray",
+    implementation: str = "numpy",
+    processes: int = None,
+    out: np.array = None,
+    **kwargs,
+) -> np.array:
+    """Filter a stack of images
+
+    Args:
+        stack (np.array): images of shape (N, H, W, 3)
+        filter (str): the name of the filter
+        implementation (str): the name of the implementation
+        processes (int): the number of worker processes (optional).
+            Defaults to the number of cores, use 1 to filter in this process.
+        out (np.array): array to write the result to (optional)
+        **kwargs: extra arguments for the filter (e.g. k)
+    Returns:
+        np.array: the filtered stack
+    """
+    if stack.ndim != 4:
+        raise ValueError(f"stack must have shape (N, H, W, 3), got {stack.shape}")
+    if out is None:
+        out = np.empty_like(stack)
+    if processes is None:
+        processes = os.cpu_count() or 1
+
+    if processes == 1 or stack.shape[0] == 1:
+        filter_function = get_filter(filter, implementation)
+        for i in range(stack.shape[0]):
+            filter_function(stack[i], out=out[i], **kwargs)
+        return out
+
+    chunks = _chunks(stack.shape[0], processes)
+    with _process_pool(processes) as pool:
+        futures = [
+            pool.submit(_filter_chunk, stack[chunk], filter, implementation, kwargs) for chunk in chunks
+        ]
+        for chunk, future in zip(chunks, futures):
+            out[chunk] = future.result()
+    return out
+
+
+def find_images(patterns: Iterable[str]) -> list[Path]:
+    """Expand files, directories and glob patterns to a list of image files
+
+    Directories are searched (not recursively) for files
+    with an extension PIL can open, or .npy and .raw arrays.
+
+    Args:
+        patterns (iterable of str): filenames, directories or glob patterns
+    Returns:
+        list of Path: the image files, in sorted order per pattern
+    """
+    extensions = set(Image.registered_extensions()) | io.ARRAY_SUFFIXES
+    files = []
+    for pattern in patterns:
+        path = Path(pattern)
+        if path.is_dir():
+            matches = sorted(p for p in path.iterdir() if p.is_file() and p.suffix.lower() in extensions)
+        elif path.exists():
+            matches = [path]
+        else:
+            matches = sorted(Path(p) for p in glob.glob(pattern))
+            if not matches:
+                raise FileNotFoundError(f"No images found matching {pattern!r}")
+        files.extend(matches)
+    return files
+
+
+def _read_scaled(file: Path, scale: float) -> np.array:
+    """Read an image, resizing it if needed"""
+    if scale == 1:
+        return io.read_image(file)
+    return io.read_image_scaled(file, scale)
+
+
+def _filter_files(
+    jobs: list, filter: str, implementation: str, scale: float, kwargs: dict, single_channel: bool = False
+) -> int:
+    """Filter a list of (in, out) files (run in a worker)"""
+    filter_function = get_filter(filter, implementation)
+    for in_file, out_file in jobs:
+        image = _read_scaled(in_file, scale)
+        out = np.empty(image.shape[:2], dtype=np.uint8) if single_channel else None
+        io.write_image(filter_function(image, out=out, **kwargs), out_file)
+    return len(jobs)
+
+
+def _filter_file_stages(
+    jobs: list, filter: str, implementation: str, scale: float, kwargs: dict, single_channel: bool = False
+) -> dict:
+    """Filter a list of (in, out) files with overlapped stages (run in a worker)"""
+    from .stream import filter_file_stages
+
+    filter_function = get_filter(filter, implementation)
+    return filter_file_stages(jobs, filter_function, scale=scale, single_channel=single_channel, **kwargs)
+
+
+def _output_jobs(files: list[Path], out_dir: Path) -> list[tuple[Path, Path]]:
+    """Pair every input with its output in out_dir, refusing to overwrite anything
+
+    Raises:
+        ValueError: if two inputs have the same filename,
+            or an output would overwrite an input
+    """
+    inputs = {file.resolve(): file for file in files}
+    outputs = {}
+    for file in inputs.values():
+        out_file = out_dir / file.name
+        if out_file.name in outputs:
+            raise ValueError(f"{outputs[out_file.name]} and {file} would both be written to {out_file}")
+        if out_file.resolve() in inputs:
+            raise ValueError(f"refusing to overwrite input {inputs[out_file.resolve()]} with its output")
+        outputs[out_file.name] = file
+    return [(file, out_dir / file.name) for file in outputs.values()]
+
+
+def filter_files(
+    files: Iterable[str],
+    out_dir: str,
+    filter: str = "color2gray",
+    implementation: str = "numpy",
+    scale: float = 1,
+    processes: int = None,
+    cache: ResultCache = None,
+    single_channel: bool = False,
+    overlap: bool = False,
+    **kwargs,
+) -> dict:
+    """Filter image files, writing the results to a directory
+
+    Outputs get the same filename as their input, so inputs
+    must have different filenames, and out_dir must not hold any input.
+    With `overlap`, every process decodes, filters and encodes on
+    separate threads at once (see stream.filter_file_stages).
+
+    Args:
+        files (iterable of str): filenames, directories or glob patterns
+        out_dir (str): the directory to write filtered images to
+        filter (str): the name of the filter
+        implementation (str): the name of the implementation
+        scale (float): scale factor to resize images before filtering
+        processes (int): the number of worker processes (optional).
+            Defaults to the number of cores, use 1 to filter in this process.
+        cache (ResultCache): cache to copy outputs from when they have been
+            filtered before, and to store new outputs in (optional)
+        single_channel (bool): write gray images with one channel
+            (only for color2gray)
+        overlap (bool): overlap decoding, filtering and encoding
+        **kwargs: extra arguments for the filter (e.g. k)
+    Returns:
+        dict: statistics of the run, with keys
+            'images', 'cached', 'seconds' and 'images_per_second'.
+            With `overlap`, also 'stages' and 'bottleneck',
+            the busy time of every stage summed over the processes.
+    Raises:
+        ValueError: if two inputs have the same filename,
+            or an output would overwrite an input
+    """
+    out_dir = Path(out_dir)
+    # (the same file given twice is only filtered once)
+    jobs = _output_jobs(find_images(files), out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    if processes is None:
+        processes = os.cpu_count() or 1
+
+    start_time = time.perf_counter()
+    cached = 0
+    if cache is not None:
+        # copy cached outputs in this process, and only filter the rest
+        keys = {}
+        for in_file, out_file in jobs:
+            options = {"single_channel": True} if single_channel else {}
+            key = cache.key(in_file, out_file, filter, implementation, scale, **options, **kwargs)
+            if not cache.get(key, out_file):
+                keys[in_file, out_file] = key
+        cached = len(jobs) - len(keys)
+        jobs = list(keys)
+
+    worker = _filter_file_stages if overlap else _filter_files
+    if not jobs:
+        results = []
+    elif processes == 1 or len(jobs) <= 1:
+        results = [worker(jobs, filter, implementation, scale, kwargs, single_channel)]
+    else:
+        # a few chunks per worker, to balance uneven image sizes
+        # (one chunk per worker with overlapped stages, which balance themselves)
+        chunks = _chunks(len(jobs), processes if overlap else processes * 4)
+        with _process_pool(processes) as pool:
+            futures = [
+                pool.submit(worker, jobs[chunk], filter, implementation, scale, kwargs, single_channel)
+                for chunk in chunks
+            ]
+            results = [future.result() for future in futures]
+    stats = {}
+    if overlap:
+        from .stream import STAGES, bottleneck
+
+        count = sum(result["images"] for result in results)
+        # busy time summed over the processes, threads per process
+        stages = {stage: {"seconds": 0.0, "threads": 1} for stage in STAGES}
+        for result in results:
+            for stage, timing in result["stages"].items():
+                stages[stage]["seconds"] += timing["seconds"]
+                stages[stage]["threads"] = timing["threads"]
+        stats = {"stages": stages, "bottleneck": bottleneck(stages)}
+    else:
+        count = sum(results)
+
+    if cache is not None:
+        for job, key in keys.items():
+            cache.put(key, job[1])
+    seconds = time.perf_counter() - start_time
+
+    count += cached
+    return {
+        "images": count,
+        "cached": cached,
+        "seconds": seconds,
+        "images_per_second": count / seconds if seconds else float("inf"),
+        **stats,
+    }
+
@@ -0,0 +1,155 @@
+"""On-disk cache of filtered images
+
+Filtered outputs are stored encoded, keyed by a hash of the source file's
+content and everything else that affects the result (filter,
+implementation, scale, filter arguments and output format).
+A cached output is copied to its destination without decoding
+or filtering anything.
+
+The cache directory is capped in size: when it grows past the cap, the
+least recently used entries are removed (file modification times are
+updated on every hit, so they record the last use).
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+# default size cap of the cache directory
+DEFAULT_MAX_BYTES = 1024 * 2**20
+
+
+def file_hash(filename: str) -> str:
+    """Return the sha256 hex digest of a file's content"""
+    digest = hashlib.sha256()
+    with open(filename, "rb") as f:
+        for chunk in iter(lambda: f.read(2**20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """A size-capped, least recently used cache of filtered image files
+
+    Counts hits and misses, see `format_stats`.
+    """
+
+    def __init__(self, directory: str, max_bytes: int = DEFAULT_MAX_BYTES):
+        if max_bytes < 0:
+            raise ValueError(f"max_bytes must not be negative, got {max_bytes=}")
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        # total size of the entries, computed when first needed
+        self._size = None
+
+    def key(self, source: str, out_file: str, filter: str, implementation: str, scale: float = 1, **kwargs) -> str:
+        """Return the cache key for filtering a source file to an output file
+
+        Args:
+            source (str): the source image file
+            out_file (str): the output file (its extension selects the format)
+            filter (str): the name of the filter
+            implementation (str): the name of the implementation
+            scale (float): the scale factor
+            **kwargs: extra arguments for the filter (e.g. k)
+        Returns:
+            str: the key, a hex digest followed by the output extension
+        """
+        parameters = json.dumps(
+            {
+                "source": file_hash(source),
+                "filter": filter,
+                "implementation": implementation,
+                "scale": float(scale),
+                "kwargs": kwargs,
+            },
+            sort_keys=True,
+        )
+        return hashlib.sha256(parameters.encode()).hexdigest() + Path(out_file).suffix.lower()
+
+    def _path(self, key: str) -> Path:
+        return self.directory / key
+
+    def get(self, key: str, out_file: str) -> bool:
+        """Copy a cached output to out_file, if there is one
+
+        Returns:
+            bool: whether it was cached
+        """
+        path = self._path(key)
+        try:
+            shutil.copyfile(path, out_file)
+            # mark as recently used
+            os.utime(path)
+        except FileNotFoundError:
+            # not cached (or evicted by another run since)
+            self.misses += 1
+            return False
+        self.hits += 1
+        return True
+
+    def put(self, key: str, filename: str) -> None:
+        """Store a filtered output file in the cache"""
+        path = self._path(key)
+        # write to a temporary file first, so other runs never see half a file
+        fd, tmp = tempfile.mkstemp(dir=self.directory, prefix=".tmp-")
+        try:
+            os.close(fd)
+            shutil.copyfile(filename, tmp)
+            # (an output stored again replaces the old one, which no longer counts)
+            replaced = 0
+            if self._size is not None:
+                try:
+                    replaced = path.stat().st_size
+                except FileNotFoundError:
+                    pass
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+        if self._size is not None:
+            self._size += path.stat().st_size - replaced
+        if self.size() > self.max_bytes:
+            self.evict()
+
+    def _entries(self) -> list[tuple[os.stat_result, Path]]:
+        entries = []
+        for path in self.directory.iterdir():
+            if path.name.startswith(".tmp-"):
+                continue
+            try:
+                entries.append((path.stat(), path))
+            except FileNotFoundError:
+                continue
+        return entries
+
+    def size(self) -> int:
+        """Return the total size of the cached outputs, in bytes"""
+        if self._size is None:
+            self._size = sum(stat.st_size for stat, _ in self._entries())
+        return self._size
+
+    def evict(self) -> None:
+        """Remove the least recently used outputs until the cache fits in max_bytes"""
+        entries = sorted(self._entries(), key=lambda entry: entry[0].st_mtime)
+        size = sum(stat.st_size for stat, _ in entries)
+        for stat, path in entries:
+            if size <= self.max_bytes:
+                break
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+            size -= stat.st_size
+        self._size = size
+
+    def format_stats(self) -> str:
+        """Format the hit and miss counts"""
+        return f"Cache: {self.hits} hits, {self.misses} misses ({self.size() / 2**20:.1f} MiB in {self.directory})"
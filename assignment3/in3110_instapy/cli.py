@@ -4,12 +4,9 @@ from __future__ import annotations
 import argparse
 import sys
 
-from in3110_instapy.timing import time_one as to
-import in3110_instapy
-import numpy as np
-from PIL import Image
-
-from . import get_filter, io
+# numpy, PIL and the filter backends are imported when they are needed,
+# so e.g. `--help` starts fast (see test/test_startup.py)
+from . import get_filter
 
 
 def run_filter(
@@ -19,30 +16,201 @@ def run_filter(
     filter: str = "color2gray",
     scale: int = 1,
     runtime: bool = None,
+    tile_size: int = None,
+    num_threads: int = None,
+    profile: str = None,
+    profile_output: str = None,
+    processes: int = None,
+    cache=None,
+    single_channel: bool = False,
+    threads: int = None,
+    region: tuple = None,
+    mask: str = None,
 ) -> None:
     """Run the selected filter"""
-    # load the image from a file
-    image = io.read_image(file)
-    
+    if cache is not None and out_file:
+        options = {"single_channel": True} if single_channel else {}
+        if region:
+            options["region"] = list(region)
+        if mask:
+            from .cache import file_hash
+
+            options["mask"] = file_hash(mask)
+        key = cache.key(file, out_file, filter, implementation, scale, **options)
+        if cache.get(key, out_file):
+            # filtered before, nothing to do
+            return
+
+    import numpy as np
+
+    from . import io
+    from .tiling import tiled_filter
+
+    if num_threads:
+        if implementation != "numba_parallel":
+            raise ValueError(f"number of threads can only be set for numba_parallel, got {implementation=}")
+        from . import numba_parallel_filters
+
+        numba_parallel_filters.set_num_threads(num_threads)
+
+    filter_name = get_filter(filter, implementation)
+
+    def new_output(image):
+        # a single gray channel (or let the filter allocate the output)
+        return np.empty(image.shape[:2], dtype=np.uint8) if single_channel else None
+
+    if tile_size and scale == 1 and out_file and not (runtime or profile):
+        # stream tiles straight from the input file to the output file
+        # (timing and profiling need the whole image, so they read it below)
+        size = io.image_size(file)
+        tiles = io.read_image_tiles(file, tile_size)
+        io.write_image_tiles(
+            ((window, filter_name(tile, out=new_output(tile))) for window, tile in tiles), size, out_file
+        )
+        if cache is not None:
+            cache.put(key, out_file)
+        return
+
+    # load the image from a file, resizing it if needed
     if scale != 1:
-        # Resize image, if needed
-        openFile = Image.open(file)
-        resized = openFile.resize((int(openFile.width*scale), int(openFile.height*scale)))
-        image = np.asarray(resized)
+        image = io.read_image_scaled(file, scale)
+    else:
+        image = io.read_image(file)
 
     # Apply the filter
-    filter_name = get_filter(filter, implementation)
-    filtered = filter_name(image)
+    if processes:
+        from .parallel import filter_bands
+
+        filtered = filter_bands(image, filter, implementation, processes=processes, out=new_output(image))
+    elif threads:
+        from .parallel import filter_bands_threaded
+
+        filtered = filter_bands_threaded(image, filter, implementation, threads=threads, out=new_output(image))
+    elif tile_size:
+        filtered = tiled_filter(filter_name, image, out=new_output(image), tile_size=tile_size)
+    elif region or mask:
+        from .roi import filter_region
+
+        if mask:
+            # nonzero pixels (in any channel) are filtered
+            region = io.read_image(mask)
+            if region.ndim == 3:
+                region = region.any(axis=2)
+        filtered = filter_region(filter_name, image, region)
+    else:
+        filtered = filter_name(image, out=new_output(image))
     if out_file:
         # save the file
         io.write_image(filtered, out_file)
+        if cache is not None:
+            cache.put(key, out_file)
     else:
         # not asked to save, display it instead
         io.display(filtered)
     
     if runtime:
+        from .timing import time_one as to
+
         runTimed = to(filter_name, image)
-        print(f"Average time over 3 runs: {implementation}_{filter}: {runTimed:.3}s")
+        print(f"Median time over 3 runs: {implementation}_{filter}: {runTimed:.3}s")
+
+    if profile:
+        from . import profiling
+
+        print(f"Profiling {implementation}_{filter} with {profile}:")
+        if profile == "line":
+            profiling.profile_with_line_profiler(filter_name, image, output=profile_output)
+        else:
+            profiling.profile_with_cprofile(filter_name, image, output=profile_output)
+
+
+def run_batch(
+    files: list[str],
+    out_dir: str,
+    implementation: str = "python",
+    filter: str = "color2gray",
+    scale: int = 1,
+    processes: int = None,
+    cache=None,
+    single_channel: bool = False,
+    overlap: bool = False,
+) -> None:
+    """Run the selected filter on many files, and report the throughput"""
+    from .batch import filter_files
+
+    stats = filter_files(
+        files,
+        out_dir,
+        filter,
+        implementation,
+        scale=scale,
+        processes=processes,
+        cache=cache,
+        single_channel=single_channel,
+        overlap=overlap,
+    )
+    print(
+        f"Filtered {stats['images']} images in {stats['seconds']:.3}s "
+        f"({stats['images_per_second']:.1f} images/s)"
+    )
+    if overlap:
+        from .stream import format_stages
+
+        print(format_stages(stats))
+
+
+def run_frames(
+    frame_dir: str,
+    out_dir: str,
+    implementation: str = "python",
+    filter: str = "color2gray",
+    scale: float = 1,
+    num_threads: int = None,
+) -> None:
+    """Run the selected filter on a directory of numbered frames, and report the frame rate"""
+    from .stream import filter_frame_dir
+
+    if num_threads:
+        if implementation != "numba_parallel":
+            raise ValueError(f"number of threads can only be set for numba_parallel, got {implementation=}")
+        from . import numba_parallel_filters
+
+        numba_parallel_filters.set_num_threads(num_threads)
+
+    stats = filter_frame_dir(frame_dir, out_dir, get_filter(filter, implementation), scale=scale)
+    print(f"Filtered {stats['frames']} frames in {stats['seconds']:.3}s ({stats['fps']:.1f} frames/s)")
+
+
+def _region(text: str) -> tuple:
+    """Parse a TOP,LEFT,HEIGHT,WIDTH rectangle"""
+    region = tuple(int(n) for n in text.split(","))
+    if len(region) != 4 or min(region) < 0:
+        raise argparse.ArgumentTypeError(f"expected four non-negative numbers TOP,LEFT,HEIGHT,WIDTH, got {text!r}")
+    return region
+
+
+def _positive_int(text: str) -> int:
+    """Parse a count or size, which must be at least 1"""
+    try:
+        value = int(text)
+    except ValueError:
+        value = 0
+    if value < 1:
+        raise argparse.ArgumentTypeError(f"expected a positive whole number, got {text!r}")
+    return value
+
+
+class ShowTuning(argparse.Action):
+    """Print the auto implementation's tuning table and exit"""
+
+    def __init__(self, option_strings, dest=argparse.SUPPRESS, default=argparse.SUPPRESS, help=None):
+        super().__init__(option_strings, dest=dest, default=default, nargs=0, help=help)
+
+    def __call__(self, parser, namespace, values, option_string=None):
+        from .autotune import format_tuning
+
+        print(format_tuning())
+        parser.exit()
 
 
 def main(argv=None):
@@ -53,26 +221,138 @@ def main(argv=None):
     parser = argparse.ArgumentParser()
 
     # filename is positional and required
-    parser.add_argument("file", help="The filename to apply filter to")
+    parser.add_argument("file", nargs="+", help="The filename to apply filter to (or files, directories and globs, with --out-dir)")
     parser.add_argument("-o", "--out", help="The output filename")
+    parser.add_argument("-O", "--out-dir", help="Filter every input file in one run, writing the results to this directory")
+    parser.add_argument("--frames", action="store_true", help="The input is a directory of numbered frames, filtered in order with decoding and encoding overlapped (needs --out-dir)")
+    parser.add_argument("-j", "--jobs", type=_positive_int, default=None, help="Number of worker processes. With --out-dir, images are spread over them (default: one per core), otherwise the image is split into row bands filtered in shared memory")
+    parser.add_argument("--overlap", action="store_true", help="With --out-dir, decode, filter and encode on separate threads at once, and print how busy each stage was")
+    parser.add_argument("--threads", type=_positive_int, default=None, help="Split a single image into row bands filtered on this many threads (for implementations releasing the GIL: numpy, numba, lut and cython)")
 
     # Add required arguments
     parser.add_argument("-g", "--gray", action="store_true", help="Select gray filter")
     parser.add_argument("-se", "--sepia", action="store_true", help="Select sepia filter")
+    parser.add_argument("--blur", action="store_true", help="Select gaussian blur (numpy and numba only)")
+    parser.add_argument("--sharpen", action="store_true", help="Select sharpen filter (numpy and numba only)")
+    parser.add_argument("--edges", action="store_true", help="Select edge detection (numpy and numba only)")
+    parser.add_argument("--single-channel", action="store_true", help="Write gray images with a single channel instead of three identical ones (with -g)")
+    parser.add_argument("--region", type=_region, metavar="TOP,LEFT,HEIGHT,WIDTH", help="Only filter this rectangle, in pixels (after scaling)")
+    parser.add_argument("--mask", metavar="FILE", help="Only filter the pixels where this image (with the same size as the scaled input) is not black")
     parser.add_argument("-sc", "--scale", type=float, default=1.0, help="Scale factor to resize image")
-    parser.add_argument("-i", "--implementation", choices=["python", "numba", "numpy"], default="python", help="The implementation")
+    parser.add_argument("-i", "--implementation", choices=["python", "numba", "numba_parallel", "numpy", "lut", "cython", "auto"], default="python", help="The implementation")
+    parser.add_argument("--tuning", action=ShowTuning, help="Show which implementation -i auto picks for each image size, and exit")
     parser.add_argument("-r", "--runtime", action="store_true", help="Tracks runtime to the different filters")
+    parser.add_argument("-t", "--tile-size", type=_positive_int, default=None, help="Filter the image in tiles of this many pixels per side, to bound memory use")
+    parser.add_argument("--profile", choices=["cprofile", "line"], help="Profile the filter with cProfile or line_profiler")
+    parser.add_argument("--profile-output", help="Save the profile to files with this prefix (.pstats and .collapsed for cprofile, .lprof for line)")
+    parser.add_argument("--stats", action="store_true", help="Print call counts, time and bytes processed per filter at the end")
+    parser.add_argument("--cache", metavar="DIR", help="Cache filtered outputs in this directory, and copy them from there when the same file is filtered the same way again")
+    parser.add_argument("--cache-size", type=int, default=1024, help="Maximum size of the cache directory in MiB, least recently used outputs are removed (default: 1024)")
+    parser.add_argument("--numba-threads", type=_positive_int, default=None, help="Number of threads for the numba_parallel implementation")
 
     # parse arguments and call run_filter
     args = parser.parse_args(argv)
+    if not args.out_dir and len(args.file) > 1:
+        parser.error("filtering more than one file needs --out-dir")
+    if args.frames and not (args.out_dir and len(args.file) == 1):
+        parser.error("--frames needs one frame directory and --out-dir")
+    if args.out_dir and (args.out or args.runtime or args.profile):
+        parser.error("--out-dir writes every output there, and can't be combined with --out, --runtime or --profile")
+    if args.out_dir and args.numba_threads and not args.frames:
+        # (the batch filters in worker processes, which don't get it)
+        parser.error("--numba-threads works on a single image or with --frames, not with --out-dir")
+    if args.jobs and args.numba_threads and not args.out_dir:
+        # (it is only set in this process, the band workers would use numba's default)
+        parser.error("--numba-threads can't be combined with --jobs, the worker processes don't get it")
+    if args.frames and (args.jobs or args.threads or args.tile_size):
+        parser.error("--frames filters whole frames in order in one process, and can't be combined with --jobs, --threads or --tile-size")
+
+    if (args.region or args.mask) and (
+        args.out_dir or args.jobs or args.threads or args.tile_size or args.single_channel or args.runtime or args.profile
+    ):
+        parser.error("--region and --mask only work on a single image, filtered in one piece and saved or displayed")
+    if args.region and args.mask:
+        parser.error("give either --region or --mask")
+    if args.overlap and (not args.out_dir or args.frames):
+        parser.error("--overlap needs --out-dir (--frames already overlaps decoding and encoding)")
+    if args.cache and (args.frames or args.runtime or args.profile):
+        parser.error("--cache can't be combined with --frames, --runtime or --profile")
+
     if args.sepia:
         filter = "color2sepia"
+    elif args.blur:
+        filter = "blur"
+    elif args.sharpen:
+        filter = "sharpen"
+    elif args.edges:
+        filter = "edges"
     else:
         filter = "color2gray"
+    if filter in {"blur", "sharpen", "edges"} and args.implementation not in {"numpy", "numba"}:
+        parser.error(f"--{filter} is only implemented with -i numpy or -i numba")
+    if args.single_channel and (filter != "color2gray" or args.frames):
+        parser.error("--single-channel only works with the gray filter, and not with --frames")
+    if args.threads and (args.out_dir or args.jobs or args.tile_size):
+        parser.error("--threads filters a single image, and can't be combined with --out-dir, --jobs or --tile-size")
+    if args.tile_size and (args.out_dir or args.jobs):
+        parser.error("--tile-size filters a single image in tiles, and can't be combined with --out-dir or --jobs")
+    if args.threads and args.implementation in {"numba_parallel", "auto"}:
+        parser.error(f"-i {args.implementation} can't be run on bands in threads (--threads)")
+    if filter in {"blur", "sharpen", "edges"} and (args.tile_size or args.threads or (args.jobs and not args.out_dir)):
+        # tiles and bands would be filtered without their neighbouring pixels
+        parser.error(f"--{filter} can't be split into tiles (--tile-size) or row bands (--jobs, --threads)")
         
     if args.runtime:
         runtime = True
     else:
         runtime = False
-    
-    run_filter(args.file, args.out, args.implementation, filter, args.scale, runtime)
+
+    if args.stats:
+        from . import profiling
+
+        profiling.enable_instrumentation()
+
+    cache = None
+    if args.cache:
+        from .cache import ResultCache
+
+        cache = ResultCache(args.cache, max_bytes=args.cache_size * 2**20)
+
+    if args.frames:
+        run_frames(args.file[0], args.out_dir, args.implementation, filter, args.scale, args.numba_threads)
+    elif args.out_dir:
+        # (with worker processes, only calls made in this process are counted)
+        run_batch(
+            args.file,
+            args.out_dir,
+            args.implementation,
+            filter,
+            args.scale,
+            args.jobs,
+            cache,
+            args.single_channel,
+            args.overlap,
+        )
+    else:
+        run_filter(
+            args.file[0],
+            args.out,
+            args.implementation,
+            filter,
+            args.scale,
+            runtime,
+            args.tile_size,
+            args.numba_threads,
+            args.profile,
+            args.profile_output,
+            args.jobs,
+            cache,
+            args.single_channel,
+            args.threads,
+            args.region,
+            args.mask,
+        )
+    if cache is not None:
+        print(cache.format_stats())
+    if args.stats:
+        print(profiling.format_instrumentation())
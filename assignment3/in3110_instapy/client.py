@@ -0,0 +1,179 @@
+"""Thin client for the filter daemon (see daemon.py)
+
+Sends filter jobs over the daemon's Unix domain socket, so a shell
+pipeline pays for a small python startup per image instead of importing
+numpy and numba and compiling the kernels every time.
+Only the standard library is imported here.
+
+    instapy-client rain.jpg -o rain_sepia.jpg -se -i numba
+
+The protocol is one JSON object per line in each direction: a request
+with an 'op' ('filter', 'filter_shared', 'ping' or 'stop'), and a reply
+with 'ok' and either the results or an 'error' message.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import socket
+import sys
+from pathlib import Path
+
+
+def default_socket() -> str:
+    """The socket path: $INSTAPY_SOCKET, or instapy.sock in the runtime or temp directory"""
+    if os.environ.get("INSTAPY_SOCKET"):
+        return os.environ["INSTAPY_SOCKET"]
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR")
+    if runtime_dir:
+        return os.path.join(runtime_dir, "instapy.sock")
+    return os.path.join("/tmp", f"instapy-{os.getuid()}.sock")
+
+
+class DaemonError(RuntimeError):
+    """The daemon failed to run a request"""
+
+
+def request(message: dict, socket_path: str = None, timeout: float = None) -> dict:
+    """Send one request to the daemon and return its reply
+
+    Args:
+        message (dict): the request, with an 'op'
+        socket_path (str): the daemon's socket (optional, see `default_socket`)
+        timeout (float): seconds to wait for the reply (optional)
+    Returns:
+        dict: the reply
+    Raises:
+        DaemonError: if the daemon couldn't run the request
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(socket_path or default_socket())
+        sock.sendall(json.dumps(message).encode() + b"\n")
+        with sock.makefile("rb") as replies:
+            line = replies.readline()
+    if not line:
+        raise DaemonError("the daemon closed the connection without replying")
+    reply = json.loads(line)
+    if not reply.get("ok"):
+        raise DaemonError(reply.get("error", "unknown error"))
+    return reply
+
+
+def filter_file(
+    file: str,
+    out_file: str,
+    filter: str = "color2gray",
+    implementation: str = "numba",
+    socket_path: str = None,
+    **options,
+) -> dict:
+    """Ask the daemon to filter an image file to another file
+
+    Args:
+        file (str): the image file to filter
+        out_file (str): the file to write the filtered image to
+        filter (str): the name of the filter
+        implementation (str): the name of the implementation
+        socket_path (str): the daemon's socket (optional)
+        **options: 'scale', 'single_channel' or extra arguments
+            for the filter ('kwargs', e.g. {'k': 0.5})
+    Returns:
+        dict: the reply, with the daemon's filtering time in 'seconds'
+    """
+    message = {
+        "op": "filter",
+        # the daemon has its own working directory
+        "file": str(Path(file).absolute()),
+        "out": str(Path(out_file).absolute()),
+        "filter": filter,
+        "implementation": implementation,
+        **options,
+    }
+    return request(message, socket_path)
+
+
+def filter_shared(
+    name: str,
+    shape: tuple,
+    filter: str = "color2gray",
+    implementation: str = "numba",
+    out_name: str = None,
+    socket_path: str = None,
+    **kwargs,
+) -> dict:
+    """Ask the daemon to filter a uint8 image in a shared memory block
+
+    Nothing but the names is sent, the pixels stay in shared memory.
+
+    Args:
+        name (str): the name of the `multiprocessing.shared_memory` block holding the image
+        shape (tuple): the shape of the image, (H, W, 3)
+        filter (str): the name of the filter
+        implementation (str): the name of the implementation
+        out_name (str): the shared memory block to write the result to
+            (optional, defaults to filtering in place)
+        socket_path (str): the daemon's socket (optional)
+        **kwargs: extra arguments for the filter (e.g. k)
+    Returns:
+        dict: the reply, with the daemon's filtering time in 'seconds'
+    """
+    message = {
+        "op": "filter_shared",
+        "name": name,
+        "shape": list(shape),
+        "out_name": out_name,
+        "filter": filter,
+        "implementation": implementation,
+        "kwargs": kwargs,
+    }
+    return request(message, socket_path)
+
+
+def _shape(text: str) -> tuple:
+    """Parse a HxWxC shape"""
+    return tuple(int(n) for n in text.lower().split("x"))
+
+
+def main(argv=None) -> int:
+    """Send filter jobs to the daemon from the command-line"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("file", nargs="?", help="The image file to filter")
+    parser.add_argument("-o", "--out", help="The output filename")
+    parser.add_argument("--shm", metavar="NAME", help="Filter the image in this shared memory block instead of a file (in place)")
+    parser.add_argument("--shape", type=_shape, help="The shape of the shared memory image, as HxWxC")
+    parser.add_argument("-g", "--gray", action="store_true", help="Select gray filter")
+    parser.add_argument("-se", "--sepia", action="store_true", help="Select sepia filter")
+    parser.add_argument("-sc", "--scale", type=float, default=1.0, help="Scale factor to resize image")
+    parser.add_argument("-i", "--implementation", default="numba", help="The implementation (default: numba)")
+    parser.add_argument("--socket", default=None, help="The daemon's socket (default: $INSTAPY_SOCKET, or instapy.sock in $XDG_RUNTIME_DIR or /tmp)")
+    parser.add_argument("--ping", action="store_true", help="Check that the daemon is running, and show what it keeps warm")
+    parser.add_argument("--stop", action="store_true", help="Stop the daemon")
+    args = parser.parse_args(argv)
+
+    filter = "color2sepia" if args.sepia else "color2gray"
+    try:
+        if args.ping:
+            reply = request({"op": "ping"}, args.socket)
+            print(f"instapy daemon {reply['pid']} is running, warm: {', '.join(reply['warm'])}")
+        elif args.stop:
+            request({"op": "stop"}, args.socket)
+        elif args.shm:
+            if not args.shape:
+                parser.error("--shm needs --shape")
+            filter_shared(args.shm, args.shape, filter, args.implementation, socket_path=args.socket)
+        elif args.file:
+            if not args.out:
+                parser.error("filtering a file needs --out")
+            filter_file(args.file, args.out, filter, args.implementation, args.socket, scale=args.scale)
+        else:
+            parser.error("give a file to filter, --shm, --ping or --stop")
+    except (OSError, DaemonError) as e:
+        print(f"instapy-client: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,190 @@
+"""Affine color transforms
+
+Gray, sepia and many other looks are affine color transforms: every
+output channel is a weighted sum of the input channels plus an offset,
+given by a 3x4 matrix `[M | offset]` (or just the 3x3 `M`)::
+
+    out[c] = M[c, 0] * r + M[c, 1] * g + M[c, 2] * b + offset[c]
+
+clipped to [0, 255].
+
+Every backend with a `{implementation}_color_transform(image, matrix, out=None)`
+kernel can apply any such matrix (numpy, numba, numba_parallel, lut and cython).
+The matrix is an argument, so a kernel is compiled (or its lookup tables
+built) once, and new looks need no new code::
+
+    saturate = color_transform(saturation_matrix(1.5), "numba")
+    filtered = saturate(image)
+"""
+from __future__ import annotations
+
+import importlib
+
+import numpy as np
+
+# the implementations with a color_transform kernel
+IMPLEMENTATIONS = ["numpy", "numba", "numba_parallel", "lut", "cython"]
+
+GRAY_MATRIX = np.array(
+    [
+        [0.21, 0.72, 0.07],
+        [0.21, 0.72, 0.07],
+        [0.21, 0.72, 0.07],
+    ]
+)
+
+
+# full sepia (k=1)
+SEPIA_MATRIX = np.array(
+    [
+        [0.393, 0.769, 0.189],
+        [0.349, 0.686, 0.168],
+        [0.272, 0.534, 0.131],
+    ]
+)
+
+
+def sepia_matrix(k: float = 1) -> np.array:
+    """Return the sepia color matrix with sepia amount k (from 0 to 1)"""
+    if not 0 <= k <= 1:
+        raise ValueError(f"k must be between [0-1], got {k=}")
+    # (k=1 gives exactly SEPIA_MATRIX, and k=0 the identity)
+    return (1 - k) * np.eye(3) + k * SEPIA_MATRIX
+
+
+def saturation_matrix(s: float) -> np.array:
+    """Return the color matrix scaling the saturation by s
+
+    s=0 is grayscale, s=1 changes nothing and s>1 is more colorful.
+    (Same as the CSS `saturate()` filter.)
+    """
+    return np.array(
+        [
+            [0.213 + 0.787 * s, 0.715 - 0.715 * s, 0.072 - 0.072 * s],
+            [0.213 - 0.213 * s, 0.715 + 0.285 * s, 0.072 - 0.072 * s],
+            [0.213 - 0.213 * s, 0.715 - 0.715 * s, 0.072 + 0.928 * s],
+        ]
+    )
+
+
+def hue_rotation_matrix(degrees: float) -> np.array:
+    """Return the color matrix rotating the hue by an angle
+
+    (Same as the CSS `hue-rotate()` filter.)
+    """
+    cos = np.cos(np.radians(degrees))
+    sin = np.sin(np.radians(degrees))
+    return np.array(
+        [
+            [0.213 + 0.787 * cos - 0.213 * sin, 0.715 - 0.715 * cos - 0.715 * sin, 0.072 - 0.072 * cos + 0.928 * sin],
+            [0.213 - 0.213 * cos + 0.143 * sin, 0.715 + 0.285 * cos + 0.140 * sin, 0.072 - 0.072 * cos - 0.283 * sin],
+            [0.213 - 0.213 * cos - 0.787 * sin, 0.715 - 0.715 * cos + 0.715 * sin, 0.072 + 0.928 * cos + 0.072 * sin],
+        ]
+    )
+
+
+def contrast_matrix(c: float) -> np.array:
+    """Return the affine matrix scaling the contrast by c, around middle gray"""
+    return np.hstack([c * np.eye(3), np.full((3, 1), 127.5 * (1 - c))])
+
+
+def invert_matrix() -> np.array:
+    """Return the affine matrix inverting every channel (a negative)"""
+    return np.hstack([-np.eye(3), np.full((3, 1), 255.0)])
+
+
+# named looks, by the function returning their matrix
+PRESETS = {
+    "gray": lambda: GRAY_MATRIX,
+    "sepia": sepia_matrix,
+    "saturation": saturation_matrix,
+    "hue_rotation": hue_rotation_matrix,
+    "contrast": contrast_matrix,
+    "invert": invert_matrix,
+}
+
+
+def as_affine(matrix: np.array) -> np.array:
+    """Return a 3x3 or 3x4 color matrix as a contiguous 3x4 float64 matrix"""
+    matrix = np.asarray(matrix, dtype=np.float64)
+    if matrix.shape == (3, 3):
+        matrix = np.hstack([matrix, np.zeros((3, 1))])
+    if matrix.shape != (3, 4):
+        raise ValueError(f"color matrix must be 3x3 or 3x4, got {matrix.shape}")
+    return np.ascontiguousarray(matrix)
+
+
+def compose(first: np.array, second: np.array) -> np.array:
+    """Return the affine matrix applying `first`, then `second` (without clipping in between)"""
+    first = as_affine(first)
+    second = as_affine(second)
+    linear = second[:, :3] @ first[:, :3]
+    offset = second[:, :3] @ first[:, 3] + second[:, 3]
+    return np.hstack([linear, offset[:, np.newaxis]])
+
+
+def stays_in_range(matrix: np.array) -> bool:
+    """Whether every pixel stays inside [0, 255] without clipping
+
+    Only then is applying two transforms one after the other the same
+    as applying their composition, since the first one isn't clipped.
+    """
+    matrix = as_affine(matrix)
+    linear, offset = matrix[:, :3], matrix[:, 3]
+    high = np.clip(linear, 0, None).sum(axis=1) * 255 + offset
+    low = np.clip(linear, None, 0).sum(axis=1) * 255 + offset
+    return bool(np.all(high <= 255 + 1e-9) and np.all(low >= -1e-9))
+
+
+class ColorTransform:
+    """A filter applying one affine color transform with a backend's kernel"""
+
+    def __init__(self, matrix: np.array, implementation: str = "numba"):
+        if implementation not in IMPLEMENTATIONS:
+            raise ValueError(f"implementation must be one of {IMPLEMENTATIONS}, got {implementation=}")
+        self.matrix = as_affine(matrix)
+        self.implementation = implementation
+        module = importlib.import_module(f"in3110_instapy.{implementation}_filters")
+        self._kernel = getattr(module, f"{implementation}_color_transform")
+
+    def __call__(self, image: np.array, out: np.array = None) -> np.array:
+        """Apply the transform to an image
+
+        Args:
+            image (np.array): the image to filter
+            out (np.array): array to write the result to (optional).
+                May be `image` itself, to filter in place.
+        Returns:
+            np.array: the filtered image
+        """
+        return self._kernel(image, self.matrix, out=out)
+
+    def __repr__(self):
+        return f"ColorTransform({self.implementation!r})"
+
+
+def color_transform(matrix: np.array, implementation: str = "numba") -> ColorTransform:
+    """Return a filter applying a 3x3 or 3x4 color matrix
+
+    Args:
+        matrix (np.array): the 3x3 color matrix, or 3x4 affine matrix
+        implementation (str): the backend, one of IMPLEMENTATIONS
+    Returns:
+        ColorTransform: a filter function, taking `(image, out=None)`
+    """
+    return ColorTransform(matrix, implementation)
+
+
+def preset(name: str, implementation: str = "numba", **parameters) -> ColorTransform:
+    """Return a filter for a named look from PRESETS
+
+    Args:
+        name (str): the name of the look, e.g. 'sepia'
+        implementation (str): the backend, one of IMPLEMENTATIONS
+        **parameters: parameters of the look, e.g. k for sepia
+    Returns:
+        ColorTransform: a filter function, taking `(image, out=None)`
+    """
+    if name not in PRESETS:
+        raise ValueError(f"unknown preset {name!r}, choose from {sorted(PRESETS)}")
+    return color_transform(PRESETS[name](**parameters), implementation)
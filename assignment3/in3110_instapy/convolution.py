@@ -0,0 +1,236 @@
+"""Convolution with numpy
+
+Blur, sharpen and edge detection (see e.g. numpy_filters.numpy_blur)
+are convolutions of every channel with a small kernel. A naive 2D convolution costs one multiply-add per kernel
+element per pixel, so this module has faster paths, picked by `convolve`:
+
+- separable kernels (e.g. gaussian blur, sobel) are applied as two 1D passes,
+  2k instead of k*k operations per pixel
+- large kernels are applied with the FFT, whose cost doesn't grow with
+  the kernel size
+- box blur uses running sums, a constant number of operations per pixel
+  for any radius
+
+Edges are extended (the border pixels repeat), and results are rounded
+and clipped to [0, 255].
+"""
+from __future__ import annotations
+
+from typing import Tuple, Union
+
+import numpy as np
+
+# separable kernels longer than this are applied with the FFT
+# (where they cross over on a 640x480 image)
+FFT_SEPARABLE_SIZE = 21
+# non-separable kernels with more elements than this are applied with the FFT
+FFT_AREA = 49
+
+Kernel = Union[np.array, Tuple[np.array, np.array]]
+
+
+def gaussian_kernel(sigma: float) -> np.array:
+    """Return a normalized 1D gaussian kernel, with radius 3 sigma"""
+    if sigma <= 0:
+        raise ValueError(f"sigma must be positive, got {sigma=}")
+    radius = max(1, int(np.ceil(3 * sigma)))
+    x = np.arange(-radius, radius + 1)
+    kernel = np.exp(-(x**2) / (2 * sigma**2))
+    return kernel / kernel.sum()
+
+
+def box_kernel(radius: int) -> np.array:
+    """Return a normalized 1D box kernel"""
+    if radius < 0:
+        raise ValueError(f"radius must not be negative, got {radius=}")
+    return np.full(2 * radius + 1, 1 / (2 * radius + 1))
+
+
+def sharpen_kernel(amount: float = 1) -> np.array:
+    """Return a 3x3 sharpening kernel (the image plus amount times its negative laplacian)"""
+    return np.array(
+        [
+            [0, -amount, 0],
+            [-amount, 1 + 4 * amount, -amount],
+            [0, -amount, 0],
+        ]
+    )
+
+
+# sobel derivatives are separable: smooth along one axis, differentiate along the other
+SOBEL_SMOOTH = np.array([1.0, 2.0, 1.0])
+SOBEL_DIFF = np.array([1.0, 0.0, -1.0])
+
+
+def separate(kernel: np.array, tolerance: float = 1e-10) -> Tuple[np.array, np.array] | None:
+    """Split a 2D kernel into (column, row) 1D kernels, if it is separable
+
+    A kernel is separable if it has rank 1, i.e. it is the outer product
+    `np.outer(column, row)`.
+
+    Returns:
+        (column, row) kernels, or None if the kernel isn't separable
+    """
+    u, s, vt = np.linalg.svd(kernel)
+    if s[0] == 0 or (len(s) > 1 and s[1] > tolerance * s[0]):
+        return None
+    scale = np.sqrt(s[0])
+    return u[:, 0] * scale, vt[0] * scale
+
+
+def _pad(image: np.array, rows: int, cols: int) -> np.array:
+    """Extend the edges of an image, as float64"""
+    return np.pad(image.astype(np.float64), ((rows, rows), (cols, cols), (0, 0)), mode="edge")
+
+
+def _check_odd(shape: tuple) -> None:
+    if any(n % 2 == 0 for n in shape):
+        raise ValueError(f"kernel sizes must be odd, got {shape}")
+
+
+def to_image(result: np.array, out: np.array = None) -> np.array:
+    """Round and clip a float result, and write it to a uint8 image"""
+    if out is None:
+        out = np.empty(result.shape, dtype=np.uint8)
+    np.rint(result, out=result)
+    np.clip(result, 0, 255, out=result)
+    out[...] = result
+    return out
+
+
+def correlate_naive(image: np.array, kernel: np.array) -> np.array:
+    """Correlate every channel with a 2D kernel, one shifted image per kernel element
+
+    This is the plain 2D algorithm the fast paths are compared to.
+
+    Returns:
+        np.array: the float64 result
+    """
+    _check_odd(kernel.shape)
+    height, width = image.shape[:2]
+    padded = _pad(image, kernel.shape[0] // 2, kernel.shape[1] // 2)
+    result = np.zeros(image.shape, dtype=np.float64)
+    for i in range(kernel.shape[0]):
+        for j in range(kernel.shape[1]):
+            if kernel[i, j]:
+                result += kernel[i, j] * padded[i : i + height, j : j + width]
+    return result
+
+
+def correlate_separable(image: np.array, column: np.array, row: np.array) -> np.array:
+    """Correlate every channel with `np.outer(column, row)`, as two 1D passes
+
+    Returns:
+        np.array: the float64 result
+    """
+    _check_odd((len(column), len(row)))
+    height, width = image.shape[:2]
+    padded = _pad(image, len(column) // 2, len(row) // 2)
+    # along the rows (horizontally) first
+    horizontal = np.zeros((padded.shape[0], width, image.shape[2]), dtype=np.float64)
+    for j, weight in enumerate(row):
+        if weight:
+            horizontal += weight * padded[:, j : j + width]
+    result = np.zeros(image.shape, dtype=np.float64)
+    for i, weight in enumerate(column):
+        if weight:
+            result += weight * horizontal[i : i + height]
+    return result
+
+
+def correlate_fft(image: np.array, kernel: np.array) -> np.array:
+    """Correlate every channel with a 2D kernel, using the FFT
+
+    Returns:
+        np.array: the float64 result
+    """
+    _check_odd(kernel.shape)
+    height, width = image.shape[:2]
+    padded = _pad(image, kernel.shape[0] // 2, kernel.shape[1] // 2)
+    # correlation is convolution with the flipped kernel
+    kernel = kernel[::-1, ::-1]
+    shape = (padded.shape[0] + kernel.shape[0] - 1, padded.shape[1] + kernel.shape[1] - 1)
+    spectrum = np.fft.rfft2(padded, s=shape, axes=(0, 1))
+    spectrum *= np.fft.rfft2(kernel, s=shape)[:, :, np.newaxis]
+    full = np.fft.irfft2(spectrum, s=shape, axes=(0, 1))
+    # the part where the kernel is fully inside the padded image
+    top, left = kernel.shape[0] - 1, kernel.shape[1] - 1
+    return full[top : top + height, left : left + width]
+
+
+def box_sums(image: np.array, radius: int) -> np.array:
+    """Sum every channel over (2 radius + 1)^2 boxes, with running sums
+
+    Returns:
+        np.array: the int64 box sums
+    """
+    if radius < 0:
+        raise ValueError(f"radius must not be negative, got {radius=}")
+    size = 2 * radius + 1
+    padded = np.pad(image, ((radius, radius), (radius, radius), (0, 0)), mode="edge").astype(np.int64)
+    for axis in (0, 1):
+        # the sum over a window is the difference of two prefix sums
+        sums = np.cumsum(padded, axis=axis)
+        sums = np.insert(sums, 0, 0, axis=axis)
+        if axis == 0:
+            padded = sums[size:] - sums[:-size]
+        else:
+            padded = sums[:, size:] - sums[:, :-size]
+    return padded
+
+
+def correlate(image: np.array, kernel: Kernel, method: str = "auto") -> np.array:
+    """Correlate every channel with a kernel, picking the fastest method
+
+    Args:
+        image (np.array): the image
+        kernel (np.array or (column, row) tuple): a 2D kernel with odd sizes,
+            or the two 1D kernels of a separable one
+        method (str): 'auto', 'naive', 'separable' or 'fft'
+    Returns:
+        np.array: the float64 result
+    """
+    if isinstance(kernel, tuple):
+        column, row = kernel
+        kernel = np.outer(column, row)
+    else:
+        kernel = np.asarray(kernel, dtype=np.float64)
+        parts = separate(kernel)
+        column, row = parts if parts else (None, None)
+
+    if method == "auto":
+        if column is not None:
+            method = "separable" if max(kernel.shape) <= FFT_SEPARABLE_SIZE else "fft"
+        else:
+            method = "naive" if kernel.size <= FFT_AREA else "fft"
+
+    if method == "naive":
+        return correlate_naive(image, kernel)
+    if method == "separable":
+        if column is None:
+            raise ValueError("kernel is not separable")
+        return correlate_separable(image, column, row)
+    if method == "fft":
+        return correlate_fft(image, kernel)
+    raise ValueError(f"method must be 'auto', 'naive', 'separable' or 'fft', got {method=}")
+
+
+def convolve(image: np.array, kernel: Kernel, out: np.array = None, method: str = "auto") -> np.array:
+    """Convolve every channel of an image with a kernel
+
+    Args:
+        image (np.array): the image
+        kernel (np.array or (column, row) tuple): a 2D kernel with odd sizes,
+            or the two 1D kernels of a separable one
+        out (np.array): array to write the result to (optional).
+            May be `image` itself, to filter in place.
+        method (str): 'auto', 'naive', 'separable' or 'fft'
+    Returns:
+        np.array: the filtered image
+    """
+    if isinstance(kernel, tuple):
+        kernel = (kernel[0][::-1], kernel[1][::-1])
+    else:
+        kernel = np.asarray(kernel)[::-1, ::-1]
+    return to_image(correlate(image, kernel, method), out)
+
@@ -10,29 +10,122 @@ if not C.compiled:
     )
 
 from cython.cimports.libc.stdint import uint8_t  # noqa
+from cython.parallel import prange
+
+from .color import GRAY_MATRIX, as_affine, sepia_matrix
 
 # we may need a 'const uint8_t' type to make sure we accept 'read-only' arrays
 const_uint8_t = C.typedef("const uint8_t")
 float64_t = C.typedef(C.double)
+const_float64_t = C.typedef("const double")
+
+GRAY_AFFINE = as_affine(GRAY_MATRIX)
+
+
+@C.cfunc
+@C.nogil
+@C.exceptval(check=False)
+@C.boundscheck(False)
+@C.wraparound(False)
+def _color_transform(
+    image: const_uint8_t[:, :, :], matrix: const_float64_t[:, :], same_rows: C.bint, out: uint8_t[:, :, :]
+) -> C.void:
+    """Write the affine color transform of image to out (with 1 or 3 channels), rows in parallel
 
+    With `same_rows` (like gray), every channel gets the first row's value.
+    """
+    row: C.Py_ssize_t
+    col: C.Py_ssize_t
+    value: uint8_t
+    r: float64_t
+    g: float64_t
+    b: float64_t
+    # (in locals: writing uint8 may alias anything, so the compiler
+    #  would read the matrix again for every pixel)
+    m00: float64_t = matrix[0, 0]
+    m01: float64_t = matrix[0, 1]
+    m02: float64_t = matrix[0, 2]
+    m03: float64_t = matrix[0, 3]
+    m10: float64_t = matrix[1, 0]
+    m11: float64_t = matrix[1, 1]
+    m12: float64_t = matrix[1, 2]
+    m13: float64_t = matrix[1, 3]
+    m20: float64_t = matrix[2, 0]
+    m21: float64_t = matrix[2, 1]
+    m22: float64_t = matrix[2, 2]
+    m23: float64_t = matrix[2, 3]
+    channels: C.Py_ssize_t = out.shape[2]
+
+    for row in prange(image.shape[0]):
+        for col in range(image.shape[1]):
+            # read the whole pixel before writing, so out may be image
+            r = image[row, col, 0]
+            g = image[row, col, 1]
+            b = image[row, col, 2]
+            value = C.cast(uint8_t, min(255.0, max(0.0, m00 * r + m01 * g + m02 * b + m03)))
+            out[row, col, 0] = value
+            if channels == 1:
+                continue
+            if same_rows:
+                out[row, col, 1] = value
+                out[row, col, 2] = value
+            else:
+                out[row, col, 1] = C.cast(uint8_t, min(255.0, max(0.0, m10 * r + m11 * g + m12 * b + m13)))
+                out[row, col, 2] = C.cast(uint8_t, min(255.0, max(0.0, m20 * r + m21 * g + m22 * b + m23)))
 
-def cython_color2gray(image):
+
+def cython_color2gray(image, out=None):
     """Convert rgb pixel array to grayscale
 
     Args:
         image (np.array)
+        out (np.array): array to write the result to (optional).
+            May be `image` itself, to filter in place, or have
+            shape (H, W) to get a single gray channel.
     Returns:
         np.array: gray_image
     """
-    ...
+    return cython_color_transform(image, GRAY_AFFINE, out)
 
 
-def cython_color2sepia(image):
+def cython_color2sepia(image, k=1, out=None):
     """Convert rgb pixel array to sepia
 
     Args:
         image (np.array)
+        k (float): amount of sepia (optional), from 0 (none) to 1 (full sepia)
+        out (np.array): array to write the result to (optional).
+            May be `image` itself, to filter in place.
     Returns:
-        np.array: gray_image
+        np.array: sepia_image
+    """
+    return cython_color_transform(image, sepia_matrix(k), out)
+
+
+def cython_color_transform(image, matrix, out=None):
+    """Apply a color matrix to every pixel, clipping to [0, 255]
+
+    Args:
+        image (np.array)
+        matrix (np.array): 3x3 color matrix, or 3x4 affine matrix
+            with the offsets in the last column (see color.py)
+        out (np.array): array to write the result to (optional).
+            May be `image` itself, to filter in place, or have shape (H, W)
+            to get a single channel, if every row of the matrix is the same.
+    Returns:
+        np.array: the transformed image
     """
-    ...
+    if out is None:
+        out = np.empty_like(image)
+    matrix = as_affine(matrix)
+    channels = out[:, :, np.newaxis] if out.ndim == 2 else out
+    same_rows = bool((matrix == matrix[0]).all())
+    if channels.shape[2] == 1 and not same_rows:
+        raise ValueError(f"a (H, W) out needs the same matrix row for every channel, got {out.shape=}")
+    image_view: const_uint8_t[:, :, :] = image
+    matrix_view: const_float64_t[:, :] = matrix
+    out_view: uint8_t[:, :, :] = channels
+    # release the GIL, so other threads can filter meanwhile
+    with C.nogil:
+        _color_transform(image_view, matrix_view, same_rows, out_view)
+    return out
@@ -0,0 +1,213 @@
+"""Filter daemon: keeps the filters imported, compiled and warm
+
+Every run of the instapy CLI imports numpy (and numba), and the first call
+of a numba filter loads or compiles its kernel, which takes far longer
+than filtering one image. The daemon does this once, then filters images
+sent over a Unix domain socket (see client.py for the protocol and the
+thin client), one thread per connection. Requests for numba_parallel
+take turns, since its thread pool can only run one image at a time.
+
+    instapy-daemon -i numba numpy &
+    instapy-client rain.jpg -o rain_sepia.jpg -se
+
+Images can be sent as file paths, or as the name of a shared memory block
+holding the pixels, which the daemon filters without copying.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import socket
+import socketserver
+import sys
+import threading
+import time
+from contextlib import nullcontext
+from functools import lru_cache
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+from . import get_filter, io
+from .client import default_socket
+from .parallel import ThreadBandExecutor
+
+# the filters and implementations kept warm by default
+FILTERS = ["color2gray", "color2sepia"]
+IMPLEMENTATIONS = ["numba", "numpy"]
+
+# numba_parallel (and auto, which may pick it) runs a whole image on numba's
+# own thread pool, which can't be started from several threads at once,
+# so requests for them take turns (see parallel.ThreadBandExecutor)
+_thread_pool_lock = threading.Lock()
+
+
+@lru_cache(maxsize=None)
+def _filter(filter: str, implementation: str):
+    # get_filter imports the module every time, keep the functions around
+    return get_filter(filter, implementation)
+
+
+def warm_up(filters: list[str] = FILTERS, implementations: list[str] = IMPLEMENTATIONS) -> list[str]:
+    """Import and compile filters, by calling them on a tiny image
+
+    Returns:
+        list of str: the warm filters, as 'implementation_filter'
+    """
+    image = np.zeros((2, 2, 3), dtype=np.uint8)
+    warm = []
+    for implementation in implementations:
+        for filter in filters:
+            filter_function = _filter(filter, implementation)
+            # with and without out, and a single gray channel
+            filter_function(image)
+            filter_function(image, out=np.empty_like(image))
+            if filter == "color2gray":
+                filter_function(image, out=np.empty(image.shape[:2], dtype=np.uint8))
+            warm.append(f"{implementation}_{filter}")
+    return warm
+
+
+def start_thread_pool() -> None:
+    """Start numba's thread pool (for numba_parallel) from the main thread
+
+    If a connection's thread started it instead, the daemon would hang
+    when it exits.
+    """
+    from .numba_parallel_filters import numba_parallel_color2gray
+
+    numba_parallel_color2gray(np.zeros((1, 1, 3), dtype=np.uint8))
+
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    """Open a client's shared memory block, without taking ownership of it"""
+    shm = shared_memory.SharedMemory(name=name)
+    # (otherwise our resource tracker unlinks the block when we exit)
+    resource_tracker.unregister(shm._name, "shared_memory")
+    return shm
+
+
+def filter_request(message: dict) -> dict:
+    """Run a 'filter' or 'filter_shared' request
+
+    Returns:
+        dict: the reply, with the filtering time in 'seconds'
+    """
+    implementation = message.get("implementation", "numba")
+    filter_function = _filter(message.get("filter", "color2gray"), implementation)
+    kwargs = message.get("kwargs") or {}
+    lock = _thread_pool_lock if implementation in ThreadBandExecutor.UNSUPPORTED else nullcontext()
+
+    if message["op"] == "filter":
+        scale = message.get("scale", 1)
+        image = io.read_image(message["file"]) if scale == 1 else io.read_image_scaled(message["file"], scale)
+        out = np.empty(image.shape[:2], dtype=np.uint8) if message.get("single_channel") else None
+        with lock:
+            start = time.perf_counter()
+            filtered = filter_function(image, out=out, **kwargs)
+            seconds = time.perf_counter() - start
+        io.write_image(filtered, message["out"])
+        return {"ok": True, "seconds": seconds}
+
+    shape = tuple(message["shape"])
+    image_shm = _attach(message["name"])
+    out_shm = _attach(message["out_name"]) if message.get("out_name") else image_shm
+    image = out = None
+    try:
+        image = np.ndarray(shape, dtype=np.uint8, buffer=image_shm.buf)
+        out = np.ndarray(shape, dtype=np.uint8, buffer=out_shm.buf)
+        with lock:
+            start = time.perf_counter()
+            filter_function(image, out=out, **kwargs)
+            seconds = time.perf_counter() - start
+    finally:
+        # drop the views before closing, or close() fails
+        del image, out
+        image_shm.close()
+        out_shm.close()
+    return {"ok": True, "seconds": seconds}
+
+
+class FilterServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Serves filter requests on a Unix domain socket, one thread per connection"""
+
+    daemon_threads = True
+
+    def __init__(self, socket_path: str, warm: list[str] = ()):
+        if os.path.exists(socket_path):
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+                try:
+                    sock.connect(socket_path)
+                except ConnectionRefusedError:
+                    # left over from a daemon that didn't exit cleanly
+                    os.unlink(socket_path)
+                else:
+                    raise OSError(f"a daemon is already listening on {socket_path}")
+        super().__init__(socket_path, _Handler)
+        self.socket_path = socket_path
+        self.warm = list(warm)
+
+    def server_close(self):
+        super().server_close()
+        try:
+            os.unlink(self.socket_path)
+        except FileNotFoundError:
+            pass
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    """Replies to every request line on a connection"""
+
+    def handle(self):
+        for line in self.rfile:
+            try:
+                message = json.loads(line)
+                op = message.get("op")
+                if op in ("filter", "filter_shared"):
+                    reply = filter_request(message)
+                elif op == "ping":
+                    reply = {"ok": True, "pid": os.getpid(), "warm": self.server.warm}
+                elif op == "stop":
+                    reply = {"ok": True}
+                    # (shutdown waits for serve_forever, so not from this thread)
+                    threading.Thread(target=self.server.shutdown).start()
+                else:
+                    reply = {"ok": False, "error": f"unknown op {op!r}"}
+            except Exception as e:
+                reply = {"ok": False, "error": f"{type(e).__name__}: {e}"}
+            self.wfile.write(json.dumps(reply).encode() + b"\n")
+
+
+def serve(
+    socket_path: str = None,
+    filters: list[str] = FILTERS,
+    implementations: list[str] = IMPLEMENTATIONS,
+) -> None:
+    """Warm up the filters, then serve requests until a 'stop' request
+
+    Args:
+        socket_path (str): the socket to listen on (optional, see client.default_socket)
+        filters (list of str): the filters to warm up
+        implementations (list of str): the implementations to warm up.
+            Others can still be requested, they are warmed up by their first request.
+    """
+    warm = warm_up(filters, implementations)
+    start_thread_pool()
+    with FilterServer(socket_path or default_socket(), warm) as server:
+        print(f"instapy daemon listening on {server.socket_path}", file=sys.stderr)
+        server.serve_forever()
+
+
+def main(argv=None) -> None:
+    """Run the daemon from the command-line"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--socket", default=None, help="The socket to listen on (default: $INSTAPY_SOCKET, or instapy.sock in $XDG_RUNTIME_DIR or /tmp)")
+    parser.add_argument("-f", "--filters", nargs="+", default=FILTERS, help="The filters to warm up")
+    parser.add_argument("-i", "--implementations", nargs="+", default=IMPLEMENTATIONS, help="The implementations to warm up")
+    args = parser.parse_args(argv)
+    serve(args.socket, args.filters, args.implementations)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,23 +2,214 @@
 
 for reading, writing, and displaying image files
 as numpy arrays
+
+Besides the formats PIL can read and write, images can be stored as
+undecoded uint8 arrays, in `.npy` files or in `.raw` files (a 32 byte
+header with the shape, then the pixels). These are memory-mapped:
+reading one doesn't decode or copy anything, the returned array is backed
+by the page cache, and writing one copies the pixels straight into the file.
 """
 from __future__ import annotations
 
+import struct
+from pathlib import Path
+from typing import Iterable, Iterator, Tuple
+
 import numpy as np
 from PIL import Image
 
+from .tiling import DEFAULT_TILE_SIZE, TileSize, iter_tiles
+
+# file extensions of the memory-mapped array formats
+ARRAY_SUFFIXES = {".npy", ".raw"}
+
+# .raw header: magic, height, width, channels (0 for (H, W) images),
+# padded to 32 bytes so the pixels are aligned
+RAW_MAGIC = b"INSTARAW"
+RAW_HEADER = struct.Struct("<8s3I12x")
+
+
+def is_array_file(filename: str) -> bool:
+    """Whether a file is in one of the memory-mapped array formats"""
+    return Path(filename).suffix.lower() in ARRAY_SUFFIXES
+
+
+def _read_raw_header(filename: str) -> tuple:
+    """Return the shape of the image in a .raw file"""
+    with open(filename, "rb") as f:
+        header = f.read(RAW_HEADER.size)
+    if len(header) < RAW_HEADER.size or not header.startswith(RAW_MAGIC):
+        raise ValueError(f"{filename} is not a raw image file")
+    _, height, width, channels = RAW_HEADER.unpack(header)
+    return (height, width, channels) if channels else (height, width)
+
+
+def map_array(filename: str, mode: str = "r") -> np.array:
+    """Memory-map the image in a .npy or .raw file
+
+    Args:
+        filename (str): the .npy or .raw file
+        mode (str): 'r' for read-only, 'r+' to write to the file through
+            the array, or 'c' for copy-on-write (changes stay in memory)
+    Returns:
+        np.memmap: the uint8 image, backed by the file
+    """
+    if Path(filename).suffix.lower() == ".npy":
+        array = np.load(filename, mmap_mode=mode)
+        if array.dtype != np.uint8 or array.ndim not in (2, 3):
+            raise ValueError(f"{filename} is not a uint8 image, got {array.dtype} array with shape {array.shape}")
+        return array
+    shape = _read_raw_header(filename)
+    return np.memmap(filename, dtype=np.uint8, mode=mode, offset=RAW_HEADER.size, shape=shape)
+
+
+def create_array(filename: str, shape: tuple) -> np.array:
+    """Create a .npy or .raw file for a uint8 image, and memory-map it for writing
+
+    Args:
+        filename (str): the .npy or .raw file
+        shape (tuple): the shape of the image, (H, W, C) or (H, W)
+    Returns:
+        np.memmap: the (uninitialized) image, backed by the file
+    """
+    if len(shape) not in (2, 3):
+        raise ValueError(f"image must have 2 or 3 dimensions, got {shape=}")
+    if Path(filename).suffix.lower() == ".npy":
+        return np.lib.format.open_memmap(filename, mode="w+", dtype=np.uint8, shape=tuple(shape))
+    height, width = shape[:2]
+    channels = shape[2] if len(shape) == 3 else 0
+    with open(filename, "wb") as f:
+        f.write(RAW_HEADER.pack(RAW_MAGIC, height, width, channels))
+    return np.memmap(filename, dtype=np.uint8, mode="r+", offset=RAW_HEADER.size, shape=tuple(shape))
+
+
+def image_size(filename: str) -> tuple:
+    """Return the (height, width) of an image file, without reading its pixels"""
+    if is_array_file(filename):
+        return map_array(filename).shape[:2]
+    with Image.open(filename) as image:
+        return (image.height, image.width)
+
 
 def read_image(filename: str) -> np.array:
-    """Read an image file to an rgb array"""
+    """Read an image file to an rgb array
+
+    .npy and .raw files are memory-mapped (read-only), not read.
+    """
+    if is_array_file(filename):
+        return map_array(filename)
     return np.asarray(Image.open(filename))
 
 
+def read_image_scaled(filename: str, scale: float) -> np.array:
+    """Read an image file to an rgb array, resized by a factor
+
+    The file is decoded only once. When shrinking a JPEG, the decoder
+    reduces it by 1/2, 1/4 or 1/8 while decoding (PIL's draft mode,
+    scaling in the DCT domain), so only the last bit of resizing is done
+    on the decoded pixels.
+
+    Args:
+        filename (str): the image file to read
+        scale (float): the scale factor, e.g. 0.5 for half the width and height
+    Returns:
+        np.array: the resized image, a contiguous uint8 array
+    """
+    if scale <= 0:
+        raise ValueError(f"scale must be positive, got {scale=}")
+    if is_array_file(filename):
+        image = map_array(filename)
+        if scale == 1:
+            return image
+        size = (max(1, int(image.shape[1] * scale)), max(1, int(image.shape[0] * scale)))
+        return np.asarray(Image.fromarray(image).resize(size))
+    with Image.open(filename) as image:
+        size = (max(1, int(image.width * scale)), max(1, int(image.height * scale)))
+        if image.format == "JPEG" and scale < 1:
+            # the decoder picks the largest reduction still at least `size`
+            image.draft(image.mode, size)
+        if image.size != size:
+            image = image.resize(size)
+        return np.ascontiguousarray(np.asarray(image))
+
+
 def write_image(array: np.array, filename: str) -> None:
-    """Write a numpy pixel array to a file"""
+    """Write a numpy pixel array to a file
+
+    (H, W) arrays, like a single-channel gray image, are saved as
+    single-channel ("L" mode) images.
+    .npy and .raw files are written through a memory map.
+    """
+    if is_array_file(filename):
+        mapped = create_array(filename, array.shape)
+        mapped[...] = array
+        mapped.flush()
+        return
     return Image.fromarray(array).save(filename)
 
 
+def read_image_tiles(
+    filename: str, tile_size: TileSize = DEFAULT_TILE_SIZE
+) -> Iterator[Tuple[Tuple[slice, slice], np.array]]:
+    """Read an image file one tile at a time
+
+    The file is decoded once by PIL, but only one tile at a time
+    is converted to a numpy array.
+    Tiles of .npy and .raw files are views of the memory-mapped file.
+
+    Args:
+        filename (str): the image file to read
+        tile_size (int or (int, int)): the size of a tile, (rows, cols)
+    Returns:
+        iterator of ((row_slice, col_slice), tile) tuples
+    """
+    if is_array_file(filename):
+        image = map_array(filename)
+        for rows, cols in iter_tiles(image.shape[:2], tile_size):
+            yield (rows, cols), image[rows, cols]
+        return
+    with Image.open(filename) as image:
+        shape = (image.height, image.width)
+        for rows, cols in iter_tiles(shape, tile_size):
+            box = (cols.start, rows.start, cols.stop, rows.stop)
+            yield (rows, cols), np.asarray(image.crop(box))
+
+
+def write_image_tiles(
+    tiles: Iterable[Tuple[Tuple[slice, slice], np.array]], size: tuple, filename: str
+) -> None:
+    """Write tiles from e.g. `read_image_tiles` to an image file
+
+    Each tile is pasted into the output image as it arrives,
+    so the full frame is never held as a numpy array.
+    For .npy and .raw files, tiles are copied straight into the mapped file.
+
+    Args:
+        tiles (iterable): ((row_slice, col_slice), tile) tuples
+        size (tuple): the size of the full image, (height, width)
+        filename (str): the file to write
+    """
+    height, width = size[:2]
+    image = None
+    if is_array_file(filename):
+        for (rows, cols), tile in tiles:
+            if image is None:
+                image = create_array(filename, (height, width) + tile.shape[2:])
+            image[rows, cols] = tile
+        if image is None:
+            raise ValueError("no tiles to write")
+        image.flush()
+        return
+    for (rows, cols), tile in tiles:
+        tile = Image.fromarray(tile)
+        if image is None:
+            image = Image.new(tile.mode, (width, height))
+        image.paste(tile, (cols.start, rows.start))
+    if image is None:
+        raise ValueError("no tiles to write")
+    image.save(filename)
+
+
 def random_image(width: int = 320, height: int = 180) -> np.array:
     """Create a random image array of a given size"""
     return np.random.randint(0, 255, size=(height, width, 3), dtype=np.uint8)
@@ -0,0 +1,232 @@
+"""lookup-table implementation of image filters
+
+Color matrices (like gray and sepia) are linear in each channel, so every
+output channel is a sum of three per-channel terms `M[c, i] * value`.
+These terms only have 256 possible values each, so we precompute them once
+as 16.16 fixed-point integers, and filtering becomes integer table lookups
+and additions. (Affine offsets are folded into the first channel's table.)
+
+The image is filtered in blocks of rows, into small reused buffers. When
+no term is negative (like sepia), the three output channels are packed in
+one int64 per term, so a pixel takes three lookups instead of nine.
+"""
+from __future__ import annotations
+
+from functools import lru_cache
+
+import numpy as np
+
+from .color import GRAY_MATRIX, sepia_matrix
+
+# number of fractional bits in the fixed-point tables
+SHIFT = 16
+
+# number of fractional bits in the packed tables (see _pack_tables)
+PACKED_SHIFT = 7
+
+# target size of the integer buffers for a block of rows
+BLOCK_BYTES = 2**18
+
+
+def _make_tables(matrix: np.array) -> np.array:
+    """Build fixed-point lookup tables for a color matrix
+
+    Args:
+        matrix (np.array): 3x3 matrix, output channel by input channel,
+            or 3x4 affine matrix with the offsets in the last column
+    Returns:
+        np.array: int32 tables of shape (3, 3, 256), where
+            tables[c, i, v] is `matrix[c, i] * v` in fixed point
+            (plus the offset of channel c, for i=0)
+    """
+    matrix = np.asarray(matrix, dtype=np.float64)
+    values = np.arange(256, dtype=np.float64)
+    terms = matrix[:, :3, np.newaxis] * values
+    if matrix.shape[1] == 4:
+        terms[:, 0] += matrix[:, 3, np.newaxis]
+    # the sum of three terms must fit in an int32
+    if np.abs(terms).max(axis=2).sum(axis=1).max() * (1 << SHIFT) >= 2**31:
+        raise ValueError("color matrix is too large for the fixed-point lookup tables")
+    tables = np.rint(terms * (1 << SHIFT)).astype(np.int32)
+    # the tables are cached and shared, make sure nobody changes them
+    tables.flags.writeable = False
+    return tables
+
+
+@lru_cache()
+def gray_tables() -> np.array:
+    """Return the (cached) lookup tables for color2gray"""
+    return _make_tables(GRAY_MATRIX)
+
+
+@lru_cache()
+def sepia_tables(k: float = 1) -> np.array:
+    """Return the (cached) lookup tables for color2sepia with sepia amount k"""
+    return _make_tables(sepia_matrix(k))
+
+
+@lru_cache(maxsize=64)
+def _cached_tables(shape: tuple, data: bytes) -> np.array:
+    return _make_tables(np.frombuffer(data).reshape(shape))
+
+
+def color_tables(matrix: np.array) -> np.array:
+    """Return the (cached) lookup tables for any color matrix"""
+    matrix = np.ascontiguousarray(matrix, dtype=np.float64)
+    return _cached_tables(matrix.shape, matrix.tobytes())
+
+
+def _pack_tables(tables: np.array) -> np.array | None:
+    """Pack the three output channels of each table entry into one int64
+
+    Each int64 holds four uint16 fields: the output channels, in fixed point
+    with PACKED_SHIFT fractional bits, and an unused one. As long as no
+    field overflows, a single sum of three lookups computes all three
+    channels at once, and viewing the sum as uint16 unpacks them.
+
+    Returns:
+        np.array: int64 tables of shape (3, 256), by input channel,
+            or None if a term is negative or a sum could overflow its field
+    """
+    if tables.min() < 0:
+        return None
+    shift = SHIFT - PACKED_SHIFT
+    fields = (tables.astype(np.int64) + (1 << (shift - 1))) >> shift
+    if fields.max(axis=2).sum(axis=1).max() >= 1 << 16:
+        return None
+    packed = np.zeros((3, 256, 4), dtype=np.uint16)
+    # (by input channel, value and output channel)
+    packed[..., :3] = fields.transpose(1, 2, 0)
+    return packed.view(np.int64)[..., 0]
+
+
+def _lookup(tables: np.array, pixels: np.array, acc: np.array, tmp: np.array) -> np.array:
+    """Sum the table entries of the three channels of a block of pixels into `acc`"""
+    # (mode="clip" skips the bounds check, which would also buffer `out`:
+    #  uint8 values are always in the tables)
+    np.take(tables[0], pixels[..., 0], out=acc, mode="clip")
+    for i in (1, 2):
+        np.take(tables[i], pixels[..., i], out=tmp, mode="clip")
+        acc += tmp
+    return acc
+
+
+def _to_uint8(acc: np.array, shift: int, floor: np.array = None, ceiling: np.array = None) -> np.array:
+    """Convert fixed-point sums back to [0, 255], in place
+
+    `floor` and `ceiling` are rows of 0 and 255, only given if the sums can
+    leave [0, 255]. (np.minimum is several times faster with a row to
+    broadcast than with a scalar.)
+    """
+    # truncating like the float implementations
+    acc >>= shift
+    if floor is not None:
+        np.maximum(acc, floor, out=acc)
+    if ceiling is not None:
+        np.minimum(acc, ceiling, out=acc)
+    return acc
+
+
+def _apply_tables(image: np.array, tables: np.array, out: np.array = None) -> np.array:
+    """Compute every output channel with its tables, and write them to out
+
+    Like numpy_color_transform, the image is converted in blocks of rows,
+    into integer buffers reused for every block.
+    """
+    if out is None:
+        out = np.empty_like(image)
+    height, width = image.shape[:2]
+    if height == 0 or width == 0:
+        return out
+
+    if np.array_equal(tables[0], tables[1]) and np.array_equal(tables[0], tables[2]):
+        # all three channels are the same (like gray), compute it once
+        tables = tables[:1]
+        packed = None
+    elif out.ndim == 2:
+        raise ValueError(f"a (H, W) out needs the same tables for every channel, got {out.shape=}")
+    else:
+        packed = _pack_tables(tables)
+
+    if packed is not None:
+        block_rows = max(1, BLOCK_BYTES // (width * 8))
+        acc, tmp = np.empty((2, min(block_rows, height), width), dtype=np.int64)
+        channel = np.empty(acc.shape, dtype=np.uint16)
+        # (the packed sums are not clipped yet)
+        ceiling = np.full(width, 255, dtype=np.uint16)
+        for top in range(0, height, block_rows):
+            rows = slice(top, min(top + block_rows, height))
+            n = rows.stop - rows.start
+            # all three channels are in acc before anything is written (out may be image)
+            sums = _lookup(packed, image[rows], acc[:n], tmp[:n]).view(np.uint16).reshape(n, width, 4)
+            for c in range(3):
+                np.copyto(channel[:n], sums[..., c])
+                out[rows, :, c] = _to_uint8(channel[:n], PACKED_SHIFT, ceiling=ceiling)
+        return out
+
+    # only clip where the sums can actually leave [0, 255]
+    floor = np.zeros(width, dtype=np.int32) if tables.min() < 0 else None
+    ceiling = np.full(width, 255, dtype=np.int32) if tables.max(axis=2).sum(axis=1).max() >= 256 << SHIFT else None
+    block_rows = max(1, BLOCK_BYTES // (width * 4))
+    # one buffer per output channel, and one for the lookups
+    buffers = np.empty((len(tables) + 1, min(block_rows, height), width), dtype=np.int32)
+    for top in range(0, height, block_rows):
+        rows = slice(top, min(top + block_rows, height))
+        pixels = image[rows]
+        blocks = buffers[:, : len(pixels)]
+        # every output channel depends on all input channels,
+        # so compute them all before writing (out may be image)
+        for c in range(len(tables)):
+            _to_uint8(_lookup(tables[c], pixels, blocks[c], blocks[-1]), SHIFT, floor, ceiling)
+        if out.ndim == 2:
+            out[rows] = blocks[0]
+            continue
+        # (a channel at a time: broadcasting one channel to all three is much slower)
+        for c in range(3):
+            out[rows, :, c] = blocks[c if len(tables) == 3 else 0]
+    return out
+
+
+def lut_color2gray(image: np.array, out: np.array = None) -> np.array:
+    """Convert rgb pixel array to grayscale
+
+    Args:
+        image (np.array)
+        out (np.array): array to write the result to (optional).
+            May be `image` itself, to filter in place, or have
+            shape (H, W) to get a single gray channel.
+    Returns:
+        np.array: gray_image
+    """
+    return _apply_tables(image, gray_tables(), out)
+
+
+def lut_color2sepia(image: np.array, k: float = 1, out: np.array = None) -> np.array:
+    """Convert rgb pixel array to sepia
+
+    Args:
+        image (np.array)
+        k (float): amount of sepia (optional), from 0 (none) to 1 (full sepia)
+        out (np.array): array to write the result to (optional).
+            May be `image` itself, to filter in place.
+    Returns:
+        np.array: sepia_image
+    """
+    return _apply_tables(image, sepia_tables(k), out)
+
+
+def lut_color_transform(image: np.array, matrix: np.array, out: np.array = None) -> np.array:
+    """Apply a color matrix to every pixel, clipping to [0, 255]
+
+    Tables are built once per matrix, and cached.
+
+    Args:
+        image (np.array)
+        matrix (np.array): 3x3 color matrix, or 3x4 affine matrix
+            with the offsets in the last column (see color.py)
+        out (np.array): array to write the result to (optional).
+            May be `image` itself, to filter in place.
+    Returns:
+        np.array: the transformed image
+    """
+    return _apply_tables(image, color_tables(matrix), out)
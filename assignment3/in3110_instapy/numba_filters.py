@@ -1,59 +1,311 @@
-"""numba-optimized filters"""
+"""numba-optimized filters
+
+The compiled kernels are cached on disk (`cache=True`),
+so only the first run after installing or editing pays for compilation.
+They release the GIL (`nogil=True`), so threads can run them
+on different parts of an image at once (see parallel.ThreadBandExecutor).
+"""
 from __future__ import annotations
 
 import numpy as np
 from numba import jit
+from numba.extending import overload
+from numba.np.numpy_support import is_nonelike
+
+from . import convolution
+from .color import GRAY_MATRIX, SEPIA_MATRIX, as_affine
+
+# the color2gray and color2sepia matrices, for _color_transform
+# (global arrays are compiled in as constants)
+GRAY_AFFINE = as_affine(GRAY_MATRIX)
+IDENTITY_AFFINE = as_affine(np.eye(3))
+SEPIA_AFFINE = as_affine(SEPIA_MATRIX)
+
+
+def new_output(image: np.array, out: np.array = None) -> np.array:
+    """Return `out`, or a new array like `image` if it is None"""
+    if out is None:
+        return np.empty_like(image)
+    return out
+
+
+@overload(new_output)
+def _new_output(image, out=None):
+    # picked from the type of `out` when compiling, so a (H, W) `out`
+    # never has to unify with a new (H, W, 3) array
+    if is_nonelike(out):
+        return lambda image, out=None: np.empty_like(image)
+    return lambda image, out=None: out
+
+
+def with_channels(out: np.array) -> np.array:
+    """Return `out` with a channel axis, (H, W) as (H, W, 1)"""
+    if out.ndim == 2:
+        return out[:, :, np.newaxis]
+    return out
 
-@jit(nopython=True)
-def numba_color2gray(image: np.array) -> np.array:
+
+@overload(with_channels)
+def _with_channels(out):
+    if out.ndim == 2:
+        return lambda out: out[:, :, np.newaxis]
+    return lambda out: out
+
+
+@jit(nopython=True, nogil=True, cache=True)
+def numba_color2gray(image: np.array, out: np.array = None) -> np.array:
     """Convert rgb pixel array to grayscale
 
     Args:
         image (np.array)
+        out (np.array): array to write the result to (optional).
+            May be `image` itself, to filter in place, or have
+            shape (H, W) to get a single gray channel.
     Returns:
         np.array: gray_image
     """
-    gray_image = np.empty_like(image)
-    
-    for row in range(image.shape[0]):
-        for col in range(image.shape[1]):
-            r, g, b = image[row, col]
-            gray_pixel = (0.21 * r + 0.72 * g + 0.07 * b)
-            gray_image[row, col] = gray_pixel
-
-    gray_image = gray_image.astype("uint8")
-    return gray_image
+    return _color_transform(image, GRAY_AFFINE, out)
 
 
-@jit(nopython=True)
-def numba_color2sepia(image: np.array) -> np.array:
+@jit(nopython=True, nogil=True, cache=True)
+def numba_color2sepia(image: np.array, k: float = 1, out: np.array = None) -> np.array:
     """Convert rgb pixel array to sepia
 
     Args:
         image (np.array)
+        k (float): amount of sepia (optional), from 0 (none) to 1 (full sepia)
+        out (np.array): array to write the result to (optional).
+            May be `image` itself, to filter in place.
     Returns:
         np.array: sepia_image
     """
-    sepia_image = np.empty_like(image)
-    # Iterate through the pixels
-    # applying the sepia matrix
+    return _color_transform(image, sepia_affine(k), out)
+
+
+@jit(nopython=True, nogil=True, cache=True)
+def sepia_affine(k: float = 1) -> np.array:
+    """color.sepia_matrix(k) as a 3x4 affine matrix, compiled"""
+    if not 0 <= k <= 1:
+        raise ValueError("k must be between [0-1]")
+    return (1 - k) * IDENTITY_AFFINE + k * SEPIA_AFFINE
 
-    sepia_matrix = [
-        [0.393, 0.769, 0.189],
-        [0.349, 0.686, 0.168],
-        [0.272, 0.534, 0.131],
-    ]
+
+@jit(nopython=True, nogil=True, cache=True)
+def _color_transform(image: np.array, matrix: np.array, out: np.array = None) -> np.array:
+    """Apply a 3x4 float64 affine matrix to every pixel (see numba_color_transform)"""
+    out = new_output(image, out)
+    channels = with_channels(out)
+    # (like gray: then every channel gets the first row's value)
+    same_rows = not ((matrix[1] != matrix[0]).any() or (matrix[2] != matrix[0]).any())
+    if channels.shape[2] == 1 and not same_rows:
+        raise ValueError("a (H, W) out needs the same matrix row for every channel")
+    # (in locals: numba can't tell that writing to out doesn't change the matrix,
+    #  and reads it again for every pixel otherwise, which is several times slower)
+    m00, m01, m02, m03 = matrix[0, 0], matrix[0, 1], matrix[0, 2], matrix[0, 3]
+    m10, m11, m12, m13 = matrix[1, 0], matrix[1, 1], matrix[1, 2], matrix[1, 3]
+    m20, m21, m22, m23 = matrix[2, 0], matrix[2, 1], matrix[2, 2], matrix[2, 3]
 
     for row in range(image.shape[0]):
         for col in range(image.shape[1]):
-            r, g, b = image[row, col]
-            
-            sepia_red = min(255, (r*sepia_matrix[0][0] + g*sepia_matrix[0][1] + b*sepia_matrix[0][2]))
-            sepia_green = min(255, (r*sepia_matrix[1][0] + g*sepia_matrix[1][1] + b*sepia_matrix[1][2]))
-            sepia_blue = min(255, (r*sepia_matrix[2][0] + g*sepia_matrix[2][1] + b*sepia_matrix[2][2]))
-            sepia_image[row, col] = (sepia_red, sepia_green, sepia_blue)
-
-    # Return image
-    # don't forget to make sure it's the right type!
-    sepia_image = sepia_image.astype("uint8")
-    return sepia_image
+            # read the whole pixel before writing, so out may be image
+            r, g, b = image[row, col, 0], image[row, col, 1], image[row, col, 2]
+            value = min(255.0, max(0.0, m00 * r + m01 * g + m02 * b + m03))
+            channels[row, col, 0] = value
+            if channels.shape[2] == 1:
+                continue
+            if same_rows:
+                channels[row, col, 1] = value
+                channels[row, col, 2] = value
+            else:
+                channels[row, col, 1] = min(255.0, max(0.0, m10 * r + m11 * g + m12 * b + m13))
+                channels[row, col, 2] = min(255.0, max(0.0, m20 * r + m21 * g + m22 * b + m23))
+
+    return out
+
+
+def numba_color_transform(image: np.array, matrix: np.array, out: np.array = None) -> np.array:
+    """Apply a color matrix to every pixel, clipping to [0, 255]
+
+    Args:
+        image (np.array)
+        matrix (np.array): 3x3 color matrix, or 3x4 affine matrix
+            with the offsets in the last column (see color.py)
+        out (np.array): array to write the result to (optional).
+            May be `image` itself, to filter in place, or have shape (H, W)
+            to get a single channel, if every row of the matrix is the same.
+    Returns:
+        np.array: the transformed image
+    """
+    # (the kernel always reads the offsets from a 4th column)
+    return _color_transform(image, as_affine(matrix), out)
+
+
+@jit(nopython=True, nogil=True, cache=True)
+def _correlate_rows(image: np.array, kernel: np.array, result: np.array) -> np.array:
+    """Correlate every row with a 1D kernel, extending the edges"""
+    height, width, channels = image.shape
+    radius = len(kernel) // 2
+    for row in range(height):
+        for col in range(width):
+            for c in range(channels):
+                acc = 0.0
+                for j in range(len(kernel)):
+                    x = min(max(col + j - radius, 0), width - 1)
+                    acc += kernel[j] * image[row, x, c]
+                result[row, col, c] = acc
+    return result
+
+
+@jit(nopython=True, nogil=True, cache=True)
+def _correlate_cols(image: np.array, kernel: np.array, result: np.array) -> np.array:
+    """Correlate every column with a 1D kernel, extending the edges"""
+    height, width, channels = image.shape
+    radius = len(kernel) // 2
+    for row in range(height):
+        for col in range(width):
+            for c in range(channels):
+                acc = 0.0
+                for i in range(len(kernel)):
+                    y = min(max(row + i - radius, 0), height - 1)
+                    acc += kernel[i] * image[y, col, c]
+                result[row, col, c] = acc
+    return result
+
+
+@jit(nopython=True, nogil=True, cache=True)
+def _correlate_2d(image: np.array, kernel: np.array, result: np.array) -> np.array:
+    """Correlate every channel with a 2D kernel, extending the edges"""
+    height, width, channels = image.shape
+    rows, cols = kernel.shape
+    for row in range(height):
+        for col in range(width):
+            for c in range(channels):
+                acc = 0.0
+                for i in range(rows):
+                    y = min(max(row + i - rows // 2, 0), height - 1)
+                    for j in range(cols):
+                        x = min(max(col + j - cols // 2, 0), width - 1)
+                        acc += kernel[i, j] * image[y, x, c]
+                result[row, col, c] = acc
+    return result
+
+
+@jit(nopython=True, nogil=True, cache=True)
+def _box_sums(image: np.array, radius: int, sums: np.array) -> np.array:
+    """Sum every channel over (2 radius + 1)^2 boxes, with running sums"""
+    height, width, channels = image.shape
+    horizontal = np.empty((height, width, channels), dtype=np.int64)
+    for row in range(height):
+        for c in range(channels):
+            # the window around column 0, then slide it one column at a time
+            acc = 0
+            for j in range(-radius, radius + 1):
+                acc += image[row, min(max(j, 0), width - 1), c]
+            for col in range(width):
+                horizontal[row, col, c] = acc
+                acc += image[row, min(col + radius + 1, width - 1), c]
+                acc -= image[row, max(col - radius, 0), c]
+    for col in range(width):
+        for c in range(channels):
+            acc = 0
+            for i in range(-radius, radius + 1):
+                acc += horizontal[min(max(i, 0), height - 1), col, c]
+            for row in range(height):
+                sums[row, col, c] = acc
+                acc += horizontal[min(row + radius + 1, height - 1), col, c]
+                acc -= horizontal[max(row - radius, 0), col, c]
+    return sums
+
+
+def _correlate(image: np.array, kernel: convolution.Kernel) -> np.array:
+    """Correlate every channel with a kernel, picking the fastest method (like convolution.correlate)"""
+    if isinstance(kernel, tuple):
+        column, row = (np.asarray(k, dtype=np.float64) for k in kernel)
+        if max(len(column), len(row)) > convolution.FFT_SEPARABLE_SIZE:
+            return convolution.correlate_fft(image, np.outer(column, row))
+        horizontal = _correlate_rows(image, row, np.empty(image.shape, dtype=np.float64))
+        return _correlate_cols(horizontal, column, np.empty(image.shape, dtype=np.float64))
+    kernel = np.asarray(kernel, dtype=np.float64)
+    parts = convolution.separate(kernel)
+    if parts:
+        return _correlate(image, parts)
+    if kernel.size > convolution.FFT_AREA:
+        return convolution.correlate_fft(image, kernel)
+    return _correlate_2d(image, kernel, np.empty(image.shape, dtype=np.float64))
+
+
+def numba_blur(image: np.array, sigma: float = 2, out: np.array = None) -> np.array:
+    """Gaussian blur, as two 1D passes (or with the FFT for a large sigma)
+
+    Args:
+        image (np.array)
+        sigma (float): the standard deviation of the gaussian, in pixels
+        out (np.array): array to write the result to (optional).
+            May be `image` itself, to filter in place.
+    Returns:
+        np.array: blurred_image
+    """
+    kernel = convolution.gaussian_kernel(sigma)
+    return convolution.to_image(_correlate(image, (kernel, kernel)), out)
+
+
+def numba_box_blur(image: np.array, radius: int = 2, out: np.array = None) -> np.array:
+    """Box blur with running sums, the cost doesn't depend on the radius
+
+    Args:
+        image (np.array)
+        radius (int): the radius of the box, in pixels
+        out (np.array): array to write the result to (optional).
+            May be `image` itself, to filter in place.
+    Returns:
+        np.array: blurred_image
+    """
+    if radius < 0:
+        raise ValueError(f"radius must not be negative, got {radius=}")
+    sums = _box_sums(image, radius, np.empty(image.shape, dtype=np.int64))
+    return convolution.to_image(sums / (2 * radius + 1) ** 2, out)
+
+
+def numba_sharpen(image: np.array, amount: float = 1, out: np.array = None) -> np.array:
+    """Sharpen, by subtracting amount times the laplacian
+
+    Args:
+        image (np.array)
+        amount (float): the strength of the sharpening
+        out (np.array): array to write the result to (optional).
+            May be `image` itself, to filter in place.
+    Returns:
+        np.array: sharpened_image
+    """
+    return convolution.to_image(_correlate(image, convolution.sharpen_kernel(amount)), out)
+
+
+def numba_edges(image: np.array, out: np.array = None) -> np.array:
+    """Edge detection: the magnitude of the sobel gradient of every channel
+
+    Args:
+        image (np.array)
+        out (np.array): array to write the result to (optional).
+            May be `image` itself, to filter in place.
+    Returns:
+        np.array: edge_image
+    """
+    dx = _correlate(image, (convolution.SOBEL_SMOOTH, convolution.SOBEL_DIFF))
+    dy = _correlate(image, (convolution.SOBEL_DIFF, convolution.SOBEL_SMOOTH))
+    return convolution.to_image(np.hypot(dx, dy, out=dx), out)
+
+
+def precompile() -> None:
+    """Compile (or load from the cache) the filters for uint8 rgb images
+
+    Call this at startup to move the compile cost out of the first
+    real filter call. Covers both calls with and without `out`.
+    """
+    image = np.zeros((1, 1, 3), dtype=np.uint8)
+    for filter_function in (numba_color2gray, numba_color2sepia):
+        filter_function(image)
+        filter_function(image, out=np.empty_like(image))
+    numba_color2gray(image, out=np.empty(image.shape[:2], dtype=np.uint8))
+    matrix = np.zeros((3, 4))
+    numba_color_transform(image, matrix)
+    numba_color_transform(image, matrix, out=np.empty_like(image))
@@ -0,0 +1,129 @@
+"""multi-core numba filters
+
+Same filters as numba_filters, but the rows are spread over
+numba's thread pool with `prange`. Compiled kernels are cached on disk.
+"""
+from __future__ import annotations
+
+import numba
+import numpy as np
+from numba import jit, prange
+
+from .color import as_affine
+from .numba_filters import GRAY_AFFINE, new_output, sepia_affine, with_channels
+
+
+def set_num_threads(n: int) -> None:
+    """Set the number of threads used by the parallel filters
+
+    Args:
+        n (int): number of threads, at most `max_threads()`
+    """
+    if not 1 <= n <= max_threads():
+        raise ValueError(f"n must be between [1-{max_threads()}], got {n=}")
+    numba.set_num_threads(n)
+
+
+def get_num_threads() -> int:
+    """Return the number of threads currently used by the parallel filters"""
+    return numba.get_num_threads()
+
+
+def max_threads() -> int:
+    """Return the maximum number of threads available to the parallel filters"""
+    return numba.config.NUMBA_NUM_THREADS
+
+
+# (the rows are spread over the threads by _parallel_color_transform)
+@jit(nopython=True, cache=True)
+def numba_parallel_color2gray(image: np.array, out: np.array = None) -> np.array:
+    """Convert rgb pixel array to grayscale
+
+    Args:
+        image (np.array)
+        out (np.array): array to write the result to (optional).
+            May be `image` itself, to filter in place, or have
+            shape (H, W) to get a single gray channel.
+    Returns:
+        np.array: gray_image
+    """
+    return _parallel_color_transform(image, GRAY_AFFINE, out)
+
+
+# (the rows are spread over the threads by _parallel_color_transform)
+@jit(nopython=True, cache=True)
+def numba_parallel_color2sepia(image: np.array, k: float = 1, out: np.array = None) -> np.array:
+    """Convert rgb pixel array to sepia
+
+    Args:
+        image (np.array)
+        k (float): amount of sepia (optional), from 0 (none) to 1 (full sepia)
+        out (np.array): array to write the result to (optional).
+            May be `image` itself, to filter in place.
+    Returns:
+        np.array: sepia_image
+    """
+    return _parallel_color_transform(image, sepia_affine(k), out)
+
+
+@jit(nopython=True, parallel=True, cache=True)
+def _parallel_color_transform(image: np.array, matrix: np.array, out: np.array = None) -> np.array:
+    """Apply a 3x4 float64 affine matrix to every pixel (see numba_parallel_color_transform)"""
+    out = new_output(image, out)
+    channels = with_channels(out)
+    # (like gray: then every channel gets the first row's value)
+    same_rows = not ((matrix[1] != matrix[0]).any() or (matrix[2] != matrix[0]).any())
+    if channels.shape[2] == 1 and not same_rows:
+        raise ValueError("a (H, W) out needs the same matrix row for every channel")
+    # (in locals: numba can't tell that writing to out doesn't change the matrix,
+    #  and reads it again for every pixel otherwise, which is several times slower)
+    m00, m01, m02, m03 = matrix[0, 0], matrix[0, 1], matrix[0, 2], matrix[0, 3]
+    m10, m11, m12, m13 = matrix[1, 0], matrix[1, 1], matrix[1, 2], matrix[1, 3]
+    m20, m21, m22, m23 = matrix[2, 0], matrix[2, 1], matrix[2, 2], matrix[2, 3]
+
+    # each thread gets a chunk of rows
+    for row in prange(image.shape[0]):
+        for col in range(image.shape[1]):
+            # read the whole pixel before writing, so out may be image
+            r, g, b = image[row, col, 0], image[row, col, 1], image[row, col, 2]
+            value = min(255.0, max(0.0, m00 * r + m01 * g + m02 * b + m03))
+            channels[row, col, 0] = value
+            if channels.shape[2] == 1:
+                continue
+            if same_rows:
+                channels[row, col, 1] = value
+                channels[row, col, 2] = value
+            else:
+                channels[row, col, 1] = min(255.0, max(0.0, m10 * r + m11 * g + m12 * b + m13))
+                channels[row, col, 2] = min(255.0, max(0.0, m20 * r + m21 * g + m22 * b + m23))
+
+    return out
+
+
+def numba_parallel_color_transform(image: np.array, matrix: np.array, out: np.array = None) -> np.array:
+    """Apply a color matrix to every pixel, clipping to [0, 255]
+
+    Args:
+        image (np.array)
+        matrix (np.array): 3x3 color matrix, or 3x4 affine matrix
+            with the offsets in the last column (see color.py)
+        out (np.array): array to write the result to (optional).
+            May be `image` itself, to filter in place, or have shape (H, W)
+            to get a single channel, if every row of the matrix is the same.
+    Returns:
+        np.array: the transformed image
+    """
+    # (the kernel always reads the offsets from a 4th column)
+    return _parallel_color_transform(image, as_affine(matrix), out)
+
+
+def precompile() -> None:
+    """Compile (or load from the cache) the filters for uint8 rgb images"""
+    image = np.zeros((1, 1, 3), dtype=np.uint8)
+    for filter_function in (numba_parallel_color2gray, numba_parallel_color2sepia):
+        filter_function(image)
+        filter_function(image, out=np.empty_like(image))
+    numba_parallel_color2gray(image, out=np.empty(image.shape[:2], dtype=np.uint8))
+    matrix = np.zeros((3, 4))
+    numba_parallel_color_transform(image, matrix)
+    numba_parallel_color_transform(image, matrix, out=np.empty_like(image))
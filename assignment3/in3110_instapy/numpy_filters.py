@@ -3,33 +3,51 @@ from __future__ import annotations
 
 import numpy as np
 
-def numpy_color2gray(image: np.array) -> np.array:
+from . import convolution
+from .color import GRAY_MATRIX, sepia_matrix
+
+# target size of the float array for one block of rows in numpy_color_transform,
+# small enough to stay in (L2) cache
+BLOCK_BYTES = 2**20
+
+
+def numpy_color2gray(image: np.array, out: np.array = None) -> np.array:
     """Convert rgb pixel array to grayscale
 
     Args:
         image (np.array)
+        out (np.array): array to write the result to (optional).
+            May be `image` itself, to filter in place, or have
+            shape (H, W) to get a single gray channel.
     Returns:
         np.array: gray_image
     """
 
-    gray_image = np.empty_like(image)
+    # converted in blocks of rows, into reused float arrays
+    # (the same weighted sum as the other implementations, see numpy_color_transform)
+    return numpy_color_transform(image, GRAY_MATRIX, out=out)
 
-    # Hint: use numpy slicing in order to have fast vectorized code
-    gray_image[:, :, 0] = 0.21*image[:, :, 0] + 0.72*image[:, :, 1] + 0.07*image[:, :, 2]
-    gray_image[:, :, 1] = 0.21*image[:, :, 0] + 0.72*image[:, :, 1] + 0.07*image[:, :, 2]
-    gray_image[:, :, 2] = 0.21*image[:, :, 0] + 0.72*image[:, :, 1] + 0.07*image[:, :, 2]
-        
-    # Return image (make sure it's the right type!)
-    gray_image = gray_image.astype("uint8")
-    return gray_image
 
-
-def numpy_color2sepia(image: np.array, k: float = 1) -> np.array:
+def numpy_color2sepia(
+    image: np.array,
+    k: float = 1,
+    out: np.array = None,
+    block_rows: int = None,
+    dtype: np.dtype = np.float64,
+) -> np.array:
     """Convert rgb pixel array to sepia
 
     Args:
         image (np.array)
         k (float): amount of sepia (optional)
+        out (np.array): array to write the result to (optional).
+            May be `image` itself, to filter in place.
+        block_rows (int): the number of rows to convert at a time (optional).
+            By default, blocks are sized so the float temporary is about
+            BLOCK_BYTES, instead of 8 bytes per channel for the whole image.
+        dtype (np.dtype): the float type to compute in (optional).
+            np.float32 halves the memory traffic, but rounds differently
+            from the other implementations for a few pixels.
 
     The amount of sepia is given as a fraction, k=0 yields no sepia while
     k=1 yields full sepia.
@@ -40,30 +58,158 @@ def numpy_color2sepia(image: np.array, k: float = 1) -> np.array:
     Returns:
         np.array: sepia_image
     """
+    # define sepia matrix (optional: with stepless sepia changes)
+    # (this validates k)
+    return numpy_color_transform(image, sepia_matrix(k), out=out, block_rows=block_rows, dtype=dtype)
 
-    if not 0 <= k <= 1:
-        # validate k (optional)
-        raise ValueError(f"k must be between [0-1], got {k=}")
 
-    sepia_image = np.empty_like(image)
-    
-    # define sepia matrix (optional: with stepless sepia changes)
-    sepia_matrix = np.array(
-        [
-            [1.0 - 0.607 * k, 0.0 + 0.769 * k, 0.0 + 0.189 * k],
-            [0.0 + 0.349 * k, 1.0 - 0.314 * k, 0.0 + 0.168 * k],
-            [0.0 + 0.272 * k, 0.0 + 0.534 * k, 1.0 - 0.869 * k]
-        ]
-    )
-
-    # HINT: For version without adaptive sepia filter, use the same matrix as in the pure python implementation
-    # any way works, but you could use an Einstein sum to apply pixel transform matrix
-    # or a tensor dot product, for example
-    sepia_image = np.dot(image, sepia_matrix.T)
-
-    # Check which entries have a value greater than 255 and set it to 255 since we can not display values bigger than 255
-    sepia_image = np.clip(sepia_image, 0, 255)
-
-    # Return image (make sure it's the right type!)
-    sepia_image = sepia_image.astype("uint8")
-    return sepia_image
+def numpy_color_transform(
+    image: np.array,
+    matrix: np.array,
+    out: np.array = None,
+    block_rows: int = None,
+    dtype: np.dtype = np.float64,
+) -> np.array:
+    """Apply a color matrix to every pixel, clipping to [0, 255]
+
+    Args:
+        image (np.array)
+        matrix (np.array): 3x3 color matrix, or 3x4 affine matrix
+            with the offsets in the last column (see color.py)
+        out (np.array): array to write the result to (optional).
+            May be `image` itself, to filter in place, or have shape
+            (H, W) if every output channel is the same (like gray).
+        block_rows (int): the number of rows to convert at a time (optional).
+            By default, blocks are sized so the float temporary is about BLOCK_BYTES.
+        dtype (np.dtype): the float type to compute in (optional)
+    Returns:
+        np.array: the transformed image
+    """
+    if out is None:
+        out = np.empty_like(image)
+
+    matrix = np.asarray(matrix, dtype=dtype)
+    linear = matrix[:, :3]
+    offset = matrix[:, 3] if matrix.shape[1] == 4 else None
+    if offset is not None and not offset.any():
+        offset = None
+    # when every output channel is the same (like gray), compute it once
+    same = bool(np.all(linear == linear[0]) and (offset is None or np.all(offset == offset[0])))
+    if same:
+        linear = linear[:1]
+        offset = None if offset is None else offset[:1]
+    channels = linear.shape[0]
+
+    height, width = image.shape[:2]
+    if height == 0 or width == 0:
+        # nothing to convert (and no block size for empty rows)
+        return out
+    if block_rows is None:
+        block_rows = max(1, BLOCK_BYTES // (width * channels * np.dtype(dtype).itemsize))
+    if block_rows < 1:
+        raise ValueError(f"block_rows must be at least 1, got {block_rows=}")
+
+    if out.ndim == 2 and channels != 1:
+        raise ValueError(f"a (H, W) out needs a matrix with the same row for every channel, got {out.shape=}")
+
+    # one float array for a block of rows, reused for every block
+    # (and one for the weighted channels when computing a single one)
+    block = np.empty((min(block_rows, height) * width, channels), dtype=dtype)
+    weighted = np.empty(len(block), dtype=dtype) if same else None
+    for top in range(0, height, block_rows):
+        rows = slice(top, min(top + block_rows, height))
+        pixels = image[rows].reshape(-1, 3)
+        transformed = block[: len(pixels)]
+
+        if same:
+            # r * w0 + g * w1 + b * w2 added in that order, so it rounds
+            # exactly like the python and numba implementations
+            single = transformed[:, 0]
+            products = weighted[: len(pixels)]
+            np.multiply(pixels[:, 0], linear[0, 0], out=single)
+            for c in (1, 2):
+                np.multiply(pixels[:, c], linear[0, c], out=products)
+                single += products
+        else:
+            # HINT: For version without adaptive sepia filter, use the same matrix as in the pure python implementation
+            # any way works, but you could use an Einstein sum to apply pixel transform matrix
+            # or a tensor dot product, for example
+            np.dot(pixels, linear.T, out=transformed)
+        if offset is not None:
+            transformed += offset
+
+        # Check which entries have a value greater than 255 and set it to 255 since we can not display values bigger than 255
+        # (in place, to avoid another float array)
+        np.clip(transformed, 0, 255, out=transformed)
+
+        # Write to the uint8 output (assigning casts to the right type).
+        # The whole block was read above, so this is safe when out is image
+        if out.ndim == 2:
+            out[rows] = transformed.reshape(-1, width)
+        else:
+            out[rows] = transformed.reshape(-1, width, channels)
+    return out
+
+
+def numpy_blur(image: np.array, sigma: float = 2, out: np.array = None) -> np.array:
+    """Gaussian blur
+
+    The gaussian is separable, so it is applied as two 1D passes,
+    or with the FFT for a large sigma (see convolution.py).
+
+    Args:
+        image (np.array)
+        sigma (float): the standard deviation of the gaussian, in pixels
+        out (np.array): array to write the result to (optional).
+            May be `image` itself, to filter in place.
+    Returns:
+        np.array: blurred_image
+    """
+    kernel = convolution.gaussian_kernel(sigma)
+    return convolution.to_image(convolution.correlate(image, (kernel, kernel)), out)
+
+
+def numpy_box_blur(image: np.array, radius: int = 2, out: np.array = None) -> np.array:
+    """Box blur: the mean over a (2 radius + 1)^2 box around every pixel
+
+    Uses running sums, so the cost doesn't depend on the radius.
+
+    Args:
+        image (np.array)
+        radius (int): the radius of the box, in pixels
+        out (np.array): array to write the result to (optional).
+            May be `image` itself, to filter in place.
+    Returns:
+        np.array: blurred_image
+    """
+    sums = convolution.box_sums(image, radius)
+    return convolution.to_image(sums / (2 * radius + 1) ** 2, out)
+
+
+def numpy_sharpen(image: np.array, amount: float = 1, out: np.array = None) -> np.array:
+    """Sharpen, by subtracting amount times the laplacian
+
+    Args:
+        image (np.array)
+        amount (float): the strength of the sharpening
+        out (np.array): array to write the result to (optional).
+            May be `image` itself, to filter in place.
+    Returns:
+        np.array: sharpened_image
+    """
+    return convolution.to_image(convolution.correlate(image, convolution.sharpen_kernel(amount)), out)
+
+
+def numpy_edges(image: np.array, out: np.array = None) -> np.array:
+    """Edge detection: the magnitude of the sobel gradient of every channel
+
+    Args:
+        image (np.array)
+        out (np.array): array to write the result to (optional).
+            May be `image` itself, to filter in place.
+    Returns:
+        np.array: edge_image
+    """
+    dx = convolution.correlate(image, (convolution.SOBEL_SMOOTH, convolution.SOBEL_DIFF))
+    dy = convolution.correlate(image, (convolution.SOBEL_DIFF, convolution.SOBEL_SMOOTH))
+    return convolution.to_image(np.hypot(dx, dy, out=dx), out)
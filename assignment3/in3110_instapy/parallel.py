@@ -0,0 +1,285 @@
+"""Multi-core filtering of one image, for any backend
+
+The input and output images are put in shared memory, and the rows are
+split into bands across a pool of worker processes. Every worker runs the
+filter from `get_filter` on its band, reading and writing the shared
+images directly: only the names of the shared memory blocks and the band
+bounds are sent to the workers, never pixel data.
+
+This gives backends that can't use threads (python, numpy) a multi-core path.
+
+Backends that release the GIL while filtering can instead run on bands
+in threads (`ThreadBandExecutor`): the bands are views of the image and
+the output, so nothing is copied or pickled at all.
+"""
+from __future__ import annotations
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from . import get_filter
+from .batch import _chunks, _process_pool
+
+
+def _attach(name: str, shape: tuple, dtype: str) -> tuple[shared_memory.SharedMemory, np.array]:
+    """Open a shared memory block as an array"""
+    shm = shared_memory.SharedMemory(name=name)
+    return shm, np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+
+
+def _filter_band(
+    image_name: str,
+    out_name: str,
+    shape: tuple,
+    out_shape: tuple,
+    dtype: str,
+    rows: slice,
+    filter: str,
+    implementation: str,
+    kwargs: dict,
+) -> None:
+    """Filter the rows of a shared image into a shared output (run in a worker)"""
+    filter_function = get_filter(filter, implementation)
+    image_shm, image = _attach(image_name, shape, dtype)
+    out_shm, out = _attach(out_name, out_shape, dtype)
+    try:
+        filter_function(image[rows], out=out[rows], **kwargs)
+    finally:
+        # drop the views before closing, or close() fails
+        del image, out
+        image_shm.close()
+        out_shm.close()
+
+
+class SharedMemoryExecutor:
+    """A pool of worker processes filtering row bands of images in shared memory
+
+    Keep one executor around to filter many images with the same workers
+    (they keep their imported and compiled filters between images)::
+
+        with SharedMemoryExecutor(processes=4) as executor:
+            for image in images:
+                filtered = executor.filter(image, "color2sepia", "python")
+    """
+
+    def __init__(self, processes: int = None):
+        if processes is None:
+            processes = os.cpu_count() or 1
+        if processes < 1:
+            raise ValueError(f"processes must be at least 1, got {processes=}")
+        self.processes = processes
+        self._pool = _process_pool(processes)
+
+    def filter(
+        self,
+        image: np.array,
+        filter: str = "color2gray",
+        implementation: str = "python",
+        out: np.array = None,
+        bands: int = None,
+        **kwargs,
+    ) -> np.array:
+        """Filter an image in row bands, spread over the workers
+
+        Args:
+            image (np.array): the image to filter
+            filter (str): the name of the filter
+            implementation (str): the name of the implementation
+            out (np.array): array to write the result to (optional).
+                May have shape (H, W), for a single gray channel.
+            bands (int): the number of row bands (optional).
+                Defaults to one per worker.
+            **kwargs: extra arguments for the filter (e.g. k)
+        Returns:
+            np.array: the filtered image (`out`, if given)
+        """
+        if out is None:
+            out = np.empty_like(image)
+        if out.shape[:2] != image.shape[:2]:
+            raise ValueError(f"out must have the same size as image, got {out.shape} != {image.shape}")
+        if bands is None:
+            bands = self.processes
+
+        # (SharedMemory can't be empty)
+        image_shm = shared_memory.SharedMemory(create=True, size=max(image.nbytes, 1))
+        out_shm = shared_memory.SharedMemory(create=True, size=max(out.nbytes, 1))
+        shared_image = shared_out = None
+        try:
+            shared_image = np.ndarray(image.shape, dtype=image.dtype, buffer=image_shm.buf)
+            shared_out = np.ndarray(out.shape, dtype=out.dtype, buffer=out_shm.buf)
+            shared_image[...] = image
+            futures = [
+                self._pool.submit(
+                    _filter_band,
+                    image_shm.name,
+                    out_shm.name,
+                    image.shape,
+                    out.shape,
+                    image.dtype.str,
+                    rows,
+                    filter,
+                    implementation,
+                    kwargs,
+                )
+                for rows in _chunks(image.shape[0], bands)
+            ]
+            for future in futures:
+                future.result()
+            out[...] = shared_out
+        finally:
+            # drop the views before closing, or close() fails
+            del shared_image, shared_out
+            for shm in (image_shm, out_shm):
+                shm.close()
+                shm.unlink()
+        return out
+
+    def shutdown(self) -> None:
+        """Stop the workers"""
+        self._pool.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
+
+
+class ThreadBandExecutor:
+    """A pool of threads filtering row bands of images in place
+
+    Every thread runs the filter on a view of its band of the image and
+    writes to the same band of one output array. This only runs in
+    parallel for backends that release the GIL: numba (`nogil=True`
+    kernels), cython, and the numpy ufuncs of numpy and lut. The python
+    backend works, but holds the GIL, so it isn't faster than one thread.
+    Keep one executor around for many images::
+
+        with ThreadBandExecutor(threads=4) as executor:
+            for image in images:
+                filtered = executor.filter(image, "color2sepia", "numba")
+    """
+
+    # these already use their own thread pool for a whole image,
+    # which can't be started from several threads at once
+    UNSUPPORTED = {"numba_parallel", "auto"}
+
+    def __init__(self, threads: int = None):
+        if threads is None:
+            threads = os.cpu_count() or 1
+        if threads < 1:
+            raise ValueError(f"threads must be at least 1, got {threads=}")
+        self.threads = threads
+        self._pool = ThreadPoolExecutor(threads, thread_name_prefix="instapy-band")
+
+    def filter(
+        self,
+        image: np.array,
+        filter: str = "color2gray",
+        implementation: str = "numba",
+        out: np.array = None,
+        bands: int = None,
+        **kwargs,
+    ) -> np.array:
+        """Filter an image in row bands, spread over the threads
+
+        Args:
+            image (np.array): the image to filter
+            filter (str): the name of the filter
+            implementation (str): the name of the implementation
+                (not numba_parallel or auto)
+            out (np.array): array to write the result to (optional).
+                May be `image` itself, to filter in place,
+                or have shape (H, W), for a single gray channel.
+            bands (int): the number of row bands (optional).
+                Defaults to one per thread.
+            **kwargs: extra arguments for the filter (e.g. k)
+        Returns:
+            np.array: the filtered image (`out`, if given)
+        """
+        if implementation in self.UNSUPPORTED:
+            raise ValueError(f"can't filter bands in threads with {implementation=}")
+        filter_function = get_filter(filter, implementation)
+        if out is None:
+            out = np.empty_like(image)
+        if out.shape[:2] != image.shape[:2]:
+            raise ValueError(f"out must have the same size as image, got {out.shape} != {image.shape}")
+        if bands is None:
+            bands = self.threads
+
+        futures = [
+            self._pool.submit(filter_function, image[rows], out=out[rows], **kwargs)
+            for rows in _chunks(image.shape[0], bands)
+        ]
+        for future in futures:
+            future.result()
+        return out
+
+    def shutdown(self) -> None:
+        """Stop the threads"""
+        self._pool.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
+
+
+def filter_bands(
+    image: np.array,
+    filter: str = "color2gray",
+    implementation: str = "python",
+    processes: int = None,
+    out: np.array = None,
+    **kwargs,
+) -> np.array:
+    """Filter one image in row bands over a new pool of worker processes
+
+    See `SharedMemoryExecutor` to reuse the workers for many images.
+
+    Args:
+        image (np.array): the image to filter
+        filter (str): the name of the filter
+        implementation (str): the name of the implementation
+        processes (int): the number of worker processes (optional).
+            Defaults to the number of cores.
+        out (np.array): array to write the result to (optional).
+            May have shape (H, W), for a single gray channel.
+        **kwargs: extra arguments for the filter (e.g. k)
+    Returns:
+        np.array: the filtered image (`out`, if given)
+    """
+    with SharedMemoryExecutor(processes) as executor:
+        return executor.filter(image, filter, implementation, out=out, **kwargs)
+
+
+def filter_bands_threaded(
+    image: np.array,
+    filter: str = "color2gray",
+    implementation: str = "numba",
+    threads: int = None,
+    out: np.array = None,
+    **kwargs,
+) -> np.array:
+    """Filter one image in row bands over a new pool of threads
+
+    See `ThreadBandExecutor` to reuse the threads for many images.
+
+    Args:
+        image (np.array): the image to filter
+        filter (str): the name of the filter
+        implementation (str): the name of the implementation
+            (not numba_parallel or auto)
+        threads (int): the number of threads (optional).
+            Defaults to the number of cores.
+        out (np.array): array to write the result to (optional)
+        **kwargs: extra arguments for the filter (e.g. k)
+    Returns:
+        np.array: the filtered image (`out`, if given)
+    """
+    with ThreadBandExecutor(threads) as executor:
+        return executor.filter(image, filter, implementation, out=out, **kwargs)
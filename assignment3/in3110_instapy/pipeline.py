@@ -0,0 +1,183 @@
+"""Lazy filter pipelines
+
+A `Pipeline` records a chain of operations without running them::
+
+    pipeline = Pipeline().scale(0.5).gray().sepia().tone(red=1.1)
+    filtered = pipeline(image)
+
+Per-pixel color operations are affine color matrices (see color.py), so
+consecutive ones are composed into a single matrix and applied in one fused
+pass, reading and writing every pixel once. Operations that can't be fused
+(like scaling), or color operations where the staged result would have been
+clipped in between, run as separate stages.
+"""
+from __future__ import annotations
+
+from typing import Union
+
+import numpy as np
+from PIL import Image
+
+from .color import (
+    GRAY_MATRIX,
+    as_affine,
+    color_transform,
+    compose,
+    contrast_matrix,
+    hue_rotation_matrix,
+    saturation_matrix,
+    sepia_matrix,
+    stays_in_range,
+)
+
+
+class ColorMatrix:
+    """A per-pixel color operation, given by a 3x3 or 3x4 (affine) matrix"""
+
+    fusable = True
+
+    def __init__(self, name: str, matrix: np.array, implementation: str = "numba"):
+        self.name = name
+        self.matrix = as_affine(matrix)
+        self.implementation = implementation
+        self._filter = None
+
+    def stays_in_range(self) -> bool:
+        """Whether every pixel stays inside [0, 255] without clipping
+
+        Only then can the next color operation be fused with this one,
+        since staged execution would clip in between.
+        """
+        return stays_in_range(self.matrix)
+
+    def then(self, other: ColorMatrix) -> ColorMatrix:
+        """Compose with another color operation, applied after this one"""
+        return ColorMatrix(f"{self.name}+{other.name}", compose(self.matrix, other.matrix), self.implementation)
+
+    def __call__(self, image: np.array, out: np.array = None) -> np.array:
+        if self._filter is None:
+            self._filter = color_transform(self.matrix, self.implementation)
+        return self._filter(image, out=out)
+
+    def __repr__(self):
+        return f"ColorMatrix({self.name!r})"
+
+
+class Scale:
+    """Resize the image by a factor"""
+
+    fusable = False
+
+    def __init__(self, factor: float):
+        if factor <= 0:
+            raise ValueError(f"scale factor must be positive, got {factor=}")
+        self.name = f"scale({factor})"
+        self.factor = factor
+
+    def __call__(self, image: np.array, out: np.array = None) -> np.array:
+        resized = Image.fromarray(image).resize(
+            (int(image.shape[1] * self.factor), int(image.shape[0] * self.factor))
+        )
+        return np.asarray(resized)
+
+    def __repr__(self):
+        return f"Scale({self.factor})"
+
+
+Operation = Union[ColorMatrix, Scale]
+
+
+class Pipeline:
+    """A lazily evaluated chain of image operations
+
+    Every method returns a new Pipeline with one more operation,
+    nothing is computed until the pipeline is called on an image.
+    Color operations run with the color_transform kernel of `implementation`.
+    """
+
+    def __init__(self, operations: list[Operation] = None, implementation: str = "numba"):
+        self.operations = list(operations or [])
+        self.implementation = implementation
+
+    def then(self, operation: Operation) -> Pipeline:
+        """Return a new pipeline with an operation added at the end"""
+        return Pipeline(self.operations + [operation], self.implementation)
+
+    def _color(self, name: str, matrix: np.array) -> Pipeline:
+        return self.then(ColorMatrix(name, matrix, self.implementation))
+
+    def scale(self, factor: float) -> Pipeline:
+        """Resize the image by a factor"""
+        return self.then(Scale(factor))
+
+    def gray(self) -> Pipeline:
+        """Convert to grayscale"""
+        return self._color("gray", GRAY_MATRIX)
+
+    def sepia(self, k: float = 1) -> Pipeline:
+        """Convert to sepia, with sepia amount k (from 0 to 1)"""
+        return self._color(f"sepia({k})", sepia_matrix(k))
+
+    def tone(self, red: float = 1, green: float = 1, blue: float = 1) -> Pipeline:
+        """Scale the red, green and blue channels"""
+        return self._color(f"tone({red}, {green}, {blue})", np.diag([red, green, blue]))
+
+    def saturation(self, s: float) -> Pipeline:
+        """Scale the saturation (0 is gray, 1 changes nothing)"""
+        return self._color(f"saturation({s})", saturation_matrix(s))
+
+    def hue_rotation(self, degrees: float) -> Pipeline:
+        """Rotate the hue by an angle"""
+        return self._color(f"hue_rotation({degrees})", hue_rotation_matrix(degrees))
+
+    def contrast(self, c: float) -> Pipeline:
+        """Scale the contrast around middle gray"""
+        return self._color(f"contrast({c})", contrast_matrix(c))
+
+    def color_matrix(self, matrix: np.array, name: str = "matrix") -> Pipeline:
+        """Apply any 3x3 color matrix, or 3x4 affine matrix"""
+        return self._color(name, matrix)
+
+    @property
+    def stages(self) -> list[Operation]:
+        """The operations as they will be executed, with fusable ones merged"""
+        stages = []
+        for operation in self.operations:
+            previous = stages[-1] if stages else None
+            if (
+                operation.fusable
+                and isinstance(previous, ColorMatrix)
+                and previous.stays_in_range()
+            ):
+                stages[-1] = previous.then(operation)
+            else:
+                stages.append(operation)
+        return stages
+
+    def __call__(self, image: np.array, out: np.array = None) -> np.array:
+        """Run the pipeline on an image
+
+        Args:
+            image (np.array): the image to filter
+            out (np.array): array to write the result to (optional).
+                Must have the shape of the result.
+        Returns:
+            np.array: the filtered image
+        """
+        stages = self.stages
+        if not stages:
+            if out is None:
+                return image.copy()
+            out[...] = image
+            return out
+
+        for i, stage in enumerate(stages):
+            last = i == len(stages) - 1
+            image = stage(image, out=out if last else None)
+        if out is not None and image is not out:
+            out[...] = image
+            return out
+        return image
+
+    def __repr__(self):
+        return f"Pipeline({' -> '.join(op.name for op in self.operations)})"
@@ -1,19 +1,32 @@
 """
 Profiling (IN4110 only)
+
+Profile filters with cProfile or line_profiler, export the results as
+pstats files or as collapsed stacks (for flamegraph.pl, speedscope etc.),
+and count calls, time and bytes per filter with lightweight instrumentation.
+
+Run as `python -m in3110_instapy.profiling` to profile every implementation.
 """
 from __future__ import annotations
 
 import cProfile
+import inspect
+import os
 import pstats
+import time
+from functools import wraps
+from typing import Callable
 
 import in3110_instapy
-import line_profiler
 
 from . import io
 
+# the implementations to profile, if they can be imported
+IMPLEMENTATIONS = ["python", "numpy", "numba", "numba_parallel", "lut", "cython"]
 
-def profile_with_cprofile(filter, image, ncalls=3):
-    """Profile filter(image) with line_profiler
+
+def profile_with_cprofile(filter, image, ncalls=3, output=None):
+    """Profile filter(image) with cProfile
 
     Statistics will be printed to stdout.
 
@@ -22,64 +35,237 @@ def profile_with_cprofile(filter, image, ncalls=3):
         filter (callable): filter function
         image (ndarray): image to filter
         ncalls (int): number of repetitions to measure
+        output (str): filename prefix to save the statistics to (optional).
+            Writes `{output}.pstats` and `{output}.collapsed`.
+    Returns:
+        stats (pstats.Stats): the collected statistics
     """
     profiler = cProfile.Profile()
     # run `filter(image)` in the profiler
-    ...
+    profiler.enable()
+    for _ in range(ncalls):
+        filter(image)
+    profiler.disable()
     stats = pstats.Stats(profiler)
     # print the top 10 results, sorted by cumulative time
     # (check sort_stats and print_stats docstrings)
-    ...
+    stats.sort_stats("cumulative").print_stats(10)
+
+    if output:
+        write_pstats(stats, f"{output}.pstats")
+        write_collapsed(stats, f"{output}.collapsed")
+    return stats
 
 
-def profile_with_line_profiler(filter, image, ncalls=3):
+def profile_with_line_profiler(filter, image, ncalls=3, output=None):
     """Profile filter(image) with line_profiler
 
     Statistics will be printed to stdout.
+    Compiled filters (numba, cython) have no Python lines to measure,
+    so they will show up without timings.
 
     Args:
 
         filter (callable): filter function
         image (ndarray): image to filter
         ncalls (int): number of repetitions to measure
+        output (str): filename prefix to save the statistics to (optional).
+            Writes `{output}.lprof`, which `python -m line_profiler` can show.
+    Returns:
+        profiler (line_profiler.LineProfiler): the profiler, with its statistics
     """
+    # imported here, since it is only needed for line profiling
+    import line_profiler
+
     # create the LineProfiler
     profiler = line_profiler.LineProfiler()
     # tell it to measure the function we are given
-    profiler.add_function(filter)
+    # (not the instrumentation wrapper around it, and
+    # for numba, the python function the dispatcher wraps)
+    function = inspect.unwrap(filter)
+    profiler.add_function(getattr(function, "py_func", function))
     # Measure filter(image)
-    ...
+    profiler.enable_by_count()
+    try:
+        for _ in range(ncalls):
+            filter(image)
+    finally:
+        profiler.disable_by_count()
     # print statistics
-    ...
+    profiler.print_stats()
+
+    if output:
+        profiler.dump_stats(f"{output}.lprof")
+    return profiler
+
+
+def write_pstats(stats: pstats.Stats, filename: str) -> None:
+    """Save cProfile statistics as a pstats file
+
+    Load them again with `pstats.Stats(filename)`, or view them with e.g. snakeviz.
+    """
+    stats.dump_stats(filename)
+
+
+def _label(function: tuple) -> str:
+    """A flamegraph frame name for a pstats function key (file, line, name)"""
+    filename, line, name = function
+    if filename == "~":
+        # built-in functions have no file
+        return name.replace(";", ",")
+    return f"{name} ({os.path.basename(filename)}:{line})".replace(";", ",")
+
+
+def collapsed_stacks(stats: pstats.Stats) -> list[str]:
+    """Convert cProfile statistics to collapsed stacks
+
+    cProfile only records caller -> callee edges, not full stacks,
+    so stacks are reconstructed by walking the call graph from the roots,
+    splitting each function's own time between its callers in proportion
+    to the time spent under each of them.
+
+    Args:
+        stats (pstats.Stats): the statistics to convert
+    Returns:
+        list of str: lines of 'root;caller;function microseconds'
+    """
+    raw = stats.stats
+    callees = {}
+    for function, (_, _, _, _, callers) in raw.items():
+        for caller, (_, _, _, cumulative) in callers.items():
+            callees.setdefault(caller, []).append((function, cumulative))
+
+    totals = {}
+
+    def walk(function, stack, fraction):
+        _, _, own_time, cumulative, _ = raw[function]
+        stack = stack + [_label(function)]
+        key = ";".join(stack)
+        totals[key] = totals.get(key, 0) + own_time * fraction
+        for callee, edge_time in callees.get(function, []):
+            if callee not in raw or _label(callee) in stack or not raw[callee][3]:
+                # unknown, recursive or empty
+                continue
+            walk(callee, stack, fraction * edge_time / raw[callee][3])
+
+    for function, (_, _, _, _, callers) in raw.items():
+        if not callers:
+            walk(function, [], 1.0)
+
+    return [f"{stack} {round(seconds * 1e6)}" for stack, seconds in totals.items() if round(seconds * 1e6) > 0]
+
+
+def write_collapsed(stats: pstats.Stats, filename: str) -> None:
+    """Save cProfile statistics as collapsed stacks, for flamegraphs"""
+    with open(filename, "w") as f:
+        for line in collapsed_stacks(stats):
+            f.write(f"{line}\n")
+
+
+class FilterStats:
+    """Counters for one instrumented filter"""
+
+    def __init__(self):
+        self.calls = 0
+        self.seconds = 0.0
+        self.nbytes = 0
+
+    def __repr__(self):
+        return f"FilterStats(calls={self.calls}, seconds={self.seconds:.3g}, nbytes={self.nbytes})"
+
+
+# counters for every instrumented filter, by name
+filter_stats: dict[str, FilterStats] = {}
+
+
+def instrument(filter_function: Callable, name: str = None) -> Callable:
+    """Wrap a filter function to count its calls, time and bytes processed
+
+    Counters are collected in `filter_stats[name]`.
+    The overhead is two clock reads per call.
+    """
+    if name is None:
+        name = filter_function.__name__
+    stats = filter_stats.setdefault(name, FilterStats())
+
+    @wraps(filter_function)
+    def instrumented(image, *args, **kwargs):
+        start_time = time.perf_counter()
+        try:
+            return filter_function(image, *args, **kwargs)
+        finally:
+            stats.seconds += time.perf_counter() - start_time
+            stats.calls += 1
+            stats.nbytes += image.nbytes
+
+    return instrumented
+
+
+def enable_instrumentation(enabled: bool = True) -> None:
+    """Make `get_filter` return instrumented filters (or stop doing so)
+
+    Instrumentation can also be enabled with the environment variable
+    INSTAPY_INSTRUMENT=1.
+    """
+    in3110_instapy._instrumented = enabled
+
+
+def reset_instrumentation() -> None:
+    """Reset the counters of every instrumented filter"""
+    for stats in filter_stats.values():
+        stats.__init__()
+
+
+def format_instrumentation() -> str:
+    """Format the counters of every instrumented filter"""
+    lines = []
+    for name, stats in sorted(filter_stats.items()):
+        if not stats.calls:
+            continue
+        throughput = stats.nbytes / stats.seconds / 2**20 if stats.seconds else float("inf")
+        lines.append(
+            f"{name}: {stats.calls} calls, {stats.seconds:.3}s total, "
+            f"{stats.nbytes / 2**20:.1f} MiB processed ({throughput:.1f} MiB/s)"
+        )
+    return "\n".join(lines)
 
 
-def run_profiles(profiler: str = "cprofile"):
+def run_profiles(profiler: str = "cprofile", output_dir: str = None):
     """Run profiles of every implementation
 
     Args:
 
         profiler (str): either 'line_profiler' or 'cprofile'
+        output_dir (str): directory to save the statistics to (optional)
     """
     # Select which profile function to use
     if profiler == "line_profiler":
-        profile_func = ...
+        profile_func = profile_with_line_profiler
     elif profiler.lower() == "cprofile":
-        profile_func = ...
+        profile_func = profile_with_cprofile
     else:
         raise ValueError(f"{profiler=} must be 'line_profiler' or 'cprofile'")
 
     # construct a random 640x480 image
-    image = ...
+    image = io.random_image(width=640, height=480)
 
-    filter_names = ...
-    implementations = ...
+    filter_names = ["color2gray", "color2sepia"]
+    implementations = IMPLEMENTATIONS
     for filter_name in filter_names:
         for implementation in implementations:
+            try:
+                filter = in3110_instapy.get_filter(filter_name, implementation)  #
+            except ImportError as e:
+                print(f"Skipping {implementation} {filter_name}: {e}")
+                continue
             print(f"Profiling {implementation} {filter_name} with {profiler}:")
-            filter = in3110_instapy.get_filter(filter_name, implementation)  #
             # call it once
             filter(image)
-            profile_func(filter, image)
+            output = None
+            if output_dir:
+                os.makedirs(output_dir, exist_ok=True)
+                output = os.path.join(output_dir, f"{implementation}_{filter_name}")
+            profile_func(filter, image, output=output)
 
 
 if __name__ == "__main__":
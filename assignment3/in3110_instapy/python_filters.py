@@ -2,37 +2,44 @@
 from __future__ import annotations
 
 import numpy as np
-from in3110_instapy import io
 
-def python_color2gray(image: np.array) -> np.array:
+def python_color2gray(image: np.array, out: np.array = None) -> np.array:
     """Convert rgb pixel array to grayscale
 
     Args:
         image (np.array)
+        out (np.array): array to write the result to (optional).
+            May be `image` itself, to filter in place, or have
+            shape (H, W) to get a single gray channel.
     Returns:
         np.array: gray_image
     """
-    gray_image = np.empty_like(image)
-    
+    if out is None:
+        out = np.empty_like(image)
+    gray_image = out
+
     for row in range(image.shape[0]):
         for col in range(image.shape[1]):
             r, g, b = image[row, col]
             gray_pixel = (0.21 * r + 0.72 * g + 0.07 * b)
             gray_image[row, col] = gray_pixel
-    
-    gray_image = gray_image.astype("uint8")
+
     return gray_image
 
 
-def python_color2sepia(image: np.array) -> np.array:
+def python_color2sepia(image: np.array, out: np.array = None) -> np.array:
     """Convert rgb pixel array to sepia
 
     Args:
         image (np.array)
+        out (np.array): array to write the result to (optional).
+            May be `image` itself, to filter in place.
     Returns:
         np.array: sepia_image
     """
-    sepia_image = np.empty_like(image)
+    if out is None:
+        out = np.empty_like(image)
+    sepia_image = out
     # Iterate through the pixels
     # applying the sepia matrix
     sepia_matrix = [
@@ -51,6 +58,5 @@ def python_color2sepia(image: np.array) -> np.array:
             sepia_image[row, col] = (sepia_red, sepia_green, sepia_blue)
 
     # Return image
-    # don't forget to make sure it's the right type!
-    sepia_image = sepia_image.astype("uint8")
+    # (already the right type, since we wrote into a uint8 array)
     return sepia_image
@@ -0,0 +1,92 @@
+"""Region-of-interest filtering
+
+Runs any filter from `get_filter` on part of an image only: a rectangle,
+or the pixels selected by a mask. The rest of the image is left as it is.
+
+A rectangle is filtered as a view, straight into the same view of the
+output, so the work (and the filter's temporaries) scale with the size of
+the rectangle, not the image. A mask is filtered over its bounding box,
+and only the selected pixels are copied into the output.
+
+Filters that use neighbouring pixels (blur, sharpen, edges) only see
+the pixels inside the rectangle or bounding box, as if it were the whole image.
+"""
+from __future__ import annotations
+
+from typing import Callable, Tuple, Union
+
+import numpy as np
+
+# (top, left, height, width), (row_slice, col_slice) or a (H, W) mask
+Region = Union[Tuple[int, int, int, int], Tuple[slice, slice], np.array]
+
+
+def rectangle(top: int, left: int, height: int, width: int) -> Tuple[slice, slice]:
+    """Return the (row_slice, col_slice) of a rectangle, for indexing an image"""
+    if top < 0 or left < 0 or height < 0 or width < 0:
+        raise ValueError(f"rectangle must not be negative, got {(top, left, height, width)}")
+    return slice(top, top + height), slice(left, left + width)
+
+
+def bounding_box(mask: np.array) -> Tuple[slice, slice] | None:
+    """Return the (row_slice, col_slice) of the smallest rectangle holding every selected pixel
+
+    Returns:
+        (row_slice, col_slice), or None if no pixel is selected
+    """
+    rows = np.flatnonzero(mask.any(axis=1))
+    if not len(rows):
+        return None
+    cols = np.flatnonzero(mask.any(axis=0))
+    return slice(rows[0], rows[-1] + 1), slice(cols[0], cols[-1] + 1)
+
+
+def filter_region(
+    filter_function: Callable,
+    image: np.array,
+    region: Region,
+    out: np.array = None,
+    **kwargs,
+) -> np.array:
+    """Filter only a region of an image
+
+    Args:
+        filter_function (callable): filter from `get_filter`
+        image (np.array): the image to filter
+        region: the pixels to filter, as a (top, left, height, width)
+            rectangle, a (row_slice, col_slice) tuple, or a bool or uint8
+            mask with the image's height and width (nonzero is filtered)
+        out (np.array): array to write the result to (optional).
+            May be `image` itself, to filter only the region in place.
+            Any other `out` first gets a copy of the whole image.
+        **kwargs: extra arguments for the filter (e.g. k)
+    Returns:
+        np.array: the image with the region filtered (`out`, if given)
+    """
+    if out is None:
+        # (np.array, so read-only images, e.g. memory-mapped ones, give a writable copy)
+        out = np.array(image)
+    elif out is not image:
+        if out.shape != image.shape:
+            raise ValueError(f"out must have the same shape as image, got {out.shape} != {image.shape}")
+        out[...] = image
+
+    if isinstance(region, np.ndarray):
+        mask = region
+        if mask.shape != image.shape[:2]:
+            raise ValueError(f"mask must have the image's height and width, got {mask.shape} != {image.shape[:2]}")
+        box = bounding_box(mask)
+        if box is None:
+            return out
+        # filter the bounding box, and copy the selected pixels
+        filtered = filter_function(np.ascontiguousarray(image[box]), **kwargs)
+        selected = mask[box] != 0
+        np.copyto(out[box], filtered, where=selected[:, :, np.newaxis])
+        return out
+
+    if len(region) == 4:
+        region = rectangle(*region)
+    rows, cols = region
+    # filter straight into the output view (in place if out is image)
+    filter_function(image[rows, cols], out=out[rows, cols], **kwargs)
+    return out
@@ -0,0 +1,390 @@
+"""Frame-stream filtering
+
+Filter a sequence of frames (e.g. an image sequence dumped from a video)
+in one process, without allocating a new output array per frame.
+
+`filter_frames` is a generator: frames are read ahead on a background
+thread while the current one is filtered, and filtered frames are written
+into a small ring of reused output buffers.
+`filter_frame_dir` adds an encoding thread, so decoding, filtering and
+encoding of consecutive frames overlap.
+
+`filter_file_stages` does the same for a batch of unrelated files, with
+a pool of threads per stage (decode, filter, encode) connected by bounded
+queues, and reports how busy every stage was.
+"""
+from __future__ import annotations
+
+import queue
+import re
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Iterable, Iterator
+
+import numpy as np
+
+from . import io
+from .batch import _read_scaled, find_images
+
+# marks the end of a queue
+_DONE = object()
+
+
+class _Failed:
+    """Carries an exception from a background thread"""
+
+    def __init__(self, error: BaseException):
+        self.error = error
+
+
+def _put(q: queue.Queue, item, stop: threading.Event) -> bool:
+    """Put to a bounded queue, giving up if stop is set. Returns whether it was put."""
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _prefetch(items: Iterable, size: int, stop: threading.Event) -> queue.Queue:
+    """Start a thread pulling items from an iterable into a bounded queue"""
+    q = queue.Queue(maxsize=size)
+
+    def run():
+        try:
+            for item in items:
+                if not _put(q, item, stop):
+                    return
+        except BaseException as e:
+            _put(q, _Failed(e), stop)
+            return
+        _put(q, _DONE, stop)
+
+    threading.Thread(target=run, name="instapy-prefetch", daemon=True).start()
+    return q
+
+
+def _get_until(q: queue.Queue, stop: threading.Event):
+    """Get from a queue, returning _DONE if stop is set while waiting"""
+    while not stop.is_set():
+        try:
+            return q.get(timeout=0.1)
+        except queue.Empty:
+            continue
+    return _DONE
+
+
+def _get(q: queue.Queue):
+    """Get from a queue filled by _prefetch, raising errors from the thread"""
+    item = q.get()
+    if isinstance(item, _Failed):
+        raise item.error
+    return item
+
+
+def filter_frames(
+    frames: Iterable[np.array],
+    filter_function: Callable,
+    buffers: int = 2,
+    prefetch: int = 2,
+    **kwargs,
+) -> Iterator[np.array]:
+    """Filter a stream of frames
+
+    Output arrays are reused: a yielded frame stays valid until
+    `buffers - 1` more frames have been yielded. Copy it to keep it longer.
+
+    Args:
+        frames (iterable of np.array): the frames to filter.
+            Iterated on a background thread, so decoding
+            (e.g. with `read_frames`) overlaps filtering.
+        filter_function (callable): filter from `get_filter`
+        buffers (int): the number of output buffers to cycle through
+        prefetch (int): the number of frames to read ahead
+        **kwargs: extra arguments for the filter (e.g. k)
+    Returns:
+        iterator of np.array: the filtered frames
+    """
+    if buffers < 1:
+        raise ValueError(f"buffers must be at least 1, got {buffers=}")
+    stop = threading.Event()
+    frame_queue = _prefetch(frames, prefetch, stop)
+    ring = []
+    try:
+        i = 0
+        while True:
+            frame = _get(frame_queue)
+            if frame is _DONE:
+                return
+            slot = i % buffers
+            if slot == len(ring):
+                ring.append(np.empty_like(frame))
+            elif ring[slot].shape != frame.shape or ring[slot].dtype != frame.dtype:
+                # frame size changed
+                ring[slot] = np.empty_like(frame)
+            yield filter_function(frame, out=ring[slot], **kwargs)
+            i += 1
+    finally:
+        # stop the reading thread if we are closed early
+        stop.set()
+
+
+def frame_number(path: Path) -> tuple:
+    """Sort key for numbered frames: 'frame2.png' before 'frame10.png'"""
+    return tuple(int(part) if part.isdigit() else part for part in re.split(r"(\d+)", path.name))
+
+
+def read_frames(files: Iterable[str], scale: float = 1) -> Iterator[np.array]:
+    """Read image files one at a time, resizing them if needed"""
+    for file in files:
+        yield _read_scaled(file, scale)
+
+
+def filter_frame_dir(
+    in_dir: str,
+    out_dir: str,
+    filter_function: Callable,
+    buffers: int = 3,
+    prefetch: int = 2,
+    scale: float = 1,
+    **kwargs,
+) -> dict:
+    """Filter a directory of numbered frames
+
+    Frames are decoded on one background thread and encoded on another,
+    overlapping with filtering on the calling thread. Outputs get the
+    same filename as their input.
+
+    Args:
+        in_dir (str): the directory of frames, e.g. frame0001.png, frame0002.png, ...
+        out_dir (str): the directory to write filtered frames to
+        filter_function (callable): filter from `get_filter`
+        buffers (int): the number of output buffers (frames filtered
+            but not yet encoded, plus the one being filtered)
+        prefetch (int): the number of frames to decode ahead
+        scale (float): scale factor to resize frames before filtering
+        **kwargs: extra arguments for the filter (e.g. k)
+    Returns:
+        dict: statistics of the run, with keys 'frames', 'seconds' and 'fps'
+    """
+    if buffers < 2:
+        raise ValueError(f"buffers must be at least 2, got {buffers=}")
+    files = sorted(find_images([in_dir]), key=frame_number)
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    stop = threading.Event()
+    # buffers go round: free -> filtered -> encoded -> free
+    free_buffers = queue.Queue()
+    for _ in range(buffers):
+        free_buffers.put(None)
+    # (bounded by the number of buffers)
+    encode_queue = queue.Queue()
+    errors = []
+
+    def encode():
+        while True:
+            item = encode_queue.get()
+            if item is _DONE:
+                return
+            out_file, buffer = item
+            try:
+                io.write_image(buffer, out_file)
+            except BaseException as e:
+                # the filtering loop checks for errors before every frame
+                errors.append(e)
+            free_buffers.put(buffer)
+
+    encoder = threading.Thread(target=encode, name="instapy-encode", daemon=True)
+    encoder.start()
+
+    start_time = time.perf_counter()
+    count = 0
+    frame_queue = _prefetch(read_frames(files, scale), prefetch, stop)
+    try:
+        for file in files:
+            frame = _get(frame_queue)
+            if frame is _DONE or errors:
+                break
+            # wait for a buffer the encoder is done with
+            buffer = free_buffers.get()
+            if buffer is None or buffer.shape != frame.shape or buffer.dtype != frame.dtype:
+                buffer = np.empty_like(frame)
+            filter_function(frame, out=buffer, **kwargs)
+            encode_queue.put((out_dir / file.name, buffer))
+            count += 1
+    finally:
+        stop.set()
+        encode_queue.put(_DONE)
+        encoder.join()
+    if errors:
+        raise errors[0]
+    seconds = time.perf_counter() - start_time
+
+    return {
+        "frames": count,
+        "seconds": seconds,
+        "fps": count / seconds if seconds else float("inf"),
+    }
+
+
+# the stages of filter_file_stages, in order
+STAGES = ["decode", "filter", "encode"]
+
+
+def filter_file_stages(
+    jobs: Iterable[tuple[Path, Path]],
+    filter_function: Callable,
+    decoders: int = 2,
+    encoders: int = 2,
+    queue_size: int = 4,
+    scale: float = 1,
+    single_channel: bool = False,
+    **kwargs,
+) -> dict:
+    """Filter (input, output) files with decoding, filtering and encoding overlapped
+
+    Each stage runs on its own threads (decoding and encoding in PIL, and
+    the numba, cython and numpy filters, release the GIL), passing images
+    through queues of at most `queue_size` images. When a later stage falls
+    behind, the earlier ones block (back-pressure), so at most about
+    2 * queue_size + decoders + encoders + 1 images are in memory at once,
+    however many files there are.
+
+    Args:
+        jobs (iterable of (Path, Path)): the input and output files
+        filter_function (callable): filter from `get_filter`
+        decoders (int): the number of decoding threads
+        encoders (int): the number of encoding threads
+        queue_size (int): the maximum number of images waiting between two stages
+        scale (float): scale factor to resize images before filtering
+        single_channel (bool): write gray images with one channel
+            (only for color2gray)
+        **kwargs: extra arguments for the filter (e.g. k)
+    Returns:
+        dict: statistics of the run, with keys 'images', 'seconds',
+            'images_per_second' and 'stages', the busy time of each
+            stage summed over its threads ('seconds') and its number of
+            threads ('threads'). 'bottleneck' is the stage with the most
+            busy time per thread.
+    """
+    if decoders < 1 or encoders < 1:
+        raise ValueError(f"every stage needs at least 1 thread, got {decoders=}, {encoders=}")
+    if queue_size < 1:
+        raise ValueError(f"queue_size must be at least 1, got {queue_size=}")
+
+    stop = threading.Event()
+    todo = queue.Queue()
+    for job in jobs:
+        todo.put(job)
+    decoded = queue.Queue(maxsize=queue_size)
+    filtered = queue.Queue(maxsize=queue_size)
+    errors = []
+    busy = {stage: 0.0 for stage in STAGES}
+    lock = threading.Lock()
+
+    def add_busy(stage, seconds):
+        with lock:
+            busy[stage] += seconds
+
+    def fail(error):
+        # stop every stage, and raise the first error when they are done
+        errors.append(error)
+        stop.set()
+
+    def decode():
+        try:
+            while not stop.is_set():
+                try:
+                    in_file, out_file = todo.get_nowait()
+                except queue.Empty:
+                    break
+                start = time.perf_counter()
+                image = _read_scaled(in_file, scale)
+                add_busy("decode", time.perf_counter() - start)
+                if not _put(decoded, (out_file, image), stop):
+                    return
+        except BaseException as e:
+            fail(e)
+        _put(decoded, _DONE, stop)
+
+    def filter_images():
+        count = 0
+        running = decoders
+        try:
+            while running:
+                item = _get_until(decoded, stop)
+                if item is _DONE:
+                    # one decoder finished (or we are stopping)
+                    running -= 1
+                    if stop.is_set():
+                        break
+                    continue
+                out_file, image = item
+                start = time.perf_counter()
+                out = np.empty(image.shape[:2], dtype=np.uint8) if single_channel else None
+                result = filter_function(image, out=out, **kwargs)
+                add_busy("filter", time.perf_counter() - start)
+                if not _put(filtered, (out_file, result), stop):
+                    break
+                count += 1
+        except BaseException as e:
+            fail(e)
+        for _ in range(encoders):
+            _put(filtered, _DONE, stop)
+        return count
+
+    def encode():
+        try:
+            while True:
+                item = _get_until(filtered, stop)
+                if item is _DONE:
+                    return
+                out_file, image = item
+                start = time.perf_counter()
+                io.write_image(image, out_file)
+                add_busy("encode", time.perf_counter() - start)
+        except BaseException as e:
+            fail(e)
+
+    start_time = time.perf_counter()
+    threads = [threading.Thread(target=decode, name="instapy-decode", daemon=True) for _ in range(decoders)]
+    threads += [threading.Thread(target=encode, name="instapy-encode", daemon=True) for _ in range(encoders)]
+    for thread in threads:
+        thread.start()
+    try:
+        # filter on this thread
+        count = filter_images()
+    finally:
+        for thread in threads:
+            thread.join()
+    if errors:
+        raise errors[0]
+    seconds = time.perf_counter() - start_time
+
+    workers = {"decode": decoders, "filter": 1, "encode": encoders}
+    stages = {stage: {"seconds": busy[stage], "threads": workers[stage]} for stage in STAGES}
+    return {
+        "images": count,
+        "seconds": seconds,
+        "images_per_second": count / seconds if seconds else float("inf"),
+        "stages": stages,
+        "bottleneck": bottleneck(stages),
+    }
+
+
+def bottleneck(stages: dict) -> str:
+    """Return the stage with the most busy time per thread"""
+    return max(stages, key=lambda stage: stages[stage]["seconds"] / stages[stage]["threads"])
+
+
+def format_stages(stats: dict) -> str:
+    """Format the stage timings from `filter_file_stages`"""
+    stages = ", ".join(
+        f"{stage} {timing['seconds']:.3}s" + (f" ({timing['threads']} threads)" if timing["threads"] > 1 else "")
+        for stage, timing in stats["stages"].items()
+    )
+    return f"Stages (busy time): {stages}; bottleneck: {stats['bottleneck']}"
@@ -0,0 +1,83 @@
+"""Tiled (out-of-core) filtering
+
+Runs any filter from `get_filter` over fixed-size tiles of an image,
+writing each filtered tile straight into the output.
+The filter never sees more than one tile at a time,
+so its temporaries (e.g. the float64 arrays in the numpy backend)
+are bounded by the tile size instead of the image size.
+"""
+from __future__ import annotations
+
+from typing import Callable, Iterator, Tuple, Union
+
+import numpy as np
+
+TileSize = Union[int, Tuple[int, int]]
+
+# 512x512 rgb tiles are 768kB of uint8, and 6MB as float64
+DEFAULT_TILE_SIZE = 512
+
+
+def _tile_shape(tile_size: TileSize) -> Tuple[int, int]:
+    """Normalize a tile size to (rows, cols)"""
+    if isinstance(tile_size, int):
+        tile_size = (tile_size, tile_size)
+    rows, cols = tile_size
+    if rows < 1 or cols < 1:
+        raise ValueError(f"tile size must be positive, got {tile_size=}")
+    return rows, cols
+
+
+def iter_tiles(shape: tuple, tile_size: TileSize = DEFAULT_TILE_SIZE) -> Iterator[Tuple[slice, slice]]:
+    """Iterate over the tiles covering an image of a given shape
+
+    Tiles are yielded row by row. Tiles on the bottom and right edges
+    are cropped to fit inside the image.
+
+    Args:
+        shape (tuple): the shape of the image, (height, width, ...)
+        tile_size (int or (int, int)): the size of a tile, (rows, cols).
+            Use (rows, width) to process the image in horizontal strips.
+    Returns:
+        iterator of (row_slice, col_slice) tuples, for indexing the image
+    """
+    height, width = shape[:2]
+    tile_rows, tile_cols = _tile_shape(tile_size)
+    for top in range(0, height, tile_rows):
+        rows = slice(top, min(top + tile_rows, height))
+        for left in range(0, width, tile_cols):
+            cols = slice(left, min(left + tile_cols, width))
+            yield rows, cols
+
+
+def tiled_filter(
+    filter_function: Callable,
+    image: np.array,
+    out: np.array = None,
+    tile_size: TileSize = DEFAULT_TILE_SIZE,
+    **kwargs,
+) -> np.array:
+    """Apply a filter to an image one tile at a time
+
+    `image` and `out` may be any array supporting slicing,
+    e.g. a `np.memmap`, so neither needs to fit in memory.
+
+    Args:
+        filter_function (callable): filter from `get_filter`
+        image (np.array): the image to filter
+        out (np.array): where to write the filtered image (optional).
+            A new array is allocated if not given.
+        tile_size (int or (int, int)): the size of a tile, (rows, cols)
+        **kwargs: extra arguments to pass to filter_function (e.g. k)
+    Returns:
+        np.array: the filtered image (`out`, if given)
+    """
+    if out is None:
+        out = np.empty_like(image)
+    if out.shape[:2] != image.shape[:2]:
+        raise ValueError(f"out must have the same size as image, got {out.shape} != {image.shape}")
+
+    for rows, cols in iter_tiles(image.shape, tile_size):
+        # filter straight into the output view, no per-tile result array
+        filter_function(np.ascontiguousarray(image[rows, cols]), out=out[rows, cols], **kwargs)
+    return out
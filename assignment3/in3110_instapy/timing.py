@@ -1,16 +1,79 @@
+"""Benchmark suite for the filter implementations
+
+Run as `python -m in3110_instapy.timing` (see `--help`).
+
+Every filter and implementation is timed on images of several sizes and
+shapes, with warm-up calls first (so e.g. JIT compilation isn't counted).
+Results are summarized as median and interquartile range (IQR) of the
+call time, and throughput in megapixels per second, and written as JSON.
+Results can be compared against a saved baseline, failing when an
+implementation got slower than a tolerance.
+"""
 from __future__ import annotations
 
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
 import time
+import tracemalloc
+from datetime import datetime, timezone
 from typing import Callable
 
+import numpy as np
+
 from . import get_filter, io
 
+FILTERS = ["color2gray", "color2sepia"]
+IMPLEMENTATIONS = ["python", "numpy", "numba", "numba_parallel", "lut", "cython"]
+
+# (height, width): small, VGA, full HD landscape and portrait, and a thin strip
+SIZES = [(180, 320), (480, 640), (1080, 1920), (1920, 1080), (64, 4096)]
+
+# the pure python implementation takes ~1s for a 640x480 image,
+# so it is only timed on small ones
+MAX_PIXELS = {"python": 640 * 480}
+
+# the implementations that release the GIL, timed in row bands on threads
+BAND_IMPLEMENTATIONS = ["numpy", "numba", "lut", "cython"]
+
+
+def measure(filter_function: Callable, *arguments, repeat: int = 5, warmup: int = 1, **kwargs) -> list[int]:
+    """Measure the time of repeated calls
+
+    Args:
+        filter_function (callable):
+            The filter function to time
+        *arguments:
+            Arguments to pass to filter_function
+        repeat (int):
+            The number of calls to measure
+        warmup (int):
+            The number of calls to make before measuring
+        **kwargs:
+            Keyword arguments to pass to filter_function
+    Returns:
+        samples (list of int):
+            The time of every measured call, in nanoseconds
+    """
+    for _ in range(warmup):
+        filter_function(*arguments, **kwargs)
+
+    samples = []
+    for _ in range(repeat):
+        start_time = time.perf_counter_ns()
+        filter_function(*arguments, **kwargs)
+        samples.append(time.perf_counter_ns() - start_time)
+    return samples
 
-def time_one(filter_function: Callable, *arguments, calls: int = 3) -> float:
+
+def time_one(filter_function: Callable, *arguments, calls: int = 3, warmup: int = 1, **kwargs) -> float:
     """Return the time for one call
 
-    When measuring, repeat the call `calls` times,
-    and return the average.
+    When measuring, call the function `warmup` times first,
+    then repeat the call `calls` times, and return the median.
 
     Args:
         filter_function (callable):
@@ -20,67 +83,554 @@ def time_one(filter_function: Callable, *arguments, calls: int = 3) -> float:
         calls (int):
             The number of times to call the function,
             for measurement
+        warmup (int):
+            The number of calls to make before measuring
+        **kwargs:
+            Keyword arguments to pass to filter_function
     Returns:
         time (float):
-            The average time (in seconds) to run filter_function(*arguments)
+            The median time (in seconds) to run filter_function(*arguments, **kwargs)
+    """
+    samples = measure(filter_function, *arguments, repeat=calls, warmup=warmup, **kwargs)
+    return float(np.median(samples)) / 1e9
+
+
+def summarize(samples: list[int], pixels: int) -> dict:
+    """Summarize timing samples
+
+    Args:
+        samples (list of int): call times in nanoseconds, from `measure`
+        pixels (int): the number of pixels filtered per call
+    Returns:
+        dict with the median, first and third quartile and IQR (in seconds),
+        the number of samples, and the throughput in megapixels per second
+    """
+    q1, median, q3 = np.percentile(samples, [25, 50, 75]) / 1e9
+    return {
+        "median_s": median,
+        "q1_s": q1,
+        "q3_s": q3,
+        "iqr_s": q3 - q1,
+        "repeat": len(samples),
+        "mpix_per_s": pixels / median / 1e6 if median else float("inf"),
+    }
+
+
+def allocations_one(filter_function: Callable, image: np.array, out: np.array = None) -> int:
+    """Return the memory allocated by one call
+
+    Measured as the peak memory traced by tracemalloc during the call
+    (numpy reports its array buffers to tracemalloc).
+    Call the filter once before measuring, so one-time costs
+    like JIT compilation are not included.
+
+    Args:
+        filter_function (callable):
+            The filter function to measure
+        image (np.array):
+            The image to filter
+        out (np.array):
+            Output buffer to pass to filter_function (optional)
+    Returns:
+        nbytes (int):
+            The peak number of bytes allocated during the call
+    """
+    kwargs = {} if out is None else {"out": out}
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        before, _ = tracemalloc.get_traced_memory()
+        filter_function(image, **kwargs)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak - before
+
+
+# measures startup in a fresh interpreter, printing the times as json
+_STARTUP_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+from in3110_instapy import get_filter, io
+filter_function = get_filter(sys.argv[1], sys.argv[2])
+image = io.random_image()
+imported = time.perf_counter()
+filter_function(image)
+cold = time.perf_counter()
+filter_function(image)
+warm = time.perf_counter()
+print(json.dumps({"import": imported - start, "cold": cold - imported, "warm": warm - cold}))
+"""
+
+
+def startup_times(filter_name: str, implementation: str) -> dict:
+    """Measure the startup latency of a filter in a new process
+
+    The first (cold) call includes JIT compilation or loading
+    compiled kernels from the cache, the second (warm) call doesn't.
+
+    Args:
+        filter_name (str): the filter to measure
+        implementation (str): the implementation to measure
+    Returns:
+        dict: seconds for 'import' (including get_filter),
+            the 'cold' first call and the 'warm' second call
+    """
+    result = subprocess.run(
+        [sys.executable, "-c", _STARTUP_SCRIPT, filter_name, implementation],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(result.stdout)
+
+
+def _thread_counts(max_threads: int) -> list[int]:
+    """Thread counts doubling from 1 up to max_threads"""
+    thread_counts = []
+    n = 1
+    while n < max_threads:
+        thread_counts.append(n)
+        n *= 2
+    thread_counts.append(max_threads)
+    return thread_counts
+
+
+def thread_scaling(filter_name: str, image: np.array, repeat: int = 5, warmup: int = 1) -> list[dict]:
+    """Time the numba_parallel implementation for increasing thread counts
+
+    Thread counts are doubled from 1 up to the number of available cores.
+
+    Args:
+        filter_name (str): the filter to time
+        image (np.array): the image to filter
+        repeat (int): the number of calls to measure per thread count
+        warmup (int): the number of calls before measuring
+    Returns:
+        list of dicts with the timing summary, speedup and parallel efficiency
+        for each thread count
+    """
+    from . import numba_parallel_filters
+
+    filter = get_filter(filter_name, "numba_parallel")
+    previous_threads = numba_parallel_filters.get_num_threads()
+    results = []
+    try:
+        for threads in _thread_counts(numba_parallel_filters.max_threads()):
+            numba_parallel_filters.set_num_threads(threads)
+            samples = measure(filter, image, repeat=repeat, warmup=warmup)
+            result = {"filter": filter_name, "threads": threads}
+            result.update(summarize(samples, image.shape[0] * image.shape[1]))
+            speedup = results[0]["median_s"] / result["median_s"] if results else 1.0
+            result["speedup"] = speedup
+            result["efficiency"] = speedup / threads
+            results.append(result)
+    finally:
+        numba_parallel_filters.set_num_threads(previous_threads)
+    return results
+
+
+def band_scaling(
+    filter_name: str, implementation: str, image: np.array, repeat: int = 5, warmup: int = 1
+) -> list[dict]:
+    """Time filtering row bands in threads (parallel.ThreadBandExecutor) for increasing thread counts
+
+    Thread counts are doubled from 1 up to the number of cores.
+
+    Args:
+        filter_name (str): the filter to time
+        implementation (str): the implementation to run on the bands
+        image (np.array): the image to filter
+        repeat (int): the number of calls to measure per thread count
+        warmup (int): the number of calls before measuring
+    Returns:
+        list of dicts with the timing summary, speedup and parallel efficiency
+        for each thread count
+    """
+    from .parallel import ThreadBandExecutor
+
+    out = np.empty_like(image)
+    results = []
+    for threads in _thread_counts(os.cpu_count() or 1):
+        with ThreadBandExecutor(threads) as executor:
+            samples = measure(executor.filter, image, filter_name, implementation, out, repeat=repeat, warmup=warmup)
+        result = {"filter": filter_name, "implementation": implementation, "threads": threads}
+        result.update(summarize(samples, image.shape[0] * image.shape[1]))
+        speedup = results[0]["median_s"] / result["median_s"] if results else 1.0
+        result["speedup"] = speedup
+        result["efficiency"] = speedup / threads
+        results.append(result)
+    return results
+
+
+def sepia_memory(image: np.array, repeat: int = 5, warmup: int = 1) -> list[dict]:
+    """Time numpy_color2sepia and measure its peak memory, with and without row blocks
+
+    Args:
+        image (np.array): the image to filter
+        repeat (int): the number of calls to measure per mode
+        warmup (int): the number of calls before measuring
+    Returns:
+        list of dicts with the timing summary and
+        peak traced memory ('peak_bytes') of each mode
     """
-    # run the filter function `calls` times
-    # return the _average_ time of one call
-    total_time = 0.0
-    for _ in range(calls):
-        start_time = time.time()
-        filter_function(arguments[0])
-        end_time = time.time()
-        total_time += (end_time - start_time)
-        
-    return total_time / calls
-    
-
-def make_reports(filename: str = "test/rain.jpg", calls: int = 3):
+    from .numpy_filters import numpy_color2sepia
+
+    modes = [
+        ("whole image, float64", {"block_rows": image.shape[0]}),
+        ("row blocks, float64", {}),
+        ("row blocks, float32", {"dtype": np.float32}),
+    ]
+    results = []
+    for mode, kwargs in modes:
+        samples = measure(numpy_color2sepia, image, repeat=repeat, warmup=warmup, **kwargs)
+        result = {"mode": mode, "height": image.shape[0], "width": image.shape[1]}
+        result.update(summarize(samples, image.shape[0] * image.shape[1]))
+        result["peak_bytes"] = allocations_one(lambda image: numpy_color2sepia(image, **kwargs), image)
+        results.append(result)
+    return results
+
+
+def convolution_benchmarks(
+    image: np.array, sizes: list[int] = (3, 9, 25), repeat: int = 5, warmup: int = 1
+) -> list[dict]:
+    """Time the convolution methods against a naive 2D convolution
+
+    Every method blurs with a k x k box kernel: naive 2D, two separable
+    1D passes, FFT and running sums (box_sums), with numpy.
+
+    Args:
+        image (np.array): the image to filter
+        sizes (list of int): the kernel sizes (odd)
+        repeat (int): the number of calls to measure
+        warmup (int): the number of calls before measuring
+    Returns:
+        list of dicts with the kernel size, method, timing summary
+        and speedup over the naive method
     """
-    Make timing reports for all implementations and filters,
-    run for a given image.
+    from . import convolution
+
+    results = []
+    for size in sizes:
+        row = convolution.box_kernel(size // 2)
+        kernel = np.outer(row, row)
+        methods = {
+            "naive": lambda: convolution.correlate(image, kernel, method="naive"),
+            "separable": lambda: convolution.correlate(image, (row, row), method="separable"),
+            "fft": lambda: convolution.correlate(image, kernel, method="fft"),
+            "running sums": lambda: convolution.box_sums(image, size // 2),
+        }
+        naive = None
+        for method, function in methods.items():
+            samples = measure(function, repeat=repeat, warmup=warmup)
+            result = {"kernel_size": size, "method": method, "height": image.shape[0], "width": image.shape[1]}
+            result.update(summarize(samples, image.shape[0] * image.shape[1]))
+            if naive is None:
+                naive = result["median_s"]
+            result["speedup"] = naive / result["median_s"]
+            results.append(result)
+    return results
+
+
+def _available(implementations: list[str]) -> list[str]:
+    """The implementations that can be imported"""
+    available = []
+    for implementation in implementations:
+        try:
+            get_filter(FILTERS[0], implementation)
+        except ImportError as e:
+            # e.g. cython not compiled
+            print(f"Skipping {implementation}: {e}", file=sys.stderr)
+            continue
+        available.append(implementation)
+    return available
+
+
+def run_benchmarks(
+    filters: list[str] = FILTERS,
+    implementations: list[str] = IMPLEMENTATIONS,
+    sizes: list[tuple] = SIZES,
+    images: dict = None,
+    repeat: int = 7,
+    warmup: int = 2,
+    seed: int = 0,
+    startup: bool = True,
+    scaling: bool = True,
+    memory: bool = True,
+    convolution: bool = True,
+    bands: bool = True,
+) -> dict:
+    """Run the benchmark suite
 
     Args:
-        filename (str): the image file to use
+        filters (list of str): the filters to time
+        implementations (list of str): the implementations to time.
+            Implementations that can't be imported are skipped.
+        sizes (list of (height, width)): sizes of random images to time with
+        images (dict): extra images to time with, by name (optional)
+        repeat (int): the number of calls to measure
+        warmup (int): the number of calls before measuring
+        seed (int): the random seed for generating images
+        startup (bool): also measure cold and warm call latency
+            of the JIT compiled implementations in a new process
+        scaling (bool): also measure how numba_parallel scales
+            with the number of threads, on the largest image
+        memory (bool): also compare time and peak memory of numpy_color2sepia
+            with and without row blocks, on the largest image
+        convolution (bool): also compare the convolution methods
+            against naive 2D convolution, on a 320x240 image
+        bands (bool): also measure how filtering row bands in threads
+            scales with the number of threads, on the largest image
+            (for the implementations releasing the GIL)
+    Returns:
+        dict: the report, with the environment under 'meta',
+            one dict per measurement under 'results', and
+            the 'startup', 'scaling', 'memory', 'convolution' and 'bands'
+            measurements if requested
     """
+    rng_state = np.random.get_state()
+    np.random.seed(seed)
+    try:
+        test_images = {f"random {width}x{height}": io.random_image(width, height) for height, width in sizes}
+    finally:
+        np.random.set_state(rng_state)
+    test_images.update(images or {})
+
+    implementations = _available(implementations)
+    results = []
+    for filter_name in filters:
+        for implementation in implementations:
+            filter_function = get_filter(filter_name, implementation)
+            for image_name, image in test_images.items():
+                height, width = image.shape[:2]
+                pixels = height * width
+                if pixels > MAX_PIXELS.get(implementation, pixels):
+                    continue
+                samples = measure(filter_function, image, repeat=repeat, warmup=warmup)
+                result = {
+                    "filter": filter_name,
+                    "implementation": implementation,
+                    "image": image_name,
+                    "height": height,
+                    "width": width,
+                }
+                result.update(summarize(samples, pixels))
+                result["allocated_bytes"] = allocations_one(filter_function, image)
+                result["allocated_bytes_out"] = allocations_one(filter_function, image, out=np.empty_like(image))
+                results.append(result)
+                print(format_result(result), file=sys.stderr)
+
+    extras = {}
+    if startup:
+        extras["startup"] = [
+            dict(filter=filter_name, implementation=implementation, **startup_times(filter_name, implementation))
+            for filter_name in filters
+            for implementation in implementations
+            if implementation in ("numba", "numba_parallel")
+        ]
+    largest = max(test_images.values(), key=lambda image: image.shape[0] * image.shape[1])
+    if scaling and "numba_parallel" in implementations:
+        extras["scaling"] = [
+            result
+            for filter_name in filters
+            for result in thread_scaling(filter_name, largest, repeat=repeat, warmup=warmup)
+        ]
+    if bands:
+        extras["bands"] = [
+            result
+            for filter_name in filters
+            for implementation in implementations
+            if implementation in BAND_IMPLEMENTATIONS
+            for result in band_scaling(filter_name, implementation, largest, repeat=repeat, warmup=warmup)
+        ]
+    if memory and "numpy" in implementations and "color2sepia" in filters:
+        extras["memory"] = sepia_memory(largest, repeat=repeat, warmup=warmup)
+    if convolution:
+        rng_state = np.random.get_state()
+        np.random.seed(seed)
+        try:
+            image = io.random_image(320, 240)
+        finally:
+            np.random.set_state(rng_state)
+        # (the naive method is slow, so fewer calls)
+        extras["convolution"] = convolution_benchmarks(image, repeat=min(repeat, 3), warmup=1)
+
+    return {
+        "meta": {
+            "date": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "machine": platform.machine(),
+            "processor": platform.processor(),
+            "repeat": repeat,
+            "warmup": warmup,
+        },
+        "results": results,
+        **extras,
+    }
 
-    # load the image
-    image = io.read_image(filename)
-    print(f"Timing preformed using {filename}: {image.shape[1]}x{image.shape[0]}")
-    f = open("timing_report.txt", "w")
-    f.write(f"Timing preformed using {filename}: {image.shape[1]}x{image.shape[0]}")
-    
-    # iterate through the filters
-    filter_names = ["color2gray", "color2sepia"]
-    for filter_name in filter_names:
-        # get the reference filter function
-        reference_filter = get_filter(filter_name, "python")
-        # time the reference implementation
-        reference_time = time_one(reference_filter, image)
 
+def _key(result: dict) -> tuple:
+    return (result["filter"], result["implementation"], result["height"], result["width"])
+
+
+def compare(report: dict, baseline: dict, tolerance: float = 0.1) -> list[dict]:
+    """Compare benchmark results against a baseline
+
+    A measurement has regressed if its median is more than `tolerance`
+    slower than the baseline's, and the difference is larger than the
+    baseline's interquartile range (so noisy measurements don't fail).
+
+    Args:
+        report (dict): results from `run_benchmarks`
+        baseline (dict): earlier results from `run_benchmarks`
+        tolerance (float): allowed slowdown, as a fraction
+    Returns:
+        list of dicts: the regressed measurements, with the baseline
+            median and the relative slowdown added
+    """
+    baseline_results = {_key(result): result for result in baseline["results"]}
+    regressions = []
+    for result in report["results"]:
+        base = baseline_results.get(_key(result))
+        if base is None:
+            continue
+        slowdown = result["median_s"] / base["median_s"] - 1
+        if slowdown > tolerance and result["median_s"] - base["median_s"] > base["iqr_s"]:
+            regression = dict(result)
+            regression["baseline_median_s"] = base["median_s"]
+            regression["slowdown"] = slowdown
+            regressions.append(regression)
+    return regressions
+
+
+def format_result(result: dict) -> str:
+    """Format one measurement as a line of text"""
+    return (
+        f"{result['implementation']} {result['filter']} {result['width']}x{result['height']}: "
+        f"median {result['median_s']:.3}s (IQR {result['iqr_s']:.2}s), "
+        f"{result['mpix_per_s']:.1f} MP/s, {result['allocated_bytes'] / 2**20:.1f} MiB peak"
+    )
+
+
+def write_report(report: dict, filename: str) -> None:
+    """Write a benchmark report as json"""
+    with open(filename, "w") as f:
+        json.dump(report, f, indent=2)
+
+
+def read_report(filename: str) -> dict:
+    """Read a benchmark report written by `write_report`"""
+    with open(filename) as f:
+        return json.load(f)
+
+
+def make_reports(
+    filename: str = None,
+    output: str = "timing_report.json",
+    baseline: str = None,
+    tolerance: float = 0.1,
+    **kwargs,
+) -> list[dict]:
+    """Run the benchmark suite, write the json report and compare to a baseline
+
+    Args:
+        filename (str): an image file to time with,
+            in addition to the random images (optional)
+        output (str): the json file to write the report to
+        baseline (str): a json report to compare to (optional)
+        tolerance (float): allowed slowdown compared to the baseline
+        **kwargs: passed to `run_benchmarks`
+    Returns:
+        list of dicts: regressions compared to the baseline (empty if none)
+    """
+    images = kwargs.pop("images", {})
+    if filename:
+        images[str(filename)] = io.read_image(filename)
+    report = run_benchmarks(images=images, **kwargs)
+    write_report(report, output)
+    for result in report.get("startup", []):
         print(
-            f"\nReference (pure Python) filter time {filter_name}: {reference_time:.3}s ({calls=})"
+            f"Startup: {result['implementation']} {result['filter']}: import {result['import']:.3}s, "
+            f"cold call {result['cold']:.3}s, warm call {result['warm']:.3}s"
         )
-        f.write(f"\n\nReference (pure Python) filter time {filter_name}: {reference_time:.3}s ({calls=})")
-        
-        # iterate through the implementations
-        implementations = ["numpy", "numba"]
-        for implementation in implementations:
-            filter = get_filter(filter_name, implementation)
-            # time the filter
-            filter_time = time_one(filter, image)
-            
-            # compare the reference time to the optimized time
-            speedup = reference_time / filter_time
-            print(
-                f"Timing: {implementation} {filter_name}: {filter_time:.3}s ({speedup=:.2f}x)"
-            )
-            f.write(f"\nTiming: {implementation} {filter_name}: {filter_time:.3}s ({speedup=:.2f}x)")
-    
-    f.close()
+    for result in report.get("scaling", []):
+        print(
+            f"Scaling: numba_parallel {result['filter']} threads={result['threads']}: "
+            f"{result['median_s']:.3}s (speedup={result['speedup']:.2f}x, efficiency={result['efficiency']:.0%})"
+        )
+    for result in report.get("bands", []):
+        print(
+            f"Bands: {result['implementation']} {result['filter']} threads={result['threads']}: "
+            f"{result['median_s']:.3}s (speedup={result['speedup']:.2f}x, efficiency={result['efficiency']:.0%})"
+        )
+    for result in report.get("memory", []):
+        print(
+            f"Memory: numpy color2sepia {result['width']}x{result['height']} ({result['mode']}): "
+            f"{result['median_s']:.3}s, {result['peak_bytes'] / 2**20:.1f} MiB peak"
+        )
+    for result in report.get("convolution", []):
+        print(
+            f"Convolution: {result['kernel_size']}x{result['kernel_size']} box, {result['method']}: "
+            f"{result['median_s']:.3}s ({result['speedup']:.1f}x naive)"
+        )
+    print(f"Wrote {len(report['results'])} results to {output}")
+
+    if not baseline:
+        return []
+    regressions = compare(report, read_report(baseline), tolerance)
+    for regression in regressions:
+        print(
+            f"REGRESSION: {format_result(regression)}, "
+            f"baseline {regression['baseline_median_s']:.3}s ({regression['slowdown']:+.0%})"
+        )
+    return regressions
+
+
+def _size(text: str) -> tuple:
+    """Parse a WIDTHxHEIGHT size"""
+    width, height = text.lower().split("x")
+    return int(height), int(width)
+
+
+def main(argv=None) -> int:
+    """Run the benchmark suite from the command-line"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-f", "--filters", nargs="+", default=FILTERS, help="The filters to time")
+    parser.add_argument("-i", "--implementations", nargs="+", default=IMPLEMENTATIONS, help="The implementations to time")
+    parser.add_argument("-s", "--sizes", nargs="+", type=_size, default=SIZES, help="Random image sizes to time, as WIDTHxHEIGHT")
+    parser.add_argument("--image", help="An image file to time with as well")
+    parser.add_argument("-n", "--repeat", type=int, default=7, help="Number of measured calls")
+    parser.add_argument("-w", "--warmup", type=int, default=2, help="Number of calls before measuring")
+    parser.add_argument("-o", "--output", default="timing_report.json", help="The json file to write")
+    parser.add_argument("-b", "--baseline", help="A json report to compare to, fails if anything got slower")
+    parser.add_argument("--no-startup", dest="startup", action="store_false", help="Don't measure startup (cold call) latency")
+    parser.add_argument("--no-scaling", dest="scaling", action="store_false", help="Don't measure numba_parallel thread scaling")
+    parser.add_argument("--no-bands", dest="bands", action="store_false", help="Don't measure row bands in threads scaling")
+    parser.add_argument("--no-memory", dest="memory", action="store_false", help="Don't compare numpy sepia memory use with and without row blocks")
+    parser.add_argument("--no-convolution", dest="convolution", action="store_false", help="Don't compare the convolution methods against naive 2D convolution")
+    parser.add_argument("-t", "--tolerance", type=float, default=0.1, help="Allowed slowdown compared to the baseline (default: 0.1, i.e. 10%%)")
+    args = parser.parse_args(argv)
+
+    regressions = make_reports(
+        args.image,
+        output=args.output,
+        baseline=args.baseline,
+        tolerance=args.tolerance,
+        filters=args.filters,
+        implementations=args.implementations,
+        sizes=args.sizes,
+        repeat=args.repeat,
+        warmup=args.warmup,
+        startup=args.startup,
+        scaling=args.scaling,
+        memory=args.memory,
+        convolution=args.convolution,
+        bands=args.bands,
+    )
+    return 1 if regressions else 0
 
 
 if __name__ == "__main__":
     # run as `python -m in3110_instapy.timing`
-    make_reports()
+    sys.exit(main())
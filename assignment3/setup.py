@@ -1,38 +1,67 @@
+import os
+import sys
+
 from setuptools import setup
 
 # IN4110: set to True when you are ready for the Cython implementation
-use_cython = False
+use_cython = True
+
+# build with profiling/line tracing enabled, e.g.
+# INSTAPY_CYTHON_PROFILE=1 pip install --editable .
+# (tracing slows the compiled code down a lot, so it is off by default)
+cython_profile = os.environ.get("INSTAPY_CYTHON_PROFILE", "0") not in {"", "0"}
 
 
 if use_cython:
     from Cython.Build import cythonize
     from setuptools import Extension
 
+    define_macros = []
+    cython_directives = {
+        "language_level": 3,
+        # optimize compilation
+        "boundscheck": False,
+        "wraparound": False,
+        "initializedcheck": False,
+        "cdivision": True,
+    }
+    if cython_profile:
+        # enable profiling
+        define_macros += [
+            ("CYTHON_TRACE", "1"),
+            ("CYTHON_TRACE_NOGIL", "1"),
+        ]
+        cython_directives.update(
+            {
+                "binding": True,
+                "profile": True,
+                "linetrace": True,
+            }
+        )
+
+    # OpenMP for prange (Apple's clang doesn't ship it,
+    # there prange runs serially)
+    if sys.platform == "win32":
+        openmp_args = ["/openmp"], []
+    elif sys.platform == "darwin":
+        openmp_args = [], []
+    else:
+        openmp_args = ["-fopenmp"], ["-fopenmp"]
+
     extensions = [
         # A single module that is stand alone and has no special requisites
         Extension(
             "in3110_instapy.cython_filters",
             ["in3110_instapy/cython_filters.py"],
-            # enable profiling
-            define_macros=[
-                ("CYTHON_TRACE", "1"),
-                ("CYTHON_TRACE_NOGIL", "1"),
-            ],
+            define_macros=define_macros,
+            extra_compile_args=["-O3"] * (sys.platform != "win32") + openmp_args[0],
+            extra_link_args=openmp_args[1],
         ),
     ]
-    cython_directives = {
-        "language_level": 3,
-        # enable profiling
-        "binding": True,
-        "profile": True,
-        "linetrace": True,
-        # you may want to add some compiler directives here
-        # to optimize compilation
-    }
     ext_modules = cythonize(
         extensions,
         compiler_directives=cython_directives,
-        annotate=True,
+        annotate=cython_profile,
     )
 else:
     ext_modules = []
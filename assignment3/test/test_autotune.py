@@ -0,0 +1,55 @@
+import json
+
+import numpy.testing as nt
+import pytest
+from in3110_instapy import autotune, get_filter
+
+
+@pytest.fixture(autouse=True)
+def tuning_file(tmp_path, monkeypatch):
+    path = tmp_path / "tuning.json"
+    monkeypatch.setenv("INSTAPY_TUNING_FILE", str(path))
+    return path
+
+
+def test_auto(image, reference_gray, tuning_file):
+    filter_function = get_filter("color2gray", "auto")
+    nt.assert_allclose(filter_function(image), reference_gray, atol=1)
+
+    # the decision is saved
+    table = json.loads(tuning_file.read_text())
+    entry = table["color2gray"][autotune.size_class(image)]
+    assert entry["implementation"] in entry["times"]
+    assert "python" not in entry["times"]
+
+
+def test_no_retuning(image, tuning_file, monkeypatch):
+    get_filter("color2sepia", "auto")(image)
+
+    def fail(*args, **kwargs):
+        raise AssertionError("should not tune again")
+
+    monkeypatch.setattr(autotune, "tune", fail)
+    # a new filter reads the decision from the tuning file
+    get_filter("color2sepia", "auto")(image)
+
+
+def test_kwargs(image):
+    # only implementations accepting k are candidates
+    filter_function = get_filter("color2sepia", "auto")
+    filter_function(image, k=0.5)
+    table = autotune.load_tuning()
+    entry = table["color2sepia"][f"{autotune.size_class(image)}:k"]
+    assert "python" not in entry["times"]
+    assert {"numpy", "numba", "lut"} <= set(entry["times"])
+
+
+def test_size_class():
+    assert autotune.size_class(autotune.np.empty((512, 512, 3))) == "2^18"
+    assert autotune.size_class(autotune.np.empty((511, 512, 3))) == "2^17"
+
+
+def test_format_tuning(image):
+    assert "empty" in autotune.format_tuning()
+    get_filter("color2gray", "auto")(image)
+    assert "color2gray 2^" in autotune.format_tuning()
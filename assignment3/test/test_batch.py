@@ -0,0 +1,121 @@
+import numpy as np
+import numpy.testing as nt
+import pytest
+from in3110_instapy import io
+from in3110_instapy.batch import filter_files, filter_stack, find_images
+from in3110_instapy.cli import main
+from in3110_instapy.numpy_filters import numpy_color2gray, numpy_color2sepia
+
+
+@pytest.fixture
+def stack():
+    return np.stack([io.random_image(width=40, height=30) for _ in range(5)])
+
+
+@pytest.mark.parametrize("processes", [1, 2])
+def test_filter_stack(stack, processes):
+    filtered = filter_stack(stack, "color2sepia", "numpy", processes=processes)
+    assert filtered.shape == stack.shape
+    for image, expected in zip(filtered, stack):
+        nt.assert_array_equal(image, numpy_color2sepia(expected))
+
+
+def test_filter_stack_shape(image):
+    with pytest.raises(ValueError):
+        filter_stack(image)
+
+
+@pytest.fixture
+def image_dir(tmp_path, stack):
+    in_dir = tmp_path / "in"
+    in_dir.mkdir()
+    for i, image in enumerate(stack):
+        io.write_image(image, in_dir / f"image{i}.png")
+    (in_dir / "notes.txt").write_text("not an image")
+    return in_dir
+
+
+def test_find_images(image_dir):
+    files = find_images([image_dir])
+    assert [f.name for f in files] == [f"image{i}.png" for i in range(5)]
+    assert find_images([str(image_dir / "image[12].png")]) == files[1:3]
+    with pytest.raises(FileNotFoundError):
+        find_images([str(image_dir / "*.jpg")])
+
+
+@pytest.mark.parametrize("processes", [1, 2])
+def test_filter_files(tmp_path, image_dir, processes):
+    out_dir = tmp_path / "out"
+    stats = filter_files([image_dir], out_dir, "color2gray", "numpy", processes=processes)
+    assert stats["images"] == 5
+    assert stats["images_per_second"] > 0
+    for file in find_images([image_dir]):
+        nt.assert_array_equal(io.read_image(out_dir / file.name), numpy_color2gray(io.read_image(file)))
+
+
+def test_filter_files_overwrite(tmp_path, image_dir):
+    other_dir = tmp_path / "other"
+    other_dir.mkdir()
+    (image_dir / "image0.png").rename(other_dir / "image1.png")
+    before = (image_dir / "image1.png").read_bytes()
+    # two inputs named image1.png
+    with pytest.raises(ValueError, match="image1.png"):
+        filter_files([image_dir, other_dir], tmp_path / "out", processes=1)
+    # writing to the input directory
+    with pytest.raises(ValueError, match="overwrite"):
+        filter_files([image_dir], image_dir, processes=1)
+    assert (image_dir / "image1.png").read_bytes() == before
+    assert not (tmp_path / "out").exists()
+    # the same file twice is fine
+    stats = filter_files([image_dir, image_dir / "image1.png"], tmp_path / "out", processes=1)
+    assert stats["images"] == 4
+
+
+def test_cli_batch(tmp_path, image_dir, capsys):
+    out_dir = tmp_path / "out"
+    main([str(image_dir), "-O", str(out_dir), "-i", "numpy", "-j", "1"])
+    assert len(list(out_dir.iterdir())) == 5
+    assert "images/s" in capsys.readouterr().out
+
+
+@pytest.mark.parametrize(
+    "options",
+    [["-o", "x.png"], ["-r"], ["--profile", "cprofile"], ["-i", "numba_parallel", "--numba-threads", "1"]],
+)
+def test_cli_batch_options(tmp_path, image_dir, options):
+    # options that only work on a single image are refused, not ignored
+    with pytest.raises(SystemExit):
+        main([str(image_dir), "-O", str(tmp_path / "out"), "-j", "1", *options])
+    assert not (tmp_path / "out").exists()
+
+
+@pytest.mark.parametrize("processes", [1, 2])
+def test_cli_single_channel(tmp_path, image_dir, processes):
+    out_dir = tmp_path / "out"
+    main([str(image_dir), "-O", str(out_dir), "-i", "numba", "-j", str(processes), "--single-channel"])
+    for file in find_images([image_dir]):
+        gray = io.read_image(out_dir / file.name)
+        assert gray.ndim == 2
+        nt.assert_array_equal(gray, numpy_color2gray(io.read_image(file))[:, :, 0])
+
+    # a single image, in row bands
+    out_file = tmp_path / "gray.png"
+    main([str(image_dir / "image0.png"), "-o", str(out_file), "-i", "numpy", "-j", "2", "--single-channel"])
+    assert io.read_image(out_file).shape == io.read_image(image_dir / "image0.png").shape[:2]
+
+    with pytest.raises(SystemExit):
+        main([str(image_dir), "-O", str(out_dir), "-se", "--single-channel"])
+
+
+def test_cli_arrays(tmp_path, image_dir):
+    in_file = tmp_path / "image.npy"
+    image = io.read_image(image_dir / "image0.png")
+    io.write_image(image, in_file)
+    out_file = tmp_path / "gray.raw"
+    main([str(in_file), "-o", str(out_file), "-i", "numba"])
+    nt.assert_array_equal(io.read_image(out_file), numpy_color2gray(image))
+
+    # a directory of arrays
+    out_dir = tmp_path / "out"
+    main([str(tmp_path), "-O", str(out_dir), "-i", "numpy", "-j", "1"])
+    assert sorted(f.name for f in out_dir.iterdir()) == ["gray.raw", "image.npy"]
@@ -0,0 +1,86 @@
+import os
+
+import numpy.testing as nt
+import pytest
+from in3110_instapy import io
+from in3110_instapy.batch import filter_files
+from in3110_instapy.cache import ResultCache
+from in3110_instapy.cli import main
+
+
+@pytest.fixture
+def source(tmp_path):
+    filename = tmp_path / "source.png"
+    io.write_image(io.random_image(width=40, height=30), filename)
+    return filename
+
+
+def test_key(tmp_path, source):
+    cache = ResultCache(tmp_path / "cache")
+    key = cache.key(source, "out.png", "color2sepia", "numpy")
+    assert key.endswith(".png")
+    assert cache.key(source, "other.png", "color2sepia", "numpy") == key
+    assert cache.key(source, "out.jpg", "color2sepia", "numpy") != key
+    assert cache.key(source, "out.png", "color2sepia", "numpy", k=0.5) != key
+    assert cache.key(source, "out.png", "color2sepia", "numpy", scale=0.5) != key
+    assert cache.key(source, "out.png", "color2gray", "numpy") != key
+    # the key depends on the content, not the name
+    copy = tmp_path / "copy.png"
+    copy.write_bytes(source.read_bytes())
+    assert cache.key(copy, "out.png", "color2sepia", "numpy") == key
+
+
+def test_get_put(tmp_path, source):
+    cache = ResultCache(tmp_path / "cache")
+    out = tmp_path / "out.png"
+    assert not cache.get("key.png", out)
+    cache.put("key.png", source)
+    assert cache.get("key.png", out)
+    assert out.read_bytes() == source.read_bytes()
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert "1 hits, 1 misses" in cache.format_stats()
+
+
+def test_evict(tmp_path, source):
+    size = source.stat().st_size
+    cache = ResultCache(tmp_path / "cache", max_bytes=2 * size)
+    cache.put("a.png", source)
+    cache.put("b.png", source)
+    # make a the most recently used
+    os.utime(cache.directory / "b.png", (0, 0))
+    cache.put("c.png", source)
+    assert sorted(p.name for p in cache.directory.iterdir()) == ["a.png", "c.png"]
+    assert cache.size() == 2 * size
+
+
+def test_put_again(tmp_path, source):
+    size = source.stat().st_size
+    cache = ResultCache(tmp_path / "cache", max_bytes=10 * size)
+    cache.put("b.png", source)
+    for _ in range(3):
+        cache.put("a.png", source)
+        # replacing an output doesn't count it twice
+        assert cache.size() == 2 * size
+
+
+def test_filter_files_cached(tmp_path, source):
+    cache = ResultCache(tmp_path / "cache")
+    stats = filter_files([source], tmp_path / "out1", "color2sepia", "numpy", processes=1, cache=cache, k=0.5)
+    assert stats["cached"] == 0
+    stats = filter_files([source], tmp_path / "out2", "color2sepia", "numpy", processes=1, cache=cache, k=0.5)
+    assert (stats["images"], stats["cached"]) == (1, 1)
+    assert (cache.hits, cache.misses) == (1, 1)
+    nt.assert_array_equal(io.read_image(tmp_path / "out2" / "source.png"), io.read_image(tmp_path / "out1" / "source.png"))
+
+
+def test_cli_cache(tmp_path, source, capsys):
+    args = ["-i", "numpy", "--cache", str(tmp_path / "cache")]
+    main([str(source), "-o", str(tmp_path / "out1.png")] + args)
+    assert "0 hits, 1 misses" in capsys.readouterr().out
+    main([str(source), "-o", str(tmp_path / "out2.png")] + args)
+    assert "1 hits, 0 misses" in capsys.readouterr().out
+    assert (tmp_path / "out2.png").read_bytes() == (tmp_path / "out1.png").read_bytes()
+    main([str(source), "-O", str(tmp_path / "out"), "-j", "1"] + args)
+    assert "1 hits, 0 misses" in capsys.readouterr().out
+    with pytest.raises(SystemExit):
+        main([str(source), "-r"] + args)
@@ -0,0 +1,73 @@
+import numpy as np
+import numpy.testing as nt
+import pytest
+from in3110_instapy import io
+from in3110_instapy.color import (
+    GRAY_MATRIX,
+    IMPLEMENTATIONS,
+    as_affine,
+    color_transform,
+    compose,
+    contrast_matrix,
+    invert_matrix,
+    preset,
+    saturation_matrix,
+    sepia_matrix,
+    stays_in_range,
+)
+from in3110_instapy.numpy_filters import numpy_color2gray, numpy_color2sepia
+
+
+def reference_transform(image, matrix):
+    """Straightforward float64 version, to compare with"""
+    matrix = as_affine(matrix)
+    transformed = image.astype(np.float64) @ matrix[:, :3].T + matrix[:, 3]
+    return np.clip(transformed, 0, 255).astype(np.uint8)
+
+
+@pytest.mark.parametrize("implementation", IMPLEMENTATIONS)
+@pytest.mark.parametrize(
+    "matrix",
+    [GRAY_MATRIX, sepia_matrix(0.5), saturation_matrix(1.8), contrast_matrix(1.5), invert_matrix()],
+    ids=["gray", "sepia", "saturation", "contrast", "invert"],
+)
+def test_color_transform(image, implementation, matrix):
+    transform = color_transform(matrix, implementation)
+    expected = reference_transform(image, matrix)
+    nt.assert_allclose(transform(image), expected, atol=1)
+    # in place
+    copy = image.copy()
+    assert transform(copy, out=copy) is copy
+    nt.assert_allclose(copy, expected, atol=1)
+
+
+def test_presets(image):
+    # (numpy_color2gray adds the weighted channels in another order)
+    nt.assert_allclose(preset("gray", "numpy")(image), numpy_color2gray(image), atol=1)
+    nt.assert_array_equal(preset("sepia", "numpy", k=0.5)(image), numpy_color2sepia(image, k=0.5))
+    nt.assert_array_equal(preset("invert", "numba")(image), 255 - image)
+    nt.assert_array_equal(preset("saturation", "numpy", s=1)(image), image)
+    with pytest.raises(ValueError):
+        preset("vintage")
+    with pytest.raises(ValueError):
+        preset("sepia", k=2)
+
+
+def test_compose():
+    tone = np.diag([0.5, 1.0, 1.0])
+    composed = compose(tone, invert_matrix())
+    pixel = np.array([100.0, 50.0, 0.0, 1.0])
+    nt.assert_allclose(composed @ pixel, [205, 205, 255])
+    assert stays_in_range(GRAY_MATRIX)
+    assert stays_in_range(invert_matrix())
+    assert not stays_in_range(sepia_matrix())
+    assert not stays_in_range(contrast_matrix(2))
+
+
+def test_invalid():
+    with pytest.raises(ValueError):
+        as_affine(np.eye(4))
+    with pytest.raises(ValueError):
+        color_transform(GRAY_MATRIX, "python")
+    with pytest.raises(ValueError):
+        color_transform(np.full((3, 3), 1e6), "lut")(io.random_image(2, 2))
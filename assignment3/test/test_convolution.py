@@ -0,0 +1,89 @@
+import numpy as np
+import numpy.testing as nt
+import pytest
+from in3110_instapy import convolution, get_filter, io
+from in3110_instapy.cli import main
+
+
+@pytest.fixture
+def small():
+    return io.random_image(width=37, height=23)
+
+
+@pytest.mark.parametrize("method", ["separable", "fft"])
+def test_methods_agree(small, method):
+    row = convolution.gaussian_kernel(1.5)
+    column = np.array([1.0, 2.0, 1.0])
+    expected = convolution.correlate(small, np.outer(column, row), method="naive")
+    nt.assert_allclose(convolution.correlate(small, (column, row), method=method), expected, atol=1e-9)
+
+
+def test_box_sums(small):
+    expected = convolution.correlate(small, np.ones((7, 7)), method="naive")
+    nt.assert_array_equal(convolution.box_sums(small, 3), expected)
+
+
+def test_separate():
+    column, row = convolution.separate(np.outer([1, 2, 1], [1, 0, -1]))
+    nt.assert_allclose(np.outer(column, row), np.outer([1, 2, 1], [1, 0, -1]))
+    assert convolution.separate(convolution.sharpen_kernel()) is None
+
+
+def test_convolve(small):
+    kernel = np.zeros((3, 3))
+    kernel[1, 0] = 1
+    # correlation picks the pixel to the left
+    correlated = convolution.to_image(convolution.correlate(small, kernel))
+    nt.assert_array_equal(correlated[:, 1:], small[:, :-1])
+    # convolution flips the kernel, and picks the pixel to the right
+    convolved = convolution.convolve(small, kernel)
+    nt.assert_array_equal(convolved[:, :-1], small[:, 1:])
+
+
+def test_invalid(small):
+    with pytest.raises(ValueError):
+        convolution.correlate(small, np.ones((2, 2)))
+    with pytest.raises(ValueError):
+        convolution.correlate(small, convolution.sharpen_kernel(), method="separable")
+    with pytest.raises(ValueError):
+        convolution.correlate(small, np.ones((3, 3)), method="winograd")
+    with pytest.raises(ValueError):
+        convolution.gaussian_kernel(0)
+
+
+@pytest.mark.parametrize("filter", ["blur", "box_blur", "sharpen", "edges"])
+def test_backends_agree(small, filter):
+    numpy_filter = get_filter(filter, "numpy")
+    numba_filter = get_filter(filter, "numba")
+    expected = numpy_filter(small)
+    assert expected.shape == small.shape
+    assert expected.dtype == np.uint8
+    # (rounding of x.5 may differ between methods)
+    nt.assert_allclose(numba_filter(small), expected, atol=1)
+    # in place
+    copy = small.copy()
+    assert numba_filter(copy, out=copy) is copy
+    nt.assert_allclose(copy, expected, atol=1)
+
+
+@pytest.mark.parametrize("implementation", ["numpy", "numba"])
+def test_constant(implementation):
+    image = np.full((20, 30, 3), 100, dtype=np.uint8)
+    for filter in ["blur", "box_blur", "sharpen"]:
+        nt.assert_array_equal(get_filter(filter, implementation)(image), image)
+    nt.assert_array_equal(get_filter("edges", implementation)(image), 0)
+    # large kernels switch to the FFT
+    nt.assert_array_equal(get_filter("blur", implementation)(image, sigma=10), image)
+    nt.assert_array_equal(get_filter("box_blur", implementation)(image, radius=15), image)
+
+
+def test_cli_blur(tmp_path, small):
+    source = tmp_path / "source.png"
+    io.write_image(small, source)
+    out = tmp_path / "blurred.png"
+    main([str(source), "--blur", "-i", "numba", "-o", str(out)])
+    nt.assert_allclose(io.read_image(out), get_filter("blur", "numpy")(small), atol=1)
+    with pytest.raises(SystemExit):
+        main([str(source), "--edges", "-i", "python", "-o", str(out)])
+    with pytest.raises(SystemExit):
+        main([str(source), "--sharpen", "-i", "numpy", "-t", "8", "-o", str(out)])
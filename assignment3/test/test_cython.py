@@ -1,10 +1,42 @@
+import numpy as np
 import numpy.testing as nt
-from in3110_instapy.cython_filters import cython_color2gray, cython_color2sepia
+import pytest
+from in3110_instapy.color import sepia_matrix
+from in3110_instapy.cython_filters import cython_color2gray, cython_color2sepia, cython_color_transform
+from in3110_instapy.numpy_filters import numpy_color2sepia
 
 
 def test_color2gray(image, reference_gray):
-    ...
+    gray_image = cython_color2gray(image)
+
+    assert gray_image.shape == image.shape
+    assert gray_image.dtype == np.uint8
+
+    nt.assert_allclose(gray_image, reference_gray)
 
 
 def test_color2sepia(image, reference_sepia):
-    ...
+    sepia_image = cython_color2sepia(image)
+
+    assert sepia_image.shape == image.shape
+    assert sepia_image.dtype == np.uint8
+
+    nt.assert_allclose(sepia_image, reference_sepia)
+
+
+def test_readonly(image, reference_sepia):
+    # const memoryviews accept read-only arrays
+    image.flags.writeable = False
+    nt.assert_allclose(cython_color2sepia(image), reference_sepia)
+
+
+def test_color_transform_kernel(image):
+    # the filters apply their matrix with cython_color_transform, which gives sepia k
+    for k in (0, 0.5):
+        nt.assert_allclose(cython_color2sepia(image, k=k), numpy_color2sepia(image, k=k), atol=1)
+    # and a single gray channel
+    gray = np.empty(image.shape[:2], dtype=np.uint8)
+    assert cython_color2gray(image, out=gray) is gray
+    nt.assert_array_equal(gray, cython_color2gray(image)[..., 0])
+    with pytest.raises(ValueError):
+        cython_color_transform(image, sepia_matrix(0.5), out=gray)
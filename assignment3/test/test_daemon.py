@@ -0,0 +1,104 @@
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import shared_memory
+from pathlib import Path
+
+import numpy as np
+import numpy.testing as nt
+import pytest
+from in3110_instapy import client, get_filter, io
+
+test_dir = Path(__file__).absolute().parent
+
+
+@pytest.fixture(scope="module")
+def socket_path(tmp_path_factory):
+    """Run a daemon in another process, like it would be used"""
+    path = str(tmp_path_factory.mktemp("daemon") / "instapy.sock")
+    process = subprocess.Popen([sys.executable, "-m", "in3110_instapy.daemon", "--socket", path, "-i", "numba"])
+    deadline = time.monotonic() + 60
+    while True:
+        try:
+            client.request({"op": "ping"}, path)
+            break
+        except OSError:
+            if process.poll() is not None or time.monotonic() > deadline:
+                process.kill()
+                raise
+            time.sleep(0.1)
+    yield path
+    client.request({"op": "stop"}, path)
+    process.wait(timeout=10)
+    assert not Path(path).exists()
+
+
+def test_ping(socket_path):
+    reply = client.request({"op": "ping"}, socket_path)
+    assert reply["warm"] == ["numba_color2gray", "numba_color2sepia"]
+
+
+def test_filter_file(socket_path, tmp_path):
+    out_file = tmp_path / "sepia.png"
+    # numpy isn't warm, so it is imported by the first request
+    reply = client.filter_file(test_dir / "rain.jpg", out_file, "color2sepia", "numpy", socket_path, kwargs={"k": 0.5})
+    assert reply["seconds"] > 0
+    expected = get_filter("color2sepia", "numpy")(io.read_image(test_dir / "rain.jpg"), k=0.5)
+    nt.assert_array_equal(io.read_image(out_file), expected)
+
+
+def test_filter_shared(socket_path):
+    image = io.random_image(width=40, height=30)
+    shm = shared_memory.SharedMemory(create=True, size=image.nbytes)
+    shared = np.ndarray(image.shape, dtype=np.uint8, buffer=shm.buf)
+    try:
+        shared[...] = image
+        client.filter_shared(shm.name, image.shape, "color2gray", "numba", socket_path=socket_path)
+        nt.assert_array_equal(shared, get_filter("color2gray", "numba")(image))
+    finally:
+        del shared
+        shm.close()
+        shm.unlink()
+
+
+def test_errors(socket_path, tmp_path):
+    with pytest.raises(client.DaemonError, match="FileNotFoundError"):
+        client.filter_file(tmp_path / "missing.png", tmp_path / "out.png", socket_path=socket_path)
+    with pytest.raises(client.DaemonError):
+        client.request({"op": "nothing"}, socket_path)
+    # the daemon keeps running
+    assert client.request({"op": "ping"}, socket_path)["ok"]
+
+
+def test_client_main(socket_path, tmp_path, capsys):
+    out_file = tmp_path / "gray.png"
+    assert client.main([str(test_dir / "rain.jpg"), "-o", str(out_file), "--socket", socket_path]) == 0
+    assert out_file.exists()
+    assert client.main(["--ping", "--socket", socket_path]) == 0
+    assert "is running" in capsys.readouterr().out
+    assert client.main(["--ping", "--socket", str(tmp_path / "nothing.sock")]) == 1
+
+
+def test_numba_parallel_threads(socket_path):
+    # requests on several connections at once take turns with numba's thread pool
+    image = io.random_image(width=200, height=150)
+    blocks = [shared_memory.SharedMemory(create=True, size=image.nbytes) for _ in range(4)]
+    try:
+        for shm in blocks:
+            np.ndarray(image.shape, dtype=np.uint8, buffer=shm.buf)[...] = image
+        with ThreadPoolExecutor(len(blocks)) as pool:
+            replies = list(
+                pool.map(
+                    lambda shm: client.filter_shared(shm.name, image.shape, "color2sepia", "numba_parallel", socket_path=socket_path),
+                    blocks,
+                )
+            )
+        assert all(reply["ok"] for reply in replies)
+        expected = get_filter("color2sepia", "numba_parallel")(image)
+        for shm in blocks:
+            nt.assert_array_equal(np.ndarray(image.shape, dtype=np.uint8, buffer=shm.buf), expected)
+    finally:
+        for shm in blocks:
+            shm.close()
+            shm.unlink()
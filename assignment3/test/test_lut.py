@@ -0,0 +1,68 @@
+import numpy as np
+import numpy.testing as nt
+import pytest
+from in3110_instapy import lut_filters
+from in3110_instapy.color import saturation_matrix
+from in3110_instapy.lut_filters import color_tables, lut_color2gray, lut_color2sepia, lut_color_transform, sepia_tables
+from in3110_instapy.numpy_filters import numpy_color2gray, numpy_color2sepia, numpy_color_transform
+
+
+def test_color2gray(image, reference_gray):
+    gray_image = lut_color2gray(image)
+
+    assert gray_image.shape == image.shape
+    assert gray_image.dtype == np.uint8
+
+    nt.assert_allclose(gray_image, reference_gray, atol=1)
+
+
+def test_color2sepia(image, reference_sepia):
+    sepia_image = lut_color2sepia(image)
+
+    assert sepia_image.shape == image.shape
+    assert sepia_image.dtype == np.uint8
+
+    nt.assert_allclose(sepia_image, reference_sepia, atol=1)
+
+
+def test_all_colors():
+    # every possible value in every channel
+    values = np.arange(256, dtype=np.uint8)
+    image = np.stack(np.meshgrid(values, values[::-1], values[::3]), axis=-1).reshape(256, -1, 3)
+    nt.assert_allclose(lut_color2sepia(image), numpy_color2sepia(image), atol=1)
+
+
+@pytest.mark.parametrize("k", [0, 0.25, 0.5, 1])
+def test_color2sepia_k(image, k):
+    sepia_image = lut_color2sepia(image, k=k)
+    nt.assert_allclose(sepia_image, numpy_color2sepia(image, k=k), atol=1)
+    # tables are computed once per k
+    assert sepia_tables(k) is sepia_tables(k)
+
+
+def test_invalid_k(image):
+    with pytest.raises(ValueError):
+        lut_color2sepia(image, k=2)
+
+
+@pytest.mark.parametrize("block_bytes", [1, 1000, 2**18])
+def test_blocks(image, monkeypatch, block_bytes):
+    monkeypatch.setattr(lut_filters, "BLOCK_BYTES", block_bytes)
+    # sepia packs its three channels in one int64, saturation has negative terms
+    assert lut_filters._pack_tables(sepia_tables(0.5)) is not None
+    assert lut_filters._pack_tables(color_tables(saturation_matrix(1.8))) is None
+    for filter_function, expected in [
+        (lut_color2sepia, numpy_color2sepia(image)),
+        (lambda image, out: lut_color_transform(image, saturation_matrix(1.8), out=out), numpy_color_transform(image, saturation_matrix(1.8))),
+    ]:
+        nt.assert_allclose(filter_function(image, out=None), expected, atol=1)
+        # in place
+        copy = image.copy()
+        assert filter_function(copy, out=copy) is copy
+        nt.assert_allclose(copy, expected, atol=1)
+
+    gray = np.empty(image.shape[:2], dtype=np.uint8)
+    assert lut_color2gray(image, out=gray) is gray
+    nt.assert_allclose(gray, numpy_color2gray(image)[..., 0], atol=1)
+    with pytest.raises(ValueError):
+        lut_color2sepia(image, out=gray)
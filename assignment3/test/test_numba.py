@@ -1,7 +1,10 @@
 import random
 import numpy as np
 import numpy.testing as nt
-from in3110_instapy.numba_filters import numba_color2gray, numba_color2sepia
+import pytest
+from in3110_instapy.color import as_affine
+from in3110_instapy.numba_filters import numba_color2gray, numba_color2sepia, numba_color_transform
+from in3110_instapy.numpy_filters import numpy_color_transform
 
 
 def test_color2gray(image, reference_gray):
@@ -13,8 +16,8 @@ def test_color2gray(image, reference_gray):
     nt.assert_allclose(gray_image, reference_gray)
 
     for _ in range(3):
-        row = random.randint(0, image.shape[0])
-        col = random.randint(0, image.shape[1])
+        row = random.randint(0, image.shape[0] - 1)
+        col = random.randint(0, image.shape[1] - 1)
         
         r, g, b = image[row, col]
         grey_value = int(0.21 * r + 0.72 * g + 0.07 * b)
@@ -36,8 +39,8 @@ def test_color2sepia(image, reference_sepia):
     ]
     
     for _ in range(3):
-        row = random.randint(0, image.shape[0])
-        col = random.randint(0, image.shape[1])
+        row = random.randint(0, image.shape[0] - 1)
+        col = random.randint(0, image.shape[1] - 1)
         
         r, g, b = image[row, col]
         sepia_red = min(255, int(r*sepia_matrix[0][0] + g*sepia_matrix[0][1] + b*sepia_matrix[0][2]))
@@ -45,4 +48,37 @@ def test_color2sepia(image, reference_sepia):
         sepia_blue = min(255, int(r*sepia_matrix[2][0] + g*sepia_matrix[2][1] + b*sepia_matrix[2][2]))
         expected_sepia_value = (sepia_red, sepia_green, sepia_blue)
         assert np.all(sepia_image[row, col] == expected_sepia_value)
-    
\ No newline at end of file
+    
+
+def test_precompile():
+    from in3110_instapy import numba_filters
+
+    numba_filters.precompile()
+    # compiled with and without out
+    assert len(numba_color2gray.signatures) >= 2
+    assert len(numba_color2sepia.signatures) >= 2
+
+
+def test_color_transform_kernel(image):
+    from in3110_instapy.color import sepia_matrix
+    from in3110_instapy.numpy_filters import numpy_color2sepia
+
+    # the filters apply their matrix with numba_color_transform, which gives sepia k
+    for k in (0, 0.5):
+        nt.assert_allclose(numba_color2sepia(image, k=k), numpy_color2sepia(image, k=k), atol=1)
+    with pytest.raises(ValueError):
+        numba_color2sepia(image, k=2)
+    # and a single gray channel
+    gray = np.empty(image.shape[:2], dtype=np.uint8)
+    assert numba_color2gray(image, out=gray) is gray
+    nt.assert_array_equal(gray, numba_color2gray(image)[..., 0])
+    with pytest.raises(ValueError):
+        numba_color_transform(image, as_affine(sepia_matrix(0.5)), out=gray)
+
+
+def test_color_transform_3x3(image):
+    # a 3x3 matrix has no offsets, like in the other backends
+    matrix = np.array([[1, 0, 0], [50, 0, 0], [0, 0, 1]])
+    pixel = np.full((1, 1, 3), 100, dtype=np.uint8)
+    nt.assert_array_equal(numba_color_transform(pixel, matrix), [[[100, 255, 100]]])
+    nt.assert_array_equal(numba_color_transform(image, matrix), numpy_color_transform(image, matrix))
@@ -0,0 +1,76 @@
+import random
+import numpy as np
+import pytest
+import numpy.testing as nt
+from in3110_instapy.numba_parallel_filters import (
+    numba_parallel_color2gray,
+    numba_parallel_color2sepia,
+    numba_parallel_color_transform,
+)
+from in3110_instapy.numpy_filters import numpy_color_transform
+
+
+def test_color2gray(image, reference_gray):
+    gray_image = numba_parallel_color2gray(image)
+    
+    assert gray_image.shape == image.shape
+    assert gray_image.dtype == np.uint8
+    
+    nt.assert_allclose(gray_image, reference_gray)
+
+    for _ in range(3):
+        row = random.randint(0, image.shape[0] - 1)
+        col = random.randint(0, image.shape[1] - 1)
+        
+        r, g, b = image[row, col]
+        grey_value = int(0.21 * r + 0.72 * g + 0.07 * b)
+        assert np.all(gray_image[row, col] == grey_value)
+    
+
+def test_color2sepia(image, reference_sepia):
+    sepia_image = numba_parallel_color2sepia(image)
+    
+    assert sepia_image.shape == image.shape
+    assert sepia_image.dtype == np.uint8
+    
+    nt.assert_allclose(sepia_image, reference_sepia)
+
+    sepia_matrix = [
+        [0.393, 0.769, 0.189],
+        [0.349, 0.686, 0.168],
+        [0.272, 0.534, 0.131],
+    ]
+    
+    for _ in range(3):
+        row = random.randint(0, image.shape[0] - 1)
+        col = random.randint(0, image.shape[1] - 1)
+        
+        r, g, b = image[row, col]
+        sepia_red = min(255, int(r*sepia_matrix[0][0] + g*sepia_matrix[0][1] + b*sepia_matrix[0][2]))
+        sepia_green = min(255, int(r*sepia_matrix[1][0] + g*sepia_matrix[1][1] + b*sepia_matrix[1][2]))
+        sepia_blue = min(255, int(r*sepia_matrix[2][0] + g*sepia_matrix[2][1] + b*sepia_matrix[2][2]))
+        expected_sepia_value = (sepia_red, sepia_green, sepia_blue)
+        assert np.all(sepia_image[row, col] == expected_sepia_value)
+    
+
+def test_num_threads(image, reference_gray):
+    from in3110_instapy import numba_parallel_filters
+
+    previous = numba_parallel_filters.get_num_threads()
+    try:
+        numba_parallel_filters.set_num_threads(1)
+        assert numba_parallel_filters.get_num_threads() == 1
+        nt.assert_allclose(numba_parallel_color2gray(image), reference_gray)
+    finally:
+        numba_parallel_filters.set_num_threads(previous)
+
+    with pytest.raises(ValueError):
+        numba_parallel_filters.set_num_threads(0)
+
+
+def test_color_transform_3x3(image):
+    # a 3x3 matrix has no offsets, like in the other backends
+    matrix = np.array([[1, 0, 0], [50, 0, 0], [0, 0, 1]])
+    pixel = np.full((1, 1, 3), 100, dtype=np.uint8)
+    nt.assert_array_equal(numba_parallel_color_transform(pixel, matrix), [[[100, 255, 100]]])
+    nt.assert_array_equal(numba_parallel_color_transform(image, matrix), numpy_color_transform(image, matrix))
@@ -1,7 +1,9 @@
 import random
 import numpy as np
 import numpy.testing as nt
-from in3110_instapy.numpy_filters import numpy_color2gray, numpy_color2sepia
+import pytest
+from in3110_instapy.color import GRAY_MATRIX, sepia_matrix
+from in3110_instapy.numpy_filters import BLOCK_BYTES, numpy_color2gray, numpy_color2sepia, numpy_color_transform
 
 
 def test_color2gray(image, reference_gray):
@@ -13,8 +15,8 @@ def test_color2gray(image, reference_gray):
     nt.assert_allclose(gray_image, reference_gray)
     
     for _ in range(3):
-        row = random.randint(0, image.shape[0])
-        col = random.randint(0, image.shape[1])
+        row = random.randint(0, image.shape[0] - 1)
+        col = random.randint(0, image.shape[1] - 1)
         r, g, b = image[row, col]
         expected_gray_pixel = int(0.21 * r + 0.72 * g + 0.07 * b)
         assert np.all(gray_image[row, col] == expected_gray_pixel)
@@ -35,8 +37,8 @@ def test_color2sepia(image, reference_sepia):
     ]
     
     for _ in range(3):
-        row = random.randint(0, image.shape[0])
-        col = random.randint(0, image.shape[1])
+        row = random.randint(0, image.shape[0] - 1)
+        col = random.randint(0, image.shape[1] - 1)
 
         r, g, b = image[row, col]
         sepia_red = min(255, int(r*sepia_matrix[0][0] + g*sepia_matrix[0][1] + b*sepia_matrix[0][2]))
@@ -44,4 +46,36 @@ def test_color2sepia(image, reference_sepia):
         sepia_blue = min(255, int(r*sepia_matrix[2][0] + g*sepia_matrix[2][1] + b*sepia_matrix[2][2]))
         expected_sepia_value = (sepia_red, sepia_green, sepia_blue)
         assert np.all(sepia_image[row, col] == expected_sepia_value)
-        
\ No newline at end of file
+        
+
+def test_color2sepia_blocks(image):
+    expected = numpy_color2sepia(image, block_rows=image.shape[0])
+    for block_rows in [1, 7, image.shape[0] + 1]:
+        nt.assert_array_equal(numpy_color2sepia(image, block_rows=block_rows), expected)
+    # float32 rounds a few pixels differently
+    nt.assert_allclose(numpy_color2sepia(image, dtype=np.float32), expected, atol=1)
+    # in place
+    copy = image.copy()
+    numpy_color2sepia(copy, out=copy, block_rows=5)
+    nt.assert_array_equal(copy, expected)
+
+
+def test_color2sepia_empty():
+    for shape in [(10, 0, 3), (0, 10, 3)]:
+        image = np.empty(shape, dtype=np.uint8)
+        assert numpy_color2sepia(image).shape == shape
+
+
+def test_color2gray_allocations():
+    from in3110_instapy import io
+    from in3110_instapy.timing import allocations_one
+
+    image = io.random_image(width=1000, height=1000)
+    out = np.empty_like(image)
+    reference = numpy_color2gray(image, out=out).copy()
+    # only two float arrays for one block of rows (a whole-image one is 8 MB)
+    assert allocations_one(numpy_color2gray, image, out=out) < 3 * BLOCK_BYTES
+    for block_rows in [1, 7]:
+        nt.assert_array_equal(numpy_color_transform(image[:20], GRAY_MATRIX, block_rows=block_rows), reference[:20])
+    with pytest.raises(ValueError):
+        numpy_color_transform(image, sepia_matrix(), out=np.empty(image.shape[:2], dtype=np.uint8))
@@ -24,7 +24,7 @@ def test_import():
 )
 @pytest.mark.parametrize(
     "implementation",
-    ["python", "numpy", "numba"],
+    ["python", "numpy", "numba", "numba_parallel", "lut", "cython"],
 )
 def test_get_filter(filter_name, implementation):
     """Can we load our filter functions"""
@@ -42,3 +42,110 @@ def test_io():
     assert len(image.shape) == 3
     assert image.dtype == np.uint8
     assert image.shape[2] == 3
+
+
+@pytest.mark.parametrize(
+    "filter_name",
+    ["color2gray", "color2sepia"],
+)
+@pytest.mark.parametrize(
+    "implementation",
+    ["python", "numpy", "numba", "numba_parallel", "lut", "cython"],
+)
+def test_filter_out(filter_name, implementation):
+    """Can our filters write to a given output, or in place"""
+    import in3110_instapy
+    from in3110_instapy import io
+
+    filter_function = in3110_instapy.get_filter(filter_name, implementation)
+    image = io.random_image(width=40, height=30)
+    expected = filter_function(image)
+
+    out = np.zeros_like(image)
+    result = filter_function(image, out=out)
+    assert result is out
+    np.testing.assert_array_equal(out, expected)
+
+    # in place
+    filter_function(image, out=image)
+    np.testing.assert_array_equal(image, expected)
+
+
+@pytest.mark.parametrize("scale", [0.1, 0.5, 1, 1.5])
+def test_io_scaled(scale):
+    """Can we read a resized image"""
+    from PIL import Image
+    from in3110_instapy import io
+
+    filename = test_dir.joinpath("rain.jpg")
+    image = io.read_image_scaled(filename, scale)
+    full = Image.open(filename)
+    assert image.shape == (int(full.height * scale), int(full.width * scale), 3)
+    assert image.dtype == np.uint8
+    assert image.flags.c_contiguous
+
+    # close to resizing the fully decoded image
+    expected = np.asarray(full.resize((image.shape[1], image.shape[0])))
+    assert np.abs(image.astype(int) - expected).mean() < 3
+
+
+@pytest.mark.parametrize(
+    "implementation",
+    ["python", "numpy", "numba", "numba_parallel", "lut", "cython"],
+)
+def test_color2gray_single_channel(implementation):
+    """Can our gray filters write a single (H, W) channel"""
+    import in3110_instapy
+
+    filter_function = in3110_instapy.get_filter("color2gray", implementation)
+    image = np.random.randint(0, 255, size=(30, 40, 3), dtype=np.uint8)
+    expected = filter_function(image)
+
+    out = np.zeros(image.shape[:2], dtype=np.uint8)
+    result = filter_function(image, out=out)
+    assert result is out
+    np.testing.assert_array_equal(out, expected[:, :, 0])
+
+
+def test_write_single_channel(tmp_path):
+    """Are (H, W) arrays saved as single-channel images"""
+    from PIL import Image
+    from in3110_instapy import io
+
+    gray = np.random.randint(0, 255, size=(30, 40), dtype=np.uint8)
+    filename = tmp_path / "gray.png"
+    io.write_image(gray, filename)
+    assert Image.open(filename).mode == "L"
+    np.testing.assert_array_equal(io.read_image(filename), gray)
+
+
+@pytest.mark.parametrize("suffix", [".npy", ".raw"])
+def test_io_arrays(tmp_path, suffix):
+    """Can we write and memory-map .npy and .raw images"""
+    from in3110_instapy import io
+
+    image = io.random_image(width=40, height=30)
+    filename = tmp_path / f"image{suffix}"
+    io.write_image(image, filename)
+    mapped = io.read_image(filename)
+    assert isinstance(mapped, np.memmap)
+    assert not mapped.flags.writeable
+    np.testing.assert_array_equal(mapped, image)
+    assert io.image_size(filename) == (30, 40)
+    assert io.read_image_scaled(filename, 0.5).shape == (15, 20, 3)
+
+    # tile by tile, and single-channel
+    out_file = tmp_path / f"gray{suffix}"
+    tiles = io.read_image_tiles(filename, 16)
+    io.write_image_tiles(((window, tile[:, :, 0]) for window, tile in tiles), (30, 40), out_file)
+    np.testing.assert_array_equal(io.read_image(out_file), image[:, :, 0])
+
+
+def test_io_raw_header(tmp_path):
+    """Do we reject files that aren't raw images"""
+    from in3110_instapy import io
+
+    filename = tmp_path / "image.raw"
+    filename.write_bytes(b"not an image")
+    with pytest.raises(ValueError):
+        io.read_image(filename)
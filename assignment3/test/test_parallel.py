@@ -0,0 +1,89 @@
+from pathlib import Path
+
+import numpy as np
+import numpy.testing as nt
+import pytest
+from in3110_instapy import get_filter, io
+from in3110_instapy.cli import main
+from in3110_instapy.numpy_filters import numpy_color2sepia
+from in3110_instapy.parallel import SharedMemoryExecutor, ThreadBandExecutor, filter_bands, filter_bands_threaded
+from in3110_instapy.python_filters import python_color2gray
+
+test_dir = Path(__file__).absolute().parent
+
+
+def test_filter_bands(image, reference_gray):
+    filtered = filter_bands(image, "color2gray", "python", processes=2)
+    nt.assert_allclose(filtered, reference_gray, atol=1)
+
+
+@pytest.mark.parametrize("bands", [1, 3, 100])
+def test_executor(bands):
+    image = io.random_image(width=17, height=11)
+    out = np.empty_like(image)
+    with SharedMemoryExecutor(processes=2) as executor:
+        result = executor.filter(image, "color2sepia", "numpy", out=out, bands=bands, k=0.5)
+        assert result is out
+        nt.assert_array_equal(out, numpy_color2sepia(image, k=0.5))
+        # the workers are reused
+        nt.assert_array_equal(executor.filter(image, "color2gray", "python"), python_color2gray(image))
+
+
+def test_executor_errors(image):
+    with SharedMemoryExecutor(processes=1) as executor:
+        with pytest.raises(ValueError):
+            executor.filter(image, out=np.empty((1, 1, 3), dtype=np.uint8))
+        with pytest.raises(ValueError):
+            executor.filter(image, "color2sepia", "numpy", k=2)
+    with pytest.raises(ValueError):
+        SharedMemoryExecutor(processes=0)
+
+
+@pytest.mark.parametrize("implementation", ["python", "numpy", "numba", "lut", "cython"])
+def test_filter_bands_threaded(image, implementation):
+    expected = get_filter("color2sepia", implementation)(image)
+    nt.assert_array_equal(filter_bands_threaded(image, "color2sepia", implementation, threads=3), expected)
+
+
+def test_thread_executor(image):
+    with ThreadBandExecutor(threads=2) as executor:
+        # in place, and many more bands than threads
+        expected = numpy_color2sepia(image, k=0.5)
+        result = executor.filter(image, "color2sepia", "numpy", out=image, bands=50, k=0.5)
+        assert result is image
+        nt.assert_array_equal(image, expected)
+        # a single gray channel
+        gray = executor.filter(image, "color2gray", "numba", out=np.empty(image.shape[:2], dtype=np.uint8))
+        nt.assert_array_equal(gray, get_filter("color2gray", "numba")(image)[:, :, 0])
+
+        with pytest.raises(ValueError):
+            executor.filter(image, "color2gray", "numba_parallel")
+        with pytest.raises(ValueError):
+            executor.filter(image, out=np.empty((1, 1, 3), dtype=np.uint8))
+    with pytest.raises(ValueError):
+        ThreadBandExecutor(threads=0)
+
+
+def test_cli_jobs(tmp_path):
+    out = tmp_path / "gray.jpg"
+    main([str(test_dir / "rain.jpg"), "-o", str(out), "-i", "numpy", "-j", "2"])
+    assert out.exists()
+    with pytest.raises(SystemExit):
+        main([str(test_dir / "rain.jpg"), "-o", str(out), "-i", "numba_parallel", "-j", "2", "--numba-threads", "1"])
+
+
+def test_cli_threads(tmp_path):
+    out = tmp_path / "sepia.png"
+    main([str(test_dir / "rain.jpg"), "-o", str(out), "-se", "-i", "numba", "--threads", "2"])
+    nt.assert_array_equal(io.read_image(out), get_filter("color2sepia", "numba")(io.read_image(test_dir / "rain.jpg")))
+    with pytest.raises(SystemExit):
+        main([str(test_dir / "rain.jpg"), "-i", "numba_parallel", "--threads", "2"])
+
+
+@pytest.mark.parametrize("option", ["-j", "--threads", "--tile-size", "--numba-threads"])
+@pytest.mark.parametrize("value", ["0", "-2", "two"])
+def test_cli_counts(option, value, capsys):
+    # a usage error, not a traceback from inside the filters
+    with pytest.raises(SystemExit):
+        main([str(test_dir / "rain.jpg"), option, value])
+    assert "positive whole number" in capsys.readouterr().err
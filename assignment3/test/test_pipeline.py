@@ -0,0 +1,70 @@
+import numpy as np
+import numpy.testing as nt
+import pytest
+from in3110_instapy.numpy_filters import numpy_color2gray, numpy_color2sepia
+from in3110_instapy.pipeline import ColorMatrix, Pipeline, Scale
+
+
+def test_lazy(image):
+    pipeline = Pipeline().gray()
+    # recording returns a new pipeline, nothing is run
+    assert pipeline.sepia().operations != pipeline.operations
+    assert len(pipeline.operations) == 1
+
+
+def test_single(image, reference_gray, reference_sepia):
+    nt.assert_allclose(Pipeline().gray()(image), reference_gray)
+    nt.assert_allclose(Pipeline().sepia()(image), reference_sepia, atol=1)
+
+
+def test_fused_gray_sepia(image):
+    pipeline = Pipeline().gray().sepia()
+    stages = pipeline.stages
+    # gray never leaves [0, 255], so sepia can be fused with it
+    assert len(stages) == 1
+    assert isinstance(stages[0], ColorMatrix)
+
+    staged = numpy_color2sepia(numpy_color2gray(image))
+    # fused doesn't truncate the gray to uint8 in between,
+    # that truncation is scaled by up to 1.35 in the sepia step
+    nt.assert_allclose(pipeline(image), staged, atol=2)
+
+
+def test_unfusable(image):
+    pipeline = Pipeline().scale(0.5).gray().sepia().tone(red=0.5)
+    stages = pipeline.stages
+    # scale is its own stage, sepia clips so tone can't be fused with it
+    assert [type(stage) for stage in stages] == [Scale, ColorMatrix, ColorMatrix]
+    assert pipeline(image).shape == (image.shape[0] // 2, image.shape[1] // 2, 3)
+
+    # staged and fused clip at the same places
+    sepia = Pipeline().sepia()(image)
+    toned = Pipeline().tone(red=0.5)(sepia)
+    nt.assert_allclose(Pipeline().sepia().tone(red=0.5)(image), toned, atol=1)
+
+
+def test_out(image, reference_gray):
+    out = np.zeros_like(image)
+    assert Pipeline().gray()(image, out=out) is out
+    nt.assert_allclose(out, reference_gray)
+    # in place
+    Pipeline().gray()(image, out=image)
+    nt.assert_allclose(image, reference_gray)
+
+
+def test_invalid():
+    with pytest.raises(ValueError):
+        Pipeline().sepia(k=2)
+    with pytest.raises(ValueError):
+        Pipeline().color_matrix(np.eye(4))
+    with pytest.raises(ValueError):
+        Pipeline().scale(0)
+
+
+@pytest.mark.parametrize("implementation", ["numpy", "numba", "lut"])
+def test_implementation(image, implementation):
+    pipeline = Pipeline(implementation=implementation).saturation(0.5).contrast(1.2).hue_rotation(90)
+    assert all(op.implementation == implementation for op in pipeline.stages)
+    # the backends may truncate the first stage differently by 1,
+    # which the second stage scales by up to ~1.5
+    nt.assert_allclose(pipeline(image), Pipeline().saturation(0.5).contrast(1.2).hue_rotation(90)(image), atol=2)
@@ -0,0 +1,55 @@
+import pstats
+
+import pytest
+from in3110_instapy import get_filter, profiling
+
+
+def test_cprofile(tmp_path, image, capsys):
+    filter_function = get_filter("color2sepia", "numpy")
+    output = tmp_path / "numpy_color2sepia"
+    stats = profiling.profile_with_cprofile(filter_function, image, ncalls=2, output=output)
+    assert "numpy_color2sepia" in capsys.readouterr().out
+
+    # the saved statistics can be loaded again
+    loaded = pstats.Stats(f"{output}.pstats")
+    assert len(loaded.stats) == len(stats.stats)
+
+    lines = (tmp_path / "numpy_color2sepia.collapsed").read_text().splitlines()
+    assert lines
+    for line in lines:
+        stack, microseconds = line.rsplit(" ", 1)
+        assert int(microseconds) > 0
+    assert any("numpy_color2sepia" in line for line in lines)
+
+
+def test_line_profiler(tmp_path, image, capsys):
+    filter_function = get_filter("color2gray", "numpy")
+    profiling.profile_with_line_profiler(filter_function, image, ncalls=1, output=tmp_path / "gray")
+    assert "return numpy_color_transform(image, GRAY_MATRIX, out=out)" in capsys.readouterr().out
+    assert (tmp_path / "gray.lprof").exists()
+
+
+@pytest.fixture
+def instrumentation():
+    profiling.enable_instrumentation()
+    profiling.reset_instrumentation()
+    yield
+    profiling.enable_instrumentation(False)
+
+
+def test_instrumentation(image, instrumentation):
+    filter_function = get_filter("color2gray", "numpy")
+    for _ in range(3):
+        filter_function(image)
+
+    stats = profiling.filter_stats["numpy_color2gray"]
+    assert stats.calls == 3
+    assert stats.nbytes == 3 * image.nbytes
+    assert stats.seconds > 0
+    assert "numpy_color2gray: 3 calls" in profiling.format_instrumentation()
+
+
+def test_not_instrumented():
+    from in3110_instapy.numpy_filters import numpy_color2gray
+
+    assert get_filter("color2gray", "numpy") is numpy_color2gray
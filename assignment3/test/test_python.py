@@ -12,8 +12,8 @@ def test_color2gray(image):
     assert gray_image.dtype == np.uint8
 
     for _ in range(3):
-        row = random.randint(0, image.shape[0])
-        col = random.randint(0, image.shape[1])
+        row = random.randint(0, image.shape[0] - 1)
+        col = random.randint(0, image.shape[1] - 1)
         r, g, b = image[row, col]
         grey_value = int(0.21 * r + 0.72 * g + 0.07 * b)
         assert np.all(gray_image[row, col][0] == grey_value)
@@ -35,8 +35,8 @@ def test_color2sepia(image):
     ]
     
     for _ in range(3):
-        row = random.randint(0, image.shape[0])
-        col = random.randint(0, image.shape[1])
+        row = random.randint(0, image.shape[0] - 1)
+        col = random.randint(0, image.shape[1] - 1)
     
         r, g, b = image[row, col]
         sepia_red = min(255, int(r*sepia_matrix[0][0] + g*sepia_matrix[0][1] + b*sepia_matrix[0][2]))
@@ -0,0 +1,99 @@
+from pathlib import Path
+
+import numpy as np
+import numpy.testing as nt
+import pytest
+from in3110_instapy import get_filter, io
+from in3110_instapy.cli import main
+from in3110_instapy.roi import bounding_box, filter_region, rectangle
+
+test_dir = Path(__file__).absolute().parent
+
+
+@pytest.mark.parametrize("filter_name", ["color2gray", "color2sepia"])
+@pytest.mark.parametrize("implementation", ["python", "numpy", "numba", "numba_parallel", "lut", "cython"])
+def test_filter_rectangle(image, filter_name, implementation):
+    filter_function = get_filter(filter_name, implementation)
+    expected = image.copy()
+    expected[10:50, 20:100] = filter_function(image)[10:50, 20:100]
+
+    result = filter_region(filter_function, image, (10, 20, 40, 80))
+    nt.assert_array_equal(result, expected)
+    # in place, on a view of the image
+    assert filter_region(filter_function, image, (slice(10, 50), slice(20, 100)), out=image) is image
+    nt.assert_array_equal(image, expected)
+
+
+@pytest.mark.parametrize("implementation", ["python", "numpy", "numba", "lut", "cython"])
+def test_filter_mask(image, implementation):
+    filter_function = get_filter("color2sepia", implementation)
+    mask = np.zeros(image.shape[:2], dtype=np.uint8)
+    mask[30:40, 50:70] = 255
+    mask[100, 5] = 1
+    expected = image.copy()
+    expected[mask != 0] = filter_function(image)[mask != 0]
+
+    out = np.zeros_like(image)
+    assert filter_region(filter_function, image, mask, out=out) is out
+    nt.assert_array_equal(out, expected)
+    filter_region(filter_function, image, mask.astype(bool), out=image)
+    nt.assert_array_equal(image, expected)
+
+
+def test_filter_region_only_filters_region(image):
+    calls = []
+
+    def filter_function(image, out=None):
+        calls.append(image.shape)
+        return get_filter("color2gray", "numpy")(image, out=out)
+
+    filter_region(filter_function, image, (0, 0, 5, 6))
+    mask = np.zeros(image.shape[:2], dtype=bool)
+    mask[2:4, 7:10] = True
+    filter_region(filter_function, image, mask)
+    assert calls == [(5, 6, 3), (2, 3, 3)]
+    # nothing selected, nothing filtered
+    filter_region(filter_function, image, np.zeros(image.shape[:2], dtype=bool))
+    assert len(calls) == 2
+
+
+def test_helpers():
+    assert rectangle(1, 2, 3, 4) == (slice(1, 4), slice(2, 6))
+    with pytest.raises(ValueError):
+        rectangle(-1, 0, 1, 1)
+    mask = np.zeros((5, 5), dtype=bool)
+    assert bounding_box(mask) is None
+    mask[1, 3] = mask[2, 1] = True
+    assert bounding_box(mask) == (slice(1, 3), slice(1, 4))
+
+
+def test_filter_region_errors(image):
+    filter_function = get_filter("color2gray", "numpy")
+    with pytest.raises(ValueError):
+        filter_region(filter_function, image, np.ones((2, 2), dtype=bool))
+    with pytest.raises(ValueError):
+        filter_region(filter_function, image, (0, 0, 1, 1), out=np.empty((1, 1, 3), dtype=np.uint8))
+
+
+def test_cli_region(tmp_path):
+    image = io.read_image(test_dir / "rain.jpg")
+    sepia = get_filter("color2sepia", "numba")(image)
+
+    out_file = tmp_path / "region.png"
+    main([str(test_dir / "rain.jpg"), "-o", str(out_file), "-se", "-i", "numba", "--region", "10,20,30,40"])
+    expected = image.copy()
+    expected[10:40, 20:60] = sepia[10:40, 20:60]
+    nt.assert_array_equal(io.read_image(out_file), expected)
+
+    mask = np.zeros(image.shape[:2], dtype=np.uint8)
+    mask[50:60, 70:90] = 255
+    io.write_image(mask, tmp_path / "mask.png")
+    main([str(test_dir / "rain.jpg"), "-o", str(out_file), "-se", "-i", "numba", "--mask", str(tmp_path / "mask.png")])
+    expected = image.copy()
+    expected[50:60, 70:90] = sepia[50:60, 70:90]
+    nt.assert_array_equal(io.read_image(out_file), expected)
+
+    with pytest.raises(SystemExit):
+        main([str(test_dir / "rain.jpg"), "--region", "1,2,3"])
+    with pytest.raises(SystemExit):
+        main([str(test_dir / "rain.jpg"), "--region", "1,2,3,4", "-t", "64"])
@@ -0,0 +1,72 @@
+"""Import-time regression tests
+
+The CLI should only import the heavy dependencies
+(numpy, PIL, numba) when a filter actually needs them.
+"""
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+test_dir = Path(__file__).absolute().parent
+
+# budget for `import in3110_instapy.cli`, in microseconds
+# (it takes ~20ms, numpy alone is ~100ms)
+IMPORT_BUDGET = 100_000
+
+
+def import_times(*args) -> dict:
+    """Run python with -X importtime, and return {module: cumulative microseconds}"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", *args],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, module = line.split("|")
+        try:
+            times[module.strip()] = int(cumulative)
+        except ValueError:
+            # the header line
+            continue
+    return times
+
+
+def test_import_cli():
+    times = import_times("-c", "import in3110_instapy.cli")
+    for heavy in ("numpy", "PIL", "numba"):
+        assert heavy not in times
+    assert times["in3110_instapy.cli"] < IMPORT_BUDGET
+
+
+def test_help():
+    times = import_times("-m", "in3110_instapy", "--help")
+    for heavy in ("numpy", "PIL", "numba"):
+        assert heavy not in times
+
+
+@pytest.mark.parametrize("implementation", ["python", "numpy", "lut"])
+def test_no_numba(tmp_path, implementation):
+    """Only the selected backend is imported"""
+    script = f"""
+import sys
+from in3110_instapy.cli import main
+main([{str(test_dir.joinpath("rain.jpg"))!r}, "-i", {implementation!r}, "-sc", "0.1", "-o", {str(tmp_path / "out.png")!r}])
+print(" ".join(sys.modules))
+"""
+    result = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True, check=True)
+    modules = result.stdout.split()
+    assert f"in3110_instapy.{implementation}_filters" in modules
+    assert "numba" not in modules
+
+
+def test_import_client():
+    """The daemon client only needs the standard library"""
+    times = import_times("-c", "import in3110_instapy.client")
+    for heavy in ("numpy", "PIL", "numba"):
+        assert heavy not in times
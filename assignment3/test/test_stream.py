@@ -0,0 +1,117 @@
+from pathlib import Path
+
+import numpy as np
+import numpy.testing as nt
+import pytest
+from in3110_instapy import io
+from in3110_instapy.cli import main
+from in3110_instapy.numpy_filters import numpy_color2gray, numpy_color2sepia
+from in3110_instapy.stream import filter_file_stages, filter_frame_dir, filter_frames, format_stages, frame_number
+
+
+@pytest.fixture
+def frames():
+    return [io.random_image(width=40, height=30) for _ in range(6)]
+
+
+def test_filter_frames(frames):
+    filtered = [frame.copy() for frame in filter_frames(iter(frames), numpy_color2sepia, k=0.5)]
+    assert len(filtered) == len(frames)
+    for frame, expected in zip(filtered, frames):
+        nt.assert_array_equal(frame, numpy_color2sepia(expected, k=0.5))
+
+
+def test_filter_frames_reuses_buffers(frames):
+    outputs = [id(frame) for frame in filter_frames(frames, numpy_color2gray, buffers=2)]
+    assert len(set(outputs)) == 2
+    # a different size gets a new buffer
+    frames.append(io.random_image(width=20, height=10))
+    filtered = list(filter_frames(frames, numpy_color2gray))
+    assert filtered[-1].shape == (10, 20, 3)
+
+
+def test_filter_frames_error():
+    def broken():
+        yield io.random_image(width=4, height=4)
+        raise OSError("can't decode")
+
+    stream = filter_frames(broken(), numpy_color2gray)
+    next(stream)
+    with pytest.raises(OSError):
+        next(stream)
+
+
+def test_frame_number():
+    names = ["frame10.png", "frame2.png", "frame1.png"]
+    assert [p.name for p in sorted(map(Path, names), key=frame_number)] == ["frame1.png", "frame2.png", "frame10.png"]
+
+
+@pytest.fixture
+def frame_dir(tmp_path, frames):
+    in_dir = tmp_path / "frames"
+    in_dir.mkdir()
+    for i, frame in enumerate(frames):
+        io.write_image(frame, in_dir / f"frame{i}.png")
+    return in_dir
+
+
+def test_filter_frame_dir(tmp_path, frame_dir, frames):
+    out_dir = tmp_path / "out"
+    stats = filter_frame_dir(frame_dir, out_dir, numpy_color2gray, buffers=2)
+    assert stats["frames"] == len(frames)
+    assert stats["fps"] > 0
+    for i, frame in enumerate(frames):
+        nt.assert_array_equal(io.read_image(out_dir / f"frame{i}.png"), numpy_color2gray(frame))
+
+
+def test_cli_frames(tmp_path, frame_dir, capsys):
+    out_dir = tmp_path / "out"
+    main([str(frame_dir), "--frames", "-O", str(out_dir), "-i", "numpy", "-se"])
+    assert len(list(out_dir.iterdir())) == 6
+    assert "frames/s" in capsys.readouterr().out
+    with pytest.raises(SystemExit):
+        main([str(frame_dir), "--frames"])
+    with pytest.raises(SystemExit):
+        main([str(frame_dir), "--frames", "-O", str(out_dir), "-j", "2"])
+
+    # resized before filtering
+    main([str(frame_dir), "--frames", "-O", str(tmp_path / "small"), "-i", "numpy", "-sc", "0.5"])
+    frame = io.read_image(frame_dir / "frame0.png")
+    small = io.read_image(tmp_path / "small" / "frame0.png")
+    assert small.shape[:2] == (frame.shape[0] // 2, frame.shape[1] // 2)
+
+
+@pytest.mark.parametrize("queue_size", [1, 4])
+def test_filter_file_stages(tmp_path, frame_dir, frames, queue_size):
+    out_dir = tmp_path / "out"
+    out_dir.mkdir()
+    jobs = [(frame_dir / f"frame{i}.png", out_dir / f"frame{i}.png") for i in range(len(frames))]
+    stats = filter_file_stages(jobs, numpy_color2sepia, decoders=2, encoders=3, queue_size=queue_size, k=0.5)
+    assert stats["images"] == len(frames)
+    assert set(stats["stages"]) == {"decode", "filter", "encode"}
+    assert stats["stages"]["encode"]["threads"] == 3
+    assert all(stage["seconds"] > 0 for stage in stats["stages"].values())
+    assert stats["bottleneck"] in stats["stages"]
+    assert "bottleneck" in format_stages(stats)
+    for i, frame in enumerate(frames):
+        nt.assert_array_equal(io.read_image(out_dir / f"frame{i}.png"), numpy_color2sepia(frame, k=0.5))
+
+
+def test_filter_file_stages_error(tmp_path, frame_dir):
+    jobs = [(frame_dir / "frame0.png", tmp_path / "out0.png"), (frame_dir / "missing.png", tmp_path / "out1.png")]
+    with pytest.raises(FileNotFoundError):
+        filter_file_stages(jobs, numpy_color2gray)
+    # encoding errors too
+    jobs = [(frame_dir / "frame0.png", tmp_path / "missing" / "out0.png")]
+    with pytest.raises(FileNotFoundError):
+        filter_file_stages(jobs, numpy_color2gray)
+
+
+@pytest.mark.parametrize("jobs", ["1", "2"])
+def test_cli_overlap(tmp_path, frame_dir, capsys, jobs):
+    out_dir = tmp_path / "out"
+    main([str(frame_dir), "--overlap", "-O", str(out_dir), "-i", "numba", "-j", jobs])
+    assert len(list(out_dir.iterdir())) == 6
+    assert "bottleneck" in capsys.readouterr().out
+    with pytest.raises(SystemExit):
+        main([str(frame_dir / "frame0.png"), "--overlap"])
@@ -0,0 +1,57 @@
+import numpy as np
+import numpy.testing as nt
+import pytest
+from in3110_instapy import io
+from in3110_instapy.cli import main
+from in3110_instapy.numpy_filters import numpy_color2gray, numpy_color2sepia
+from in3110_instapy.tiling import iter_tiles, tiled_filter
+
+
+def test_iter_tiles():
+    tiles = list(iter_tiles((100, 70, 3), (32, 50)))
+    # 4 rows of tiles, 2 columns
+    assert len(tiles) == 8
+    # every pixel is covered exactly once
+    covered = np.zeros((100, 70), dtype=int)
+    for rows, cols in tiles:
+        covered[rows, cols] += 1
+    assert np.all(covered == 1)
+
+
+@pytest.mark.parametrize("filter_function", [numpy_color2gray, numpy_color2sepia])
+@pytest.mark.parametrize("tile_size", [7, (64, 320), 1000])
+def test_tiled_filter(image, filter_function, tile_size):
+    tiled = tiled_filter(filter_function, image, tile_size=tile_size)
+    assert tiled.shape == image.shape
+    assert tiled.dtype == np.uint8
+    nt.assert_array_equal(tiled, filter_function(image))
+
+
+def test_tiled_filter_out(image):
+    out = np.zeros_like(image)
+    result = tiled_filter(numpy_color2gray, image, out=out, tile_size=50)
+    assert result is out
+    nt.assert_array_equal(out, numpy_color2gray(image))
+
+
+def test_image_tiles(tmp_path, image):
+    filename = tmp_path / "image.png"
+    io.write_image(image, filename)
+    tiles = list(io.read_image_tiles(filename, 64))
+    assert len(tiles) == 3 * 5
+
+    out_file = tmp_path / "tiled.png"
+    io.write_image_tiles(tiles, image.shape, out_file)
+    nt.assert_array_equal(io.read_image(out_file), image)
+
+
+def test_cli_tiles(tmp_path, image, capsys):
+    filename = tmp_path / "image.png"
+    io.write_image(image, filename)
+    out_file = tmp_path / "tiled.png"
+    # (timing reads the whole image, instead of streaming the tiles)
+    main([str(filename), "-o", str(out_file), "-t", "16", "-i", "numpy", "-se", "-r"])
+    nt.assert_array_equal(io.read_image(out_file), numpy_color2sepia(image))
+    assert "Median time" in capsys.readouterr().out
+    with pytest.raises(SystemExit):
+        main([str(filename), "-o", str(out_file), "-t", "16", "-j", "2"])
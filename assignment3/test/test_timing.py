@@ -0,0 +1,115 @@
+import numpy as np
+from in3110_instapy import get_filter, io
+from in3110_instapy.timing import (
+    allocations_one,
+    band_scaling,
+    compare,
+    convolution_benchmarks,
+    main,
+    read_report,
+    run_benchmarks,
+    sepia_memory,
+    startup_times,
+    summarize,
+    time_one,
+    write_report,
+)
+
+
+def test_time_one(image):
+    assert time_one(get_filter("color2gray", "numpy"), image, calls=2) > 0
+
+
+def test_allocations_one(image):
+    filter_function = get_filter("color2gray", "numba")
+    out = np.empty_like(image)
+    filter_function(image, out=out)
+    # writing to a preallocated output allocates (almost) nothing
+    assert allocations_one(filter_function, image, out=out) < image.nbytes / 10
+    assert allocations_one(filter_function, image) >= image.nbytes
+
+
+def test_startup_times():
+    times = startup_times("color2gray", "numpy")
+    assert set(times) == {"import", "cold", "warm"}
+    assert all(seconds > 0 for seconds in times.values())
+
+
+def test_sepia_memory():
+    image = io.random_image(width=500, height=400)
+    results = {r["mode"]: r for r in sepia_memory(image, repeat=2)}
+    assert len(results) == 3
+    # blocks only need a small float array
+    assert results["row blocks, float64"]["peak_bytes"] < results["whole image, float64"]["peak_bytes"] / 2
+    assert all(r["median_s"] > 0 for r in results.values())
+
+
+def test_convolution_benchmarks():
+    results = convolution_benchmarks(io.random_image(width=40, height=30), sizes=[3, 5], repeat=2)
+    assert [(r["kernel_size"], r["method"]) for r in results[:4]] == [
+        (3, "naive"),
+        (3, "separable"),
+        (3, "fft"),
+        (3, "running sums"),
+    ]
+    assert len(results) == 8
+    assert all(r["median_s"] > 0 and r["speedup"] > 0 for r in results)
+
+
+def test_band_scaling():
+    results = band_scaling("color2sepia", "numba", io.random_image(width=40, height=30), repeat=2)
+    assert results[0]["threads"] == 1
+    assert results[0]["speedup"] == 1.0
+    assert all(r["median_s"] > 0 and r["efficiency"] > 0 for r in results)
+
+
+def test_summarize():
+    summary = summarize([4_000_000, 1_000_000, 2_000_000, 3_000_000, 5_000_000], pixels=1_000_000)
+    assert summary["median_s"] == 0.003
+    assert summary["iqr_s"] == 0.002
+    assert summary["repeat"] == 5
+    assert abs(summary["mpix_per_s"] - 1 / 0.003) < 1e-9
+
+
+def test_run_benchmarks():
+    report = run_benchmarks(
+        filters=["color2gray"],
+        implementations=["python", "numpy"],
+        sizes=[(30, 40), (1000, 1000)],
+        repeat=3,
+        warmup=1,
+        startup=False,
+        scaling=False,
+        bands=False,
+    )
+    results = report["results"]
+    # python is only timed on the small image
+    assert [(r["implementation"], r["width"]) for r in results] == [("python", 40), ("numpy", 40), ("numpy", 1000)]
+    assert all(r["median_s"] > 0 and r["mpix_per_s"] > 0 for r in results)
+
+
+def test_compare():
+    result = {"filter": "color2gray", "implementation": "numpy", "height": 1, "width": 1}
+    baseline = {"results": [dict(result, median_s=1.0, iqr_s=0.05)]}
+    assert compare({"results": [dict(result, median_s=1.05, iqr_s=0.01)]}, baseline) == []
+    regressions = compare({"results": [dict(result, median_s=1.5, iqr_s=0.01)]}, baseline)
+    assert len(regressions) == 1
+    assert regressions[0]["slowdown"] == 0.5
+    # slower, but within the noise of the baseline
+    noisy = {"results": [dict(result, median_s=1.0, iqr_s=1.0)]}
+    assert compare({"results": [dict(result, median_s=1.5, iqr_s=0.01)]}, noisy) == []
+
+
+def test_main(tmp_path):
+    args = ["-f", "color2gray", "-i", "numpy", "-s", "40x30", "-n", "3", "--no-startup", "--no-scaling", "--no-convolution", "--no-bands"]
+    baseline = tmp_path / "baseline.json"
+    assert main(args + ["-o", str(baseline)]) == 0
+    assert read_report(baseline)["results"][0]["implementation"] == "numpy"
+
+    # make the baseline impossibly fast
+    report = read_report(baseline)
+    for result in report["results"]:
+        result["median_s"] /= 1000
+        result["iqr_s"] = 0
+    write_report(report, baseline)
+    assert main(args + ["-o", str(tmp_path / "new.json"), "-b", str(baseline)]) == 1